@@ -1,6 +1,8 @@
 import os
 from pathlib import Path
 
+import recursos_portal
+
 def actualizar_index(datos):
     # 1. Recuperamos la ruta de destino que mandamos desde el script principal
     # Si no existe, usamos la carpeta actual por defecto
@@ -29,12 +31,20 @@ def actualizar_index(datos):
     html = html.replace("{{ doh }}", f"{datos['doh']:,.2f}" if isinstance(datos['doh'], (int,float)) else str(datos['doh']))
     html = html.replace("{{ v_diaria }}", f"{datos['v_diaria']:,.0f}")
 
-    html = html.replace("{{ m1_n }}", str(datos['m1_n']))
-    html = html.replace("{{ m1_v }}", f"{datos['m1_v']:,.0f}")
-    html = html.replace("{{ m2_n }}", str(datos['m2_n']))
-    html = html.replace("{{ m2_v }}", f"{datos['m2_v']:,.0f}")
-    html = html.replace("{{ m3_n }}", str(datos['m3_n']))
-    html = html.replace("{{ m3_v }}", f"{datos['m3_v']:,.0f}")
+    # Una tarjeta por mes del balance (tantas como meses haya, no siempre 3)
+    tarjetas_meses = ""
+    for item in datos.get('meses', []):
+        tarjetas_meses += f"""
+            <div class="col-md">
+                <div class="card card-mes p-2 d-flex flex-row justify-content-between align-items-center px-4">
+                    <span class="mes-nombre">{item['Etiqueta']}</span>
+                    <span class="mes-valor">${item['Variacion Neta']:,.0f}</span>
+                </div>
+            </div>
+        """
+    if not tarjetas_meses:
+        tarjetas_meses = "<div class='col-12 text-muted ps-2'>Sin historia mensual.</div>"
+    html = html.replace("{{ tarjetas_meses }}", tarjetas_meses)
 
     # 1. Reemplazo para las tarjetas de Entradas
     html = html.replace("{{ e_ayer }}", f"{datos['e_ayer']:,.0f}")
@@ -55,6 +65,110 @@ def actualizar_index(datos):
     # 3. Reemplazamos el hueco de la tabla en el HTML
     html = html.replace("{{ filas_top_10 }}", filas_tabla)
 
-    # 4. GUARDAMOS el resultado en la carpeta de prueba
+    # 3.1 Principales movimientos por SKU vs. el corte anterior
+    filas_delta = ""
+    for item in datos.get('delta_top', []):
+        filas_delta += f"""
+        <tr>
+            <td>{item['Almacen']}</td>
+            <td>{item['Articulo']}</td>
+            <td style='text-align: right; font-weight: bold;'>${item['Delta Importe']:,.0f}</td>
+            <td style='text-align: right;'>${item['Efecto Cantidad']:,.0f}</td>
+            <td style='text-align: right;'>${item['Efecto Costo']:,.0f}</td>
+            <td style='text-align: right;'>${item['Efecto Tipo Cambio']:,.0f}</td>
+        </tr>
+        """
+    if not filas_delta:
+        filas_delta = "<tr><td colspan='6' class='text-muted'>Sin corte anterior para comparar.</td></tr>"
+    html = html.replace("{{ filas_delta }}", filas_delta)
+
+    # 3.2 Resumen por periodos (semana / mes / trimestre / año)
+    filas_periodos = ""
+    for item in datos.get('periodos', []):
+        filas_periodos += f"""
+        <tr>
+            <td>{item['Tipo']}</td>
+            <td>{item['Etiqueta']}</td>
+            <td style='text-align: right;'>${item['Valor Promedio']:,.0f}</td>
+            <td style='text-align: right;'>${item['Valor Cierre']:,.0f}</td>
+            <td style='text-align: right; font-weight: bold;'>${item['Variacion Neta']:,.0f}</td>
+            <td style='text-align: right;'>{_formato_doh(item['DOH Promedio'])}</td>
+            <td style='text-align: right;'>{item['Dias Sobre Objetivo']:,.0f} / {item['Dias']:,.0f}</td>
+        </tr>
+        """
+    if not filas_periodos:
+        filas_periodos = "<tr><td colspan='7' class='text-muted'>Sin historia de Comportamiento.</td></tr>"
+    html = html.replace("{{ filas_periodos }}", filas_periodos)
+
+    # 3.3 Escenarios what-if de DOH (mayor valor en riesgo primero)
+    filas_escenarios = ""
+    for item in datos.get('escenarios', []):
+        filas_escenarios += f"""
+        <tr>
+            <td>{item['Escenario']}</td>
+            <td>{item['Alcance']}</td>
+            <td style='text-align: right;'>{_formato_doh(item['DOH Total'])}</td>
+            <td style='text-align: right;'>{_formato_doh(item['DOH P10'])} / {_formato_doh(item['DOH P50'])} / {_formato_doh(item['DOH P90'])}</td>
+            <td style='text-align: right;'>{item['Categorias en Quiebre']:,}</td>
+            <td style='text-align: right; font-weight: bold;'>${item['Valor en Riesgo']:,.0f}</td>
+        </tr>
+        """
+    if not filas_escenarios:
+        filas_escenarios = "<tr><td colspan='6' class='text-muted'>Sin escenarios evaluados.</td></tr>"
+    html = html.replace("{{ filas_escenarios }}", filas_escenarios)
+
+    # 4. Recursos optimizados (imágenes, CSS, huellas) y GUARDAMOS el resultado
+    html = recursos_portal.publicar(html, ruta_carpeta)
+    with open(ruta_html_destino, "w", encoding="utf-8") as f:
+        f.write(html)
+    recursos_portal.precomprimir(ruta_html_destino)
+
+def _formato_doh(doh):
+    return f"{doh:,.2f}" if isinstance(doh, (int, float)) and doh == doh else "N/A"
+
+
+def actualizar_consolidado(datos):
+    # Portal consolidado multi-empresa (plantilla web/consolidado.html)
+    ruta_carpeta = datos.get('ruta_destino', os.getcwd())
+    ruta_html_destino = os.path.join(ruta_carpeta, "index.html")
+
+    BASE_DIR = Path(__file__).resolve().parent.parent
+    ruta_plantilla = os.path.join(BASE_DIR, "web", "consolidado.html")
+
+    if not os.path.exists(ruta_plantilla):
+        print(f"❌ Error: No se encontró la plantilla en {ruta_plantilla}")
+        return
+
+    with open(ruta_plantilla, "r", encoding="utf-8") as f:
+        html = f.read()
+
+    total = datos['total']
+    html = html.replace("{{ fecha }}", str(datos['fecha']))
+    html = html.replace("{{ v_total }}", f"{total['Valor Total']:,.0f}")
+    html = html.replace("{{ v_transito }}", f"{total['Valor Transito']:,.0f}")
+    html = html.replace("{{ v_fisico }}", f"{total['Valor Fisico']:,.0f}")
+    html = html.replace("{{ objetivo }}", f"{total['Objetivo']:,.0f}")
+    html = html.replace("{{ doh }}", _formato_doh(total['DOH Proyectado']))
+
+    filas = ""
+    for item in datos['empresas']:
+        color_brecha = "#dc3545" if item['Brecha vs Objetivo'] > 0 else "#198754"
+        filas += f"""
+        <tr>
+            <td>{str(item['Empresa']).upper()}</td>
+            <td style='text-align: right;'>${item['Valor Fisico']:,.0f}</td>
+            <td style='text-align: right;'>${item['Valor Transito']:,.0f}</td>
+            <td style='text-align: right; font-weight: bold;'>${item['Valor Total']:,.0f}</td>
+            <td style='text-align: right;'>${item['Objetivo']:,.0f}</td>
+            <td style='text-align: right; color: {color_brecha};'>${item['Brecha vs Objetivo']:,.0f}</td>
+            <td style='text-align: right;'>{_formato_doh(item['DOH Proyectado'])}</td>
+            <td style='text-align: right;'>${item['Variacion Diaria']:,.0f}</td>
+        </tr>
+        """
+    html = html.replace("{{ filas_empresas }}", filas)
+
+    # El logo y el CSS se publican optimizados junto al consolidado
+    html = recursos_portal.publicar(html, ruta_carpeta)
     with open(ruta_html_destino, "w", encoding="utf-8") as f:
-        f.write(html)
\ No newline at end of file
+        f.write(html)
+    recursos_portal.precomprimir(ruta_html_destino)
@@ -0,0 +1,256 @@
+# =========================================================
+# MÓDULO: Agregación por bloques del Inventario (out-of-core)
+# DESCRIPCIÓN: Lee el extracto de Inventario en bloques de
+#              tamaño fijo y acumula las sumas de Importe por
+#              almacén, clase ABC y categoría sin tener nunca el
+#              DataFrame completo en memoria. El tamaño de bloque
+#              se calcula a partir de un presupuesto de memoria.
+#              La proyección mínima por fila (llaves, clase,
+#              cantidades e Importe) se escribe bloque a bloque a
+#              un Parquet; el delta diario y el ABC la leen de ahí
+#              row group por row group y acumulan sumas por SKU.
+# =========================================================
+import os
+
+import pandas as pd
+from openpyxl import load_workbook
+
+import clasificacion_abc
+import delta_inventario
+import formatos_fuente
+import motor_dataframe
+import validacion_esquema
+
+COLUMNAS_INVENTARIO = list(validacion_esquema.ESQUEMAS["Inventario"])
+FILAS_MINIMAS_BLOQUE = 10_000
+FILAS_MUESTRA_MEMORIA = 2_000
+# Cada bloque genera columnas derivadas (Importe, normalizadas, snapshot);
+# se reserva este múltiplo del tamaño del bloque crudo.
+FACTOR_COLUMNAS_DERIVADAS = 4
+# Columnas de la proyección que se guarda en disco (texto + numéricas)
+COLUMNAS_TEXTO_PROYECCION = ["Almacen", "Articulo", "Categoria", "ABCGeneral"]
+COLUMNAS_PROYECCION = COLUMNAS_TEXTO_PROYECCION + motor_dataframe.COLUMNAS_IMPORTE + ["Importe"]
+
+
+# =====================================================
+# LECTURA EN BLOQUES
+# =====================================================
+def filas_por_bloque(path: str, memoria_mb: int):
+    # Estima bytes por fila con una muestra y reparte el presupuesto
+    muestra = validacion_esquema.leer_encabezado(path, FILAS_MUESTRA_MEMORIA)
+    muestra = muestra[[c for c in COLUMNAS_INVENTARIO if c in muestra.columns]]
+    if muestra.empty:
+        return FILAS_MINIMAS_BLOQUE
+    bytes_fila = muestra.memory_usage(deep=True, index=False).sum() / len(muestra)
+    filas = int(memoria_mb * 1024 * 1024 / (bytes_fila * FACTOR_COLUMNAS_DERIVADAS))
+    return max(FILAS_MINIMAS_BLOQUE, filas)
+
+
+def _bloques_xlsx(path: str, tamano: int):
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        encabezado = [str(c) if c is not None else "" for c in next(filas)]
+        indices = [encabezado.index(c) for c in COLUMNAS_INVENTARIO if c in encabezado]
+        columnas = [encabezado[i] for i in indices]
+        bloque = []
+        for fila in filas:
+            bloque.append([fila[i] if i < len(fila) else None for i in indices])
+            if len(bloque) == tamano:
+                yield pd.DataFrame(bloque, columns=columnas)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=columnas)
+    finally:
+        wb.close()
+
+
+def _bloques_columnar(path: str, tamano: int):
+    import pyarrow as pa
+    if formatos_fuente.extension_de(path) in formatos_fuente.EXT_PARQUET:
+        import pyarrow.parquet as pq
+        archivo = pq.ParquetFile(path, memory_map=True)
+        columnas = [c for c in COLUMNAS_INVENTARIO if c in archivo.schema_arrow.names]
+        for lote in archivo.iter_batches(batch_size=tamano, columns=columnas):
+            yield lote.to_pandas()
+        return
+
+    with pa.memory_map(path, "r") as fuente:
+        lector = pa.ipc.open_file(fuente)
+        columnas = [c for c in COLUMNAS_INVENTARIO if c in lector.schema.names]
+        for i in range(lector.num_record_batches):
+            lote = lector.get_batch(i).select(columnas)
+            for inicio in range(0, lote.num_rows, tamano):
+                yield lote.slice(inicio, tamano).to_pandas()
+
+
+def leer_por_bloques(path: str, tamano: int):
+    ext = formatos_fuente.extension_de(path)
+    if ext in formatos_fuente.EXT_CSV:
+        columnas = formatos_fuente.leer_csv(path, nrows=0).columns
+        usecols = [c for c in COLUMNAS_INVENTARIO if c in columnas]
+        tipos = {c: str for c in ("Almacen", "Articulo", "Categoria", "ABCGeneral") if c in usecols}
+        yield from pd.read_csv(path, usecols=usecols, dtype=tipos, chunksize=tamano)
+    elif ext in formatos_fuente.EXT_PARQUET + formatos_fuente.EXT_FEATHER:
+        yield from _bloques_columnar(path, tamano)
+    elif ext == ".xlsx":
+        yield from _bloques_xlsx(path, tamano)
+    else:
+        raise ValueError(f"El modo por bloques no soporta archivos '{ext}'")
+
+
+# =====================================================
+# ACUMULADOR
+# =====================================================
+def _sumar(acumulado, parcial: pd.Series):
+    # Suma alineada por índice; las llaves nuevas de un bloque se agregan
+    return parcial if acumulado is None else acumulado.add(parcial, fill_value=0)
+
+
+class AgregadosInventario:
+    # Mismas consultas que el motor pandas sobre el Inventario completo,
+    # pero alimentadas bloque por bloque.
+
+    def __init__(self, ruta_proyeccion: str):
+        self._motor = motor_dataframe.MotorPandas()
+        self._almacen = None
+        self._almacen_categoria = None
+        self._abc = None
+        self.ruta_proyeccion = ruta_proyeccion
+        self._escritor = None
+        self.filas = 0
+        self.bloques = 0
+        self.muestra = None
+
+    def agregar_bloque(self, bloque: pd.DataFrame):
+        faltantes = [c for c in motor_dataframe.COLUMNAS_IMPORTE if c not in bloque.columns]
+        if faltantes:
+            raise KeyError(f"No se puede crear 'Importe'. Faltan columnas: {faltantes}")
+
+        bloque = self._motor.agregar_importe(bloque)
+        if self.muestra is None:
+            self.muestra = bloque.head(10).copy()
+        self.filas += len(bloque)
+        self.bloques += 1
+
+        # Mismas operaciones que el motor sobre el frame completo; con un solo
+        # bloque el resultado es bit a bit el del modo en memoria.
+        self._almacen = _sumar(self._almacen, self._motor.importe_por_almacen(bloque))
+        validos = bloque[bloque["Importe"] != "NULL"]
+        self._almacen_categoria = _sumar(self._almacen_categoria,
+                                         validos.groupby(["Almacen", "Categoria"])["Importe"].sum())
+
+        sumas = self._motor.sumas_abc(bloque).set_index(["Almacen_norm", "ABCGeneral_norm"])["Importe_n"]
+        self._abc = _sumar(self._abc, sumas)
+
+        self._escribir_proyeccion(bloque)
+
+    # --- Proyección por fila en disco ---
+    def _escribir_proyeccion(self, bloque: pd.DataFrame):
+        # Cada bloque se agrega como row group; en memoria solo queda el bloque actual
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        proyeccion = pd.DataFrame(index=bloque.index)
+        for c in COLUMNAS_TEXTO_PROYECCION:
+            valores = bloque[c] if c in bloque.columns else pd.Series(None, index=bloque.index, dtype=object)
+            proyeccion[c] = valores.where(valores.isna(), valores.astype(str)).astype(object)
+        for c in motor_dataframe.COLUMNAS_IMPORTE:
+            proyeccion[c] = bloque[c].astype(float)
+        proyeccion["Importe"] = pd.to_numeric(bloque["Importe"], errors="coerce").fillna(0)
+
+        esquema = pa.schema([(c, pa.string()) for c in COLUMNAS_TEXTO_PROYECCION]
+                            + [(c, pa.float64()) for c in COLUMNAS_PROYECCION[len(COLUMNAS_TEXTO_PROYECCION):]])
+        if self._escritor is None:
+            os.makedirs(os.path.dirname(self.ruta_proyeccion) or ".", exist_ok=True)
+            self._escritor = pq.ParquetWriter(self.ruta_proyeccion, esquema)
+        self._escritor.write_table(pa.Table.from_pandas(proyeccion, schema=esquema, preserve_index=False))
+
+    def cerrar(self):
+        if self._escritor is not None:
+            self._escritor.close()
+            self._escritor = None
+
+    def __getstate__(self):
+        # El checkpoint guarda las sumas y la ruta; el escritor ya está cerrado
+        estado = dict(self.__dict__)
+        estado["_escritor"] = None
+        return estado
+
+    def bloques_proyeccion(self, columnas):
+        # Un row group por bloque del extracto: se lee uno a la vez
+        if self.filas == 0 or not os.path.exists(self.ruta_proyeccion):
+            return
+        import pyarrow.parquet as pq
+        archivo = pq.ParquetFile(self.ruta_proyeccion, memory_map=True)
+        for i in range(archivo.num_row_groups):
+            yield archivo.read_row_group(i, columns=columnas).to_pandas()
+
+    def _por_sku(self, columnas, sumas_por_sku, combinar_sumas):
+        # Agregación por SKU bloque a bloque: en memoria solo el bloque actual,
+        # las sumas acumuladas (una fila por SKU) y las parciales pendientes.
+        # Las parciales se combinan cuando igualan al acumulado: así cada SKU
+        # se vuelve a agrupar unas log(bloques) veces y no una por bloque.
+        acumulado = None
+        pendientes = []
+        for bloque in self.bloques_proyeccion(columnas):
+            pendientes.append(sumas_por_sku(bloque))
+            if sum(len(p) for p in pendientes) >= (0 if acumulado is None else len(acumulado)):
+                acumulado = combinar_sumas(acumulado, pd.concat(pendientes))
+                pendientes = []
+        if pendientes:
+            acumulado = combinar_sumas(acumulado, pd.concat(pendientes))
+        if acumulado is None:
+            acumulado = sumas_por_sku(pd.DataFrame({c: pd.Series(dtype=object) for c in columnas}))
+        return acumulado
+
+    # --- Consultas equivalentes a MotorPandas ---
+    def importe_por_almacen(self):
+        if self._almacen is None:
+            return pd.Series(dtype=float, name="Importe").rename_axis("Almacen")
+        return self._almacen.rename("Importe").rename_axis("Almacen")
+
+    def importe_por_categoria(self, almacenes):
+        if self._almacen_categoria is None:
+            return pd.DataFrame(columns=["Categoria", "Importe"])
+        # Misma llave normalizada que MotorPandas: el CSV por bloques trae el Almacen como str
+        almacen = delta_inventario.normalizar_llave(pd.Series(self._almacen_categoria.index.get_level_values(0)))
+        buscados = delta_inventario.normalizar_llave(pd.Series(list(almacenes), dtype=object))
+        filtrado = self._almacen_categoria[almacen.isin(buscados).to_numpy()]
+        return filtrado.groupby(level=1).sum().rename_axis("Categoria").rename("Importe").reset_index()
+
+    def sumas_abc(self):
+        if self._abc is None:
+            return pd.DataFrame(columns=["Almacen_norm", "ABCGeneral_norm", "Importe_n"])
+        return self._abc.rename_axis(["Almacen_norm", "ABCGeneral_norm"]).rename("Importe_n").reset_index()
+
+    def suma_importe(self):
+        return self.importe_por_almacen().sum()
+
+    def snapshot(self):
+        # Un SKU puede quedar partido entre dos bloques: las sumas se combinan antes de consolidar
+        return delta_inventario.consolidar(self._por_sku(
+            delta_inventario.COLUMNAS_SNAPSHOT, delta_inventario.sumas_por_sku, delta_inventario.combinar_sumas))
+
+    def skus_abc(self):
+        # Entrada de clasificacion_abc.clasificar_skus
+        return self._por_sku(COLUMNAS_TEXTO_PROYECCION + ["Importe"],
+                             clasificacion_abc.sumas_por_sku, clasificacion_abc.combinar_sumas)
+
+
+def agregar_inventario(path: str, memoria_mb: int, ruta_proyeccion: str):
+    tamano = filas_por_bloque(path, memoria_mb)
+    agregados = AgregadosInventario(ruta_proyeccion)
+    try:
+        for bloque in leer_por_bloques(path, tamano):
+            agregados.agregar_bloque(bloque)
+    finally:
+        agregados.cerrar()
+    # Solo se conserva la proyección del corte actual
+    carpeta = os.path.dirname(ruta_proyeccion) or "."
+    for archivo in os.listdir(carpeta):
+        ruta = os.path.join(carpeta, archivo)
+        if archivo.endswith(".parquet") and os.path.abspath(ruta) != os.path.abspath(ruta_proyeccion):
+            os.remove(ruta)
+    print(f"✔ Inventario agregado por bloques: {agregados.filas:,} filas en {agregados.bloques} bloque(s) "
+          f"de hasta {tamano:,} filas (presupuesto {memoria_mb} MB).")
+    return agregados
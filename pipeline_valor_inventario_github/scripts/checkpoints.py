@@ -0,0 +1,304 @@
+# =========================================================
+# MÓDULO: Checkpoints por etapa y reanudación
+# DESCRIPCIÓN: Guarda las salidas de cada etapa del planificador
+#              en cache/ejecuciones/<id de ejecución>/ junto con
+#              un manifiesto (estado, duración, error y huella de
+#              los extractos). Con --resume se reutilizan las
+#              etapas que terminaron y solo se vuelven a correr
+#              las fallidas, las omitidas y sus dependientes.
+#              Las etapas de carga no se guardan: al reanudar se
+#              vuelven a leer de su extracto (o de la cache de
+#              extractos), y una salida que es el mismo objeto que
+#              otra ya guardada se registra como alias. Los
+#              DataFrames van en Parquet (una columna que mezcla
+#              números con "NULL" se parte en dos); lo demás, en
+#              pickle.
+#              Una ejecución que termina completa borra sus
+#              salidas; solo la última que quedó a medias
+#              conserva las suyas para --resume.
+# =========================================================
+import datetime
+import json
+import os
+import pickle
+import re
+import shutil
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+
+import planificador
+
+CARPETA_EJECUCIONES = "ejecuciones"
+MANIFIESTO = "manifiesto.json"
+EJECUCIONES_A_CONSERVAR = 10   # manifiestos; las salidas solo las conserva la última ejecución
+EXT_PARQUET = ".parquet"
+EXT_PICKLE = ".pkl"
+EXT_ALIAS = ".alias"
+SUFIJO_TEXTO = "::texto"       # en Parquet, la parte de texto de una columna mixta
+
+
+def huella_fuente(ruta: str):
+    # Mismo criterio que la cache de extractos: ruta + fecha de modificación + tamaño
+    if ruta is None or not os.path.exists(ruta):
+        return None
+    stat = os.stat(ruta)
+    return {"ruta": os.path.abspath(ruta), "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _archivo(etapa: str, salida: str):
+    # Sin extensión: la pone el formato con que se guarde (Parquet, pickle o alias)
+    return re.sub(r"[^0-9A-Za-z]+", "_", f"{etapa}__{salida}").strip("_")
+
+
+def _columnas_mixtas(df):
+    # {columna object: máscara de sus celdas str} si todas las columnas object
+    # tienen solo str y float (como 'Importe' con "NULL"); None si alguna no,
+    # y entonces el DataFrame va en pickle para volver con los mismos tipos.
+    if not all(isinstance(c, str) and not c.endswith(SUFIJO_TEXTO) for c in df.columns) \
+            or not df.columns.is_unique:
+        return None
+    mixtas = {}
+    for c in df.columns[df.dtypes == object]:
+        tipos = df[c].map(type)
+        es_texto = tipos == str
+        if not (es_texto | tipos.isin((float, np.float64))).all():
+            return None
+        mixtas[c] = es_texto
+    return mixtas
+
+
+def _escribir_parquet(df, mixtas: dict, ruta: str):
+    partes = {}
+    for c in df.columns:
+        if c in mixtas:
+            partes[c] = df[c].where(~mixtas[c]).astype("float64")
+            partes[c + SUFIJO_TEXTO] = df[c].where(mixtas[c])
+        else:
+            partes[c] = df[c]
+    pd.DataFrame(partes, index=df.index).to_parquet(ruta, engine="pyarrow")
+
+
+def _leer_parquet(ruta: str):
+    df = pd.read_parquet(ruta, engine="pyarrow")
+    for columna_texto in [c for c in df.columns if c.endswith(SUFIJO_TEXTO)]:
+        c = columna_texto[: -len(SUFIJO_TEXTO)]
+        es_texto = df[columna_texto].notna()
+        mezcla = df[c].astype(object)
+        mezcla[es_texto] = df[columna_texto][es_texto].astype(object)
+        df[c] = mezcla
+        del df[columna_texto]
+    return df
+
+
+def _es_objeto(valor):
+    # Solo DataFrames y demás objetos pesados se deduplican; los escalares no
+    return valor is not None and not isinstance(valor, (bool, int, float, str))
+
+
+def _escribir_atomico(ruta: str, escribir):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    escribir(temporal)
+    os.replace(temporal, ruta)
+
+
+class AlmacenEtapas:
+    # fuentes_por_etapa: {nombre de etapa de carga: ruta del extracto que lee}
+    def __init__(self, carpeta: str, manifiesto: dict, fuentes_por_etapa: dict):
+        self.carpeta = carpeta
+        self.manifiesto = manifiesto
+        self.run_id = manifiesto["run_id"]
+        self.fuentes_por_etapa = fuentes_por_etapa
+        self._guardados = {}  # id(objeto) -> (objeto, archivo) ya escritos en esta corrida
+        self._candado = threading.Lock()
+
+    # =====================================================
+    # CREAR / REANUDAR
+    # =====================================================
+    @classmethod
+    def nueva(cls, carpeta_cache: str, date_str: str, empresa: str, fuentes_por_etapa: dict):
+        # Sufijo aleatorio: dos empresas o corridas que arrancan en el mismo
+        # segundo no deben compartir carpeta
+        run_id = f"{date_str}-{datetime.datetime.now().strftime('%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        carpeta = os.path.join(carpeta_cache, CARPETA_EJECUCIONES, run_id)
+        os.makedirs(carpeta, exist_ok=True)
+        manifiesto = {
+            "run_id": run_id,
+            "fecha_corte": date_str,
+            "empresa": empresa,
+            "creado": datetime.datetime.now().isoformat(timespec="microseconds"),
+            "etapas": {},
+        }
+        almacen = cls(carpeta, manifiesto, fuentes_por_etapa)
+        almacen.escribir_manifiesto()
+        limpiar_antiguas(carpeta_cache)
+        return almacen
+
+    @classmethod
+    def reanudar(cls, carpeta_cache: str, run_id: str, date_str: str, empresa: str, fuentes_por_etapa: dict):
+        # run_id None: la ejecución más reciente de esta fecha y empresa
+        if run_id is None:
+            run_id = ultima_ejecucion(carpeta_cache, date_str, empresa)
+            if run_id is None:
+                return None
+        carpeta = os.path.join(carpeta_cache, CARPETA_EJECUCIONES, run_id)
+        ruta_manifiesto = os.path.join(carpeta, MANIFIESTO)
+        if not os.path.exists(ruta_manifiesto):
+            raise FileNotFoundError(f"No existe la ejecución '{run_id}' en {os.path.dirname(carpeta)}")
+        with open(ruta_manifiesto, "r", encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        if manifiesto["fecha_corte"] != date_str or manifiesto["empresa"] != empresa:
+            raise ValueError(f"La ejecución '{run_id}' es de {manifiesto['empresa']} / {manifiesto['fecha_corte']}, "
+                             f"no de {empresa} / {date_str}")
+        return cls(carpeta, manifiesto, fuentes_por_etapa)
+
+    # =====================================================
+    # ESTADO
+    # =====================================================
+    def etapas_validas(self):
+        # Etapas con checkpoint completo cuyo extracto (si leen uno) no cambió
+        validas = set()
+        for nombre, registro in self.manifiesto["etapas"].items():
+            if registro.get("estado") != planificador.COMPLETADA or not registro.get("checkpoint"):
+                continue
+            if nombre in self.fuentes_por_etapa:
+                if registro.get("huella") != huella_fuente(self.fuentes_por_etapa[nombre]):
+                    print(f"ℹ El extracto de '{nombre}' cambió desde la ejecución anterior; se vuelve a cargar.")
+                    continue
+            validas.add(nombre)
+        return validas
+
+    def recarga_de_fuente(self, nombre: str):
+        # Las cargas no tienen pickle propio: se vuelven a correr al reanudar
+        return nombre in self.fuentes_por_etapa
+
+    def registrar(self, nombre: str, estado: str, **datos):
+        registro = {"estado": estado, **datos}
+        if estado == planificador.COMPLETADA and nombre in self.fuentes_por_etapa:
+            registro["huella"] = huella_fuente(self.fuentes_por_etapa[nombre])
+        self.manifiesto["etapas"][nombre] = registro
+        self.escribir_manifiesto()
+
+    def escribir_manifiesto(self):
+        self.manifiesto["actualizado"] = datetime.datetime.now().isoformat(timespec="seconds")
+        ruta = os.path.join(self.carpeta, MANIFIESTO)
+
+        def escribir(temporal):
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(self.manifiesto, f, ensure_ascii=False, indent=2, default=str)
+        _escribir_atomico(ruta, escribir)
+
+    # =====================================================
+    # SALIDAS
+    # =====================================================
+    def guardar(self, nombre: str, resultado: dict, salidas):
+        if self.recarga_de_fuente(nombre):
+            return True  # el extracto ya está en disco: al reanudar se vuelve a leer
+        try:
+            for salida in salidas:
+                base = os.path.join(self.carpeta, _archivo(nombre, salida))
+                valor = resultado[salida]
+                with self._candado:
+                    previo = self._guardados.get(id(valor)) if _es_objeto(valor) else None
+                if previo is not None and previo[0] is valor:
+                    # Mismo objeto que otra salida: solo se anota a qué archivo apunta
+                    self._reemplazar(base, EXT_ALIAS, lambda t, destino=previo[1]: _escribir_texto(t, destino))
+                    continue
+
+                mixtas = _columnas_mixtas(valor) if isinstance(valor, pd.DataFrame) else None
+                if mixtas is not None:
+                    extension = EXT_PARQUET
+
+                    def escribir(temporal, valor=valor, mixtas=mixtas):
+                        _escribir_parquet(valor, mixtas, temporal)
+                else:
+                    extension = EXT_PICKLE
+
+                    def escribir(temporal, valor=valor):
+                        with open(temporal, "wb") as f:
+                            pickle.dump(valor, f, protocol=pickle.HIGHEST_PROTOCOL)
+                self._reemplazar(base, extension, escribir)
+                archivo = os.path.basename(base) + extension
+                if _es_objeto(valor):
+                    with self._candado:
+                        self._guardados[id(valor)] = (valor, archivo)
+            return True
+        except Exception as e:
+            print(f"⚠ No se pudo guardar el checkpoint de '{nombre}': {e}")
+            return False
+
+    def _reemplazar(self, base: str, extension: str, escribir):
+        # Al reanudar una etapa puede cambiar de formato: se borra el anterior
+        _escribir_atomico(base + extension, escribir)
+        for otra in (EXT_PARQUET, EXT_PICKLE, EXT_ALIAS):
+            if otra != extension and os.path.exists(base + otra):
+                os.remove(base + otra)
+
+    def cargar(self, nombre: str, salidas):
+        resultado = {}
+        for salida in salidas:
+            base = os.path.join(self.carpeta, _archivo(nombre, salida))
+            if os.path.exists(base + EXT_ALIAS):
+                with open(base + EXT_ALIAS, "r", encoding="utf-8") as f:
+                    ruta = os.path.join(self.carpeta, f.read().strip())
+            else:
+                ruta = base + (EXT_PARQUET if os.path.exists(base + EXT_PARQUET) else EXT_PICKLE)
+            if ruta.endswith(EXT_PARQUET):
+                resultado[salida] = _leer_parquet(ruta)
+            else:
+                with open(ruta, "rb") as f:
+                    resultado[salida] = pickle.load(f)
+        return resultado
+
+    def descartar_salidas(self):
+        # La ejecución terminó completa: ya no hay nada que reanudar. Se queda
+        # el manifiesto (sin checkpoints), así un --resume la corre completa.
+        for archivo in os.listdir(self.carpeta):
+            if archivo != MANIFIESTO:
+                os.remove(os.path.join(self.carpeta, archivo))
+        for registro in self.manifiesto["etapas"].values():
+            registro["checkpoint"] = False
+        self._guardados.clear()
+        self.escribir_manifiesto()
+
+
+def _escribir_texto(ruta: str, texto: str):
+    with open(ruta, "w", encoding="utf-8") as f:
+        f.write(texto)
+
+
+# =====================================================
+# EJECUCIONES ANTERIORES
+# =====================================================
+def _manifiestos(carpeta_cache: str):
+    base = os.path.join(carpeta_cache, CARPETA_EJECUCIONES)
+    if not os.path.isdir(base):
+        return []
+    manifiestos = []
+    for run_id in os.listdir(base):
+        ruta = os.path.join(base, run_id, MANIFIESTO)
+        if os.path.exists(ruta):
+            with open(ruta, "r", encoding="utf-8") as f:
+                manifiestos.append(json.load(f))
+    return sorted(manifiestos, key=lambda m: m["creado"])
+
+
+def ultima_ejecucion(carpeta_cache: str, date_str: str, empresa: str):
+    candidatas = [m for m in _manifiestos(carpeta_cache)
+                  if m["fecha_corte"] == date_str and m["empresa"] == empresa]
+    return candidatas[-1]["run_id"] if candidatas else None
+
+
+def limpiar_antiguas(carpeta_cache: str, conservar: int = EJECUCIONES_A_CONSERVAR):
+    # Se llama al crear una ejecución nueva: de las anteriores solo la más
+    # reciente conserva sus salidas (la que se reanudaría con --resume); de
+    # las demás quedan los manifiestos, hasta `conservar`.
+    manifiestos = _manifiestos(carpeta_cache)
+    for m in manifiestos[:-conservar]:
+        shutil.rmtree(os.path.join(carpeta_cache, CARPETA_EJECUCIONES, m["run_id"]), ignore_errors=True)
+    for m in manifiestos[-conservar:-2]:
+        carpeta = os.path.join(carpeta_cache, CARPETA_EJECUCIONES, m["run_id"])
+        if set(os.listdir(carpeta)) != {MANIFIESTO}:
+            AlmacenEtapas(carpeta, m, {}).descartar_salidas()
@@ -0,0 +1,172 @@
+# =========================================================
+# MÓDULO: Clasificación ABC calculada (Pareto por importe)
+# DESCRIPCIÓN: Calcula la clase ABC de cada SKU a partir de su
+#              Importe en lugar de confiar en la columna
+#              ABCGeneral del extracto. Ordena, acumula la
+#              participación y asigna la clase con searchsorted,
+#              todo vectorizado en NumPy; la variante por almacén
+#              usa un solo ordenamiento para todos los grupos.
+#              Opcionalmente agrega el eje XYZ (rotación) con la
+#              Venta del extracto DOH_C. Clasifica SKUs, no filas:
+#              el importe se suma por (Almacen, Articulo), también
+#              bloque a bloque en el modo por bloques.
+# =========================================================
+import numpy as np
+import pandas as pd
+
+import delta_inventario
+
+CLASE_SIN_IMPORTE = "NULL"  # misma convención que el Importe del reporte
+CLASES_ABC = ["A", "B", "C"]
+CLASES_XYZ = ["X", "Y", "Z"]
+DECIMALES_PARTICIPACION = 12  # participación acumulada y cortes se comparan a esta precisión
+
+
+# =====================================================
+# NÚCLEO PARETO
+# =====================================================
+def _cortes(umbrales):
+    # (80, 15, 5) -> participación acumulada donde termina cada clase: [0.80, 0.95]
+    umbrales = np.asarray(umbrales, dtype=float)
+    if umbrales.ndim != 1 or len(umbrales) < 2 or (umbrales <= 0).any():
+        raise ValueError(f"Umbrales inválidos: {umbrales.tolist()}")
+    # Acumular antes de dividir: cumsum de las fracciones da 0.9500000000000001
+    # y un SKU que empieza justo en el 95 % se quedaría en B
+    return np.round(np.cumsum(umbrales)[:-1] / umbrales.sum(), DECIMALES_PARTICIPACION)
+
+
+def clasificar_pareto(valores, umbrales, clases, grupos=None):
+    # Devuelve un arreglo de clases alineado con `valores`. Un SKU cae en la
+    # clase donde empieza su participación acumulada: el que cruza el 80 %
+    # todavía es A. Valores <= 0 no participan y quedan como "NULL".
+    # Con `grupos` el Pareto se calcula dentro de cada grupo (p. ej. almacén).
+    if len(clases) != len(umbrales):
+        raise ValueError("Debe haber una clase por umbral")
+    valores = np.asarray(valores, dtype=float)
+    n = len(valores)
+    resultado = np.full(n, CLASE_SIN_IMPORTE, dtype=object)
+    positivos = np.flatnonzero(valores > 0)
+    if positivos.size == 0:
+        return resultado
+    v = valores[positivos]
+
+    if grupos is None:
+        codigos = np.zeros(v.size, dtype=np.int64)
+    else:
+        codigos, _ = pd.factorize(np.asarray(grupos, dtype=object)[positivos])
+
+    # Un solo ordenamiento: por grupo y, dentro del grupo, de mayor a menor
+    orden = np.lexsort((-v, codigos))
+    v_ord = v[orden]
+    g_ord = codigos[orden]
+
+    acumulado = np.cumsum(v_ord)
+    totales = np.bincount(g_ord, weights=v_ord)
+    # Acumulado al inicio de cada grupo, para reiniciar la suma sin iterar grupos
+    inicio_grupo = np.concatenate(([0.0], np.cumsum(totales)[:-1]))
+    previo = acumulado - v_ord - inicio_grupo[g_ord]
+    # Redondeo: la suma acumulada de importes con centavos arrastra error de punto flotante
+    participacion_previa = np.round(previo / totales[g_ord], DECIMALES_PARTICIPACION)
+
+    indice_clase = np.searchsorted(_cortes(umbrales), participacion_previa, side="right")
+    clases_ord = np.asarray(clases, dtype=object)[indice_clase]
+    resultado[positivos[orden]] = clases_ord
+    return resultado
+
+
+# =====================================================
+# CLASIFICACIÓN DEL INVENTARIO
+# =====================================================
+def _normalizar(serie: pd.Series):
+    return serie.astype(str).str.strip().str.upper()
+
+
+def clases_xyz(df_doh: pd.DataFrame, umbrales):
+    # Rotación por categoría: Pareto de la Venta del DOH_C (X = las que
+    # concentran la venta; sin venta = Z). La fila TOTAL del reporte de DOH
+    # se ignora.
+    categorias = _normalizar(df_doh["Categoria"])
+    venta = pd.to_numeric(df_doh["Venta"], errors="coerce").fillna(0)
+    validas = categorias != "TOTAL"
+    venta = venta[validas].groupby(categorias[validas]).sum()
+    xyz = clasificar_pareto(venta.to_numpy(), umbrales, CLASES_XYZ)
+    xyz[xyz == CLASE_SIN_IMPORTE] = CLASES_XYZ[-1]
+    return pd.Series(xyz, index=venta.index)
+
+
+def sumas_por_sku(df_inventario: pd.DataFrame):
+    # Importe sumado por (Almacen, Articulo) con la primera categoría y clase
+    # del extracto; se puede calcular por bloque y combinar con combinar_sumas
+    df = pd.DataFrame({
+        **{c: delta_inventario.normalizar_llave(df_inventario[c]) for c in delta_inventario.LLAVES},
+        "Categoria": df_inventario["Categoria"],
+        "ABCGeneral": df_inventario["ABCGeneral"],
+        "Importe": pd.to_numeric(df_inventario["Importe"], errors="coerce").fillna(0),
+    })
+    return df.groupby(delta_inventario.LLAVES, as_index=False).agg(
+        Categoria=("Categoria", "first"), ABCGeneral=("ABCGeneral", "first"), Importe=("Importe", "sum"))
+
+
+def combinar_sumas(acumulado, parcial: pd.DataFrame):
+    # La categoría y la clase se quedan con las del primer bloque que las trae
+    if acumulado is None:
+        return parcial
+    agregaciones = {"Categoria": "first", "ABCGeneral": "first", "Importe": "sum"}
+    return (pd.concat([acumulado, parcial], ignore_index=True)
+            .groupby(delta_inventario.LLAVES, as_index=False).agg(agregaciones))
+
+
+def clasificar_skus(skus: pd.DataFrame, umbrales, df_doh: pd.DataFrame = None, umbrales_xyz=None):
+    # Una fila por (Almacen, Articulo) con la clase del extracto y las calculadas
+    df = pd.DataFrame({
+        "Almacen": skus["Almacen"],
+        "Articulo": skus["Articulo"],
+        "Categoria": skus["Categoria"],
+        "Importe": skus["Importe"].astype(float),
+        "ABC Extracto": _normalizar(skus["ABCGeneral"]).fillna(CLASE_SIN_IMPORTE)
+                        .replace({"": CLASE_SIN_IMPORTE, "NAN": CLASE_SIN_IMPORTE, "NONE": CLASE_SIN_IMPORTE}),
+    })
+
+    # Global: el SKU se clasifica por su importe sumado en todos los almacenes
+    articulo = _normalizar(df["Articulo"])
+    codigos, unicos = pd.factorize(articulo)
+    importe_articulo = np.bincount(codigos, weights=df["Importe"].to_numpy(), minlength=len(unicos))
+    df["ABC Global"] = clasificar_pareto(importe_articulo, umbrales, CLASES_ABC)[codigos]
+
+    # Por almacén: Pareto dentro de cada almacén, sin recorrerlos uno a uno
+    df["ABC Almacen"] = clasificar_pareto(df["Importe"].to_numpy(), umbrales, CLASES_ABC,
+                                          grupos=_normalizar(df["Almacen"]).to_numpy())
+
+    if df_doh is not None and umbrales_xyz:
+        xyz = clases_xyz(df_doh, umbrales_xyz)
+        df["XYZ"] = _normalizar(df["Categoria"]).map(xyz).fillna(CLASE_SIN_IMPORTE).to_numpy()
+    return df
+
+
+def clasificar_inventario(df_inventario: pd.DataFrame, umbrales, df_doh: pd.DataFrame = None,
+                          umbrales_xyz=None):
+    # Un SKU repetido en el mismo almacén se clasifica una vez, con su importe sumado
+    return clasificar_skus(sumas_por_sku(df_inventario), umbrales, df_doh=df_doh, umbrales_xyz=umbrales_xyz)
+
+
+def sumas_por_clase(clasificado: pd.DataFrame, columna: str):
+    # Mismo formato que MotorPandas.sumas_abc para reutilizar el llenado de la hoja ABC
+    return (
+        clasificado.groupby([_normalizar(clasificado["Almacen"]).rename("Almacen_norm"),
+                             clasificado[columna].rename("ABCGeneral_norm")])["Importe"]
+        .sum()
+        .rename("Importe_n")
+        .reset_index()
+    )
+
+
+def reporte_reclasificacion(clasificado: pd.DataFrame, columna: str, top: int = None):
+    # SKUs cuya clase calculada difiere de la del extracto, de mayor a menor importe
+    cambios = clasificado[clasificado["ABC Extracto"] != clasificado[columna]]
+    cambios = cambios.sort_values("Importe", ascending=False, kind="stable")
+    if top is not None:
+        cambios = cambios.head(top)
+    cambios = cambios.assign(Cambio=cambios["ABC Extracto"] + " → " + cambios[columna])
+    columnas = ["Almacen", "Articulo", "Categoria", "Importe", "ABC Extracto", columna, "Cambio"]
+    columnas += [c for c in ("ABC Global", "ABC Almacen", "XYZ") if c in cambios.columns and c not in columnas]
+    return cambios[columnas].reset_index(drop=True)
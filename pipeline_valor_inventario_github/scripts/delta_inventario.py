@@ -0,0 +1,205 @@
+# =========================================================
+# MÓDULO: Delta diario de Inventario por SKU
+# DESCRIPCIÓN: Guarda una copia columnar del Inventario del día
+#              y la cruza contra el corte anterior por
+#              (Almacen, Articulo) para explicar la variación
+#              en efecto cantidad, costo y tipo de cambio.
+# =========================================================
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LLAVES = ["Almacen", "Articulo"]
+COLUMNAS_SNAPSHOT = LLAVES + ["Existencias", "CostoPromedio", "TipoCambio"]
+# Parte del importe de un SKU consolidado que Q*C*TC no puede expresar (ver consolidar)
+COLUMNA_RESIDUAL = "ImporteResidual"
+# Código entero escrito como flotante ("123.0"); el grupo 1 es el entero
+PATRON_CODIGO_ENTERO = r"^(-?\d+)\.0+$"
+PREFIJO_SNAPSHOT = "Inventario_"
+SNAPSHOTS_A_CONSERVAR = 7
+
+try:
+    import pyarrow  # noqa: F401  (solo para saber si podemos usar Parquet)
+    EXT_SNAPSHOT = ".parquet"
+except ImportError:
+    EXT_SNAPSHOT = ".pkl"
+
+
+# =====================================================
+# CACHE DE SNAPSHOTS
+# =====================================================
+def _ruta_snapshot(carpeta: str, date_str: str, ext: str = EXT_SNAPSHOT):
+    return os.path.join(carpeta, f"{PREFIJO_SNAPSHOT}{date_str}{ext}")
+
+
+def normalizar_llave(serie: pd.Series):
+    # Un código que un extracto trae como entero y otro como flotante
+    # ("123" / "123.0") debe cruzar igual: se quita el ".0" antes de comparar
+    texto = serie.astype(str).str.strip()
+    return texto.str.replace(PATRON_CODIGO_ENTERO, r"\1", regex=True)
+
+
+def _numerico(df_inventario: pd.DataFrame):
+    # Solo las columnas que necesita el cruce, con llaves normalizadas y cantidades numéricas
+    faltantes = [c for c in COLUMNAS_SNAPSHOT if c not in df_inventario.columns]
+    if faltantes:
+        raise KeyError(f"Faltan columnas para el snapshot: {faltantes}")
+
+    snap = df_inventario[COLUMNAS_SNAPSHOT].copy()
+    for c in LLAVES:
+        snap[c] = normalizar_llave(snap[c])
+    for c in ["Existencias", "CostoPromedio", "TipoCambio"]:
+        snap[c] = pd.to_numeric(snap[c], errors="coerce").fillna(0)
+    return snap
+
+
+def sumas_por_sku(df_inventario: pd.DataFrame):
+    # Sumas parciales por (Almacen, Articulo): se pueden calcular por bloque y
+    # combinar con combinar_sumas sin tener todas las filas a la vez
+    return _sumas(_numerico(df_inventario))
+
+
+def _sumas(snap: pd.DataFrame):
+    qc = snap["Existencias"] * snap["CostoPromedio"]
+    snap = snap.assign(_qc=qc, _qcf=qc * snap["TipoCambio"])
+    return snap.groupby(LLAVES, as_index=False).agg(
+        Existencias=("Existencias", "sum"),
+        _qc=("_qc", "sum"),
+        _qcf=("_qcf", "sum"),
+        CostoPromedio=("CostoPromedio", "first"),
+        TipoCambio=("TipoCambio", "first"),
+        _filas=("Existencias", "size"),
+    )
+
+
+def combinar_sumas(acumulado, parcial: pd.DataFrame):
+    # Las sumas se suman; costo y tipo de cambio "first" se quedan con el del
+    # bloque anterior (el primero en el extracto)
+    if acumulado is None:
+        return parcial
+    agregaciones = {"Existencias": "sum", "_qc": "sum", "_qcf": "sum", "CostoPromedio": "first",
+                    "TipoCambio": "first", "_filas": "sum"}
+    return pd.concat([acumulado, parcial], ignore_index=True).groupby(LLAVES, as_index=False).agg(agregaciones)
+
+
+def consolidar(sumas: pd.DataFrame):
+    # Si un SKU aparece varias veces en el mismo almacén se consolida
+    # con costo y tipo de cambio efectivos, de modo que Q*C*TC sea igual
+    # a la suma de los importes originales. Con filas de signo mixto la
+    # cantidad (o Q*C) puede sumar 0 aunque el importe no: ahí no hay
+    # costo o tipo de cambio efectivo posible y la diferencia queda en
+    # ImporteResidual, que el delta trata como efecto costo.
+    agg = sumas.copy()
+    repetido = agg["_filas"] > 1
+    hay_q = repetido & (agg["Existencias"] != 0)
+    hay_qc = repetido & (agg["_qc"] != 0)
+    agg.loc[hay_q, "CostoPromedio"] = agg.loc[hay_q, "_qc"] / agg.loc[hay_q, "Existencias"]
+    agg.loc[hay_qc, "TipoCambio"] = agg.loc[hay_qc, "_qcf"] / agg.loc[hay_qc, "_qc"]
+    sin_efectivos = repetido & ~(hay_q & hay_qc)
+    expresado = agg["Existencias"] * agg["CostoPromedio"] * agg["TipoCambio"]
+    agg[COLUMNA_RESIDUAL] = (agg["_qcf"] - expresado).where(sin_efectivos, 0.0)
+    return agg[COLUMNAS_SNAPSHOT + [COLUMNA_RESIDUAL]]
+
+
+def preparar_snapshot(df_inventario: pd.DataFrame):
+    snap = _numerico(df_inventario)
+    if snap.duplicated(subset=LLAVES).any():
+        snap = consolidar(_sumas(snap))
+    else:
+        snap[COLUMNA_RESIDUAL] = 0.0
+    return snap.reset_index(drop=True)
+
+
+def guardar_snapshot(snap: pd.DataFrame, carpeta: str, date_str: str):
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = _ruta_snapshot(carpeta, date_str)
+    if EXT_SNAPSHOT == ".parquet":
+        snap.to_parquet(ruta, index=False)
+    else:
+        snap.to_pickle(ruta)
+
+    # Limpieza: solo conservamos los últimos N cortes
+    antiguos = sorted(Path(carpeta).glob(f"{PREFIJO_SNAPSHOT}*"))
+    for viejo in antiguos[:-SNAPSHOTS_A_CONSERVAR]:
+        viejo.unlink(missing_ok=True)
+    return ruta
+
+
+def cargar_snapshot_anterior(carpeta: str, date_str: str):
+    # Busca el corte más reciente estrictamente anterior a date_str
+    if not os.path.isdir(carpeta):
+        return None, None
+    candidatos = []
+    for ruta in Path(carpeta).glob(f"{PREFIJO_SNAPSHOT}*"):
+        fecha = ruta.name[len(PREFIJO_SNAPSHOT):].split(".")[0]
+        if fecha.isdigit() and fecha < date_str:
+            candidatos.append((fecha, ruta))
+    if not candidatos:
+        return None, None
+
+    fecha, ruta = max(candidatos)
+    snap = pd.read_parquet(ruta) if ruta.suffix == ".parquet" else pd.read_pickle(ruta)
+    # Los cortes guardados antes de normalizar las llaves pueden traer "123.0"
+    for c in LLAVES:
+        snap[c] = normalizar_llave(snap[c])
+    if COLUMNA_RESIDUAL not in snap.columns:
+        snap[COLUMNA_RESIDUAL] = 0.0  # corte guardado antes de existir la columna
+    return fecha, snap
+
+
+# =====================================================
+# CRUCE Y DESCOMPOSICIÓN
+# =====================================================
+def calcular_delta(snap_anterior: pd.DataFrame, snap_hoy: pd.DataFrame):
+    # Hash join vectorizado (outer) sobre (Almacen, Articulo)
+    df = snap_anterior.merge(snap_hoy, on=LLAVES, how="outer", suffixes=("_ant", "_hoy"))
+
+    q0 = df["Existencias_ant"].fillna(0).to_numpy()
+    q1 = df["Existencias_hoy"].fillna(0).to_numpy()
+    # SKU nuevo o desaparecido: se toma el costo/TC del lado que sí existe
+    # para que toda la variación caiga en el efecto cantidad.
+    c0 = df["CostoPromedio_ant"].fillna(df["CostoPromedio_hoy"]).fillna(0).to_numpy()
+    c1 = df["CostoPromedio_hoy"].fillna(df["CostoPromedio_ant"]).fillna(0).to_numpy()
+    f0 = df["TipoCambio_ant"].fillna(df["TipoCambio_hoy"]).fillna(0).to_numpy()
+    f1 = df["TipoCambio_hoy"].fillna(df["TipoCambio_ant"]).fillna(0).to_numpy()
+    r0 = df[f"{COLUMNA_RESIDUAL}_ant"].fillna(0).to_numpy()
+    r1 = df[f"{COLUMNA_RESIDUAL}_hoy"].fillna(0).to_numpy()
+
+    # Descomposición encadenada: la suma de los tres efectos es exactamente
+    # Importe_hoy - Importe_ant. El residual de los SKUs consolidados (ver
+    # consolidar) no depende de la cantidad: su cambio va al efecto costo.
+    importe_ant = q0 * c0 * f0 + r0
+    importe_hoy = q1 * c1 * f1 + r1
+    resultado = pd.DataFrame({
+        "Almacen": df["Almacen"].to_numpy(),
+        "Articulo": df["Articulo"].to_numpy(),
+        "Importe Anterior": importe_ant,
+        "Importe Hoy": importe_hoy,
+        "Delta Importe": importe_hoy - importe_ant,
+        "Efecto Cantidad": (q1 - q0) * c0 * f0,
+        "Efecto Costo": q1 * (c1 - c0) * f0 + (r1 - r0),
+        "Efecto Tipo Cambio": q1 * c1 * (f1 - f0),
+        "Existencias Anterior": q0,
+        "Existencias Hoy": q1,
+    })
+    return resultado[resultado["Delta Importe"] != 0].reset_index(drop=True)
+
+
+def top_movimientos(delta: pd.DataFrame, n: int = 50):
+    if delta.empty:
+        return delta
+    magnitud = np.abs(delta["Delta Importe"].to_numpy())
+    n = min(n, len(delta))
+    # argpartition evita ordenar millones de filas para quedarnos con N
+    idx = np.argpartition(-magnitud, n - 1)[:n]
+    idx = idx[np.argsort(-magnitud[idx], kind="stable")]
+    return delta.iloc[idx].reset_index(drop=True)
+
+
+def resumen_por_almacen(delta: pd.DataFrame):
+    columnas = ["Delta Importe", "Efecto Cantidad", "Efecto Costo", "Efecto Tipo Cambio"]
+    resumen = delta.groupby("Almacen", sort=False)[columnas].sum().reset_index()
+    orden = resumen["Delta Importe"].abs().sort_values(ascending=False).index
+    return resumen.loc[orden].reset_index(drop=True)
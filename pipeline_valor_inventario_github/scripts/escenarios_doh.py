@@ -0,0 +1,170 @@
+# =========================================================
+# MÓDULO: Escenarios what-if de DOH
+# DESCRIPCIÓN: Evalúa muchos escenarios de choque (factor de
+#              venta, fracción de OC que llega, retraso de los
+#              tránsitos; por categoría o por proveedor) sobre
+#              las categorías de Dias Inventario en un solo
+#              cálculo NumPy con forma escenarios × categorías.
+#              Por escenario entrega la distribución del DOH,
+#              las categorías en quiebre y el valor en riesgo.
+# =========================================================
+import itertools
+import json
+
+import numpy as np
+import pandas as pd
+
+# Escenario base: sin choques (reproduce el DOH_PROY de Dias Inventario)
+BASE = {"nombre": "Base", "factor_venta": 1.0, "llegada_oc": 1.0, "retraso_transitos": 0}
+PERCENTILES = [10, 50, 90]
+
+
+# =====================================================
+# DEFINICIÓN DE ESCENARIOS
+# =====================================================
+def rejilla(factores_venta, llegadas_oc, retrasos_transitos):
+    # Producto cartesiano de choques globales: 11 × 3 × 4 = 132 escenarios, etc.
+    escenarios = [dict(BASE)]
+    for f, a, r in itertools.product(factores_venta, llegadas_oc, retrasos_transitos):
+        if (f, a, r) == (1.0, 1.0, 0):
+            continue
+        escenarios.append({
+            "nombre": f"Venta x{f:.2f} | OC {a:.0%} | Tránsito +{r} d",
+            "factor_venta": f, "llegada_oc": a, "retraso_transitos": r,
+        })
+    return escenarios
+
+
+def cargar_escenarios(ruta: str):
+    # JSON con una lista de escenarios (ver config/escenarios_ejemplo.json)
+    with open(ruta, "r", encoding="utf-8") as f:
+        escenarios = json.load(f)
+    if not isinstance(escenarios, list) or not escenarios:
+        raise ValueError(f"{ruta}: se esperaba una lista de escenarios")
+    return escenarios
+
+
+# =====================================================
+# DATOS POR CATEGORÍA
+# =====================================================
+def _normalizar(serie: pd.Series):
+    return serie.astype(str).str.strip().str.upper()
+
+
+def participacion_proveedores(df_oc: pd.DataFrame, articulo_categoria: pd.Series, categorias):
+    # Matriz proveedores × categorías con la fracción del importe de OC
+    # pendiente de cada proveedor dentro de la categoría. Las OC se ligan a
+    # la categoría por el Articulo del Inventario.
+    importe = (pd.to_numeric(df_oc["ImportePendiente"], errors="coerce").fillna(0)
+               * pd.to_numeric(df_oc["TipoCambio"], errors="coerce").fillna(0))
+    oc = pd.DataFrame({
+        "Proveedor": _normalizar(df_oc["Nombre Proveedor"]),
+        "Categoria": _normalizar(df_oc["Articulo"]).map(articulo_categoria),
+        "Importe": importe,
+    }).dropna(subset=["Categoria"])
+    tabla = oc.pivot_table(index="Proveedor", columns="Categoria", values="Importe", aggfunc="sum", fill_value=0)
+    tabla = tabla.reindex(columns=categorias, fill_value=0)
+    total = tabla.sum(axis=0).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraccion = np.where(total > 0, tabla.to_numpy() / total, 0.0)
+    return pd.DataFrame(fraccion, index=tabla.index, columns=categorias)
+
+
+def preparar_categorias(df_doh: pd.DataFrame):
+    # df_doh: salida de calcular_doh (con fila TOTAL). Sus columnas están en
+    # valor, así que el faltante de un escenario ya es el valor en riesgo.
+    df = df_doh[_normalizar(df_doh["Categoria"]) != "TOTAL"].copy()
+    df["Categoria_norm"] = _normalizar(df["Categoria"])
+    for c in ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP"]:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0)
+    return df.reset_index(drop=True)
+
+
+def matrices_choque(escenarios, categorias: pd.Series, proveedores: pd.DataFrame = None):
+    # Arreglos (escenarios × categorías) de factor de venta, llegada de OC y
+    # retraso de tránsitos. Un choque con "categorias" solo aplica a esas;
+    # uno con "proveedores" solo a la parte de la OC de esos proveedores.
+    s, n = len(escenarios), len(categorias)
+    factor = np.ones((s, n))
+    llegada = np.ones((s, n))
+    retraso = np.zeros((s, n))
+    sin_ligar = set()
+    for i, esc in enumerate(escenarios):
+        mascara = np.ones(n, dtype=bool)
+        if esc.get("categorias"):
+            mascara = categorias.isin([str(c).strip().upper() for c in esc["categorias"]]).to_numpy()
+        factor[i] = np.where(mascara, esc.get("factor_venta", 1.0), 1.0)
+        retraso[i] = np.where(mascara, esc.get("retraso_transitos", 0), 0)
+
+        fraccion_oc = mascara.astype(float)
+        if esc.get("proveedores"):
+            elegidos = [str(p).strip().upper() for p in esc["proveedores"]]
+            presentes = [p for p in elegidos if proveedores is not None and p in proveedores.index]
+            sin_ligar.update(set(elegidos) - set(presentes))
+            fraccion_oc = fraccion_oc * (proveedores.loc[presentes].sum(axis=0).to_numpy() if presentes else 0.0)
+        # Solo la fracción afectada de la OC llega en la proporción del choque
+        llegada[i] = 1.0 - (1.0 - esc.get("llegada_oc", 1.0)) * fraccion_oc
+    return factor, llegada, retraso, sin_ligar
+
+
+# =====================================================
+# EVALUACIÓN (un solo cálculo vectorizado)
+# =====================================================
+def evaluar(escenarios, df_cat: pd.DataFrame, horizonte_dias: int, proveedores: pd.DataFrame = None):
+    factor, llegada, retraso, sin_ligar = matrices_choque(escenarios, df_cat["Categoria_norm"], proveedores)
+
+    # Vectores por categoría con forma (1, n) para difundirse contra (s, n)
+    disp = df_cat["Disponible"].to_numpy()[None, :]
+    trans = df_cat["Transitos"].to_numpy()[None, :]
+    oc = df_cat["OCompra"].to_numpy()[None, :]
+    pedidos = df_cat["PedidosP"].to_numpy()[None, :]
+    venta = df_cat["Venta"].to_numpy()[None, :]
+
+    demanda_dia = factor * venta / 360  # misma base que DOH_PROY: VPM * 12 / 360
+    con_venta = demanda_dia > 0
+    a_la_mano = disp - pedidos
+    llegadas = trans * (retraso < horizonte_dias) + llegada * oc
+
+    # Un tránsito que no llega dentro del horizonte no cubre días: sale del
+    # numerador del DOH igual que del faltante
+    with np.errstate(divide="ignore", invalid="ignore"):
+        doh = np.where(con_venta, (a_la_mano + llegadas) / demanda_dia, np.nan)
+
+    # Faltante: demanda del horizonte que no cubren existencias + llegadas, o
+    # la que se pierde mientras se espera un tránsito retrasado
+    faltante = np.maximum.reduce([
+        demanda_dia * horizonte_dias - (a_la_mano + llegadas),
+        demanda_dia * np.minimum(retraso, horizonte_dias) - a_la_mano,
+        np.zeros_like(demanda_dia),
+    ])
+    quiebre = faltante > 0
+
+    # DOH total del escenario con la misma fórmula que la fila TOTAL
+    total_demanda = demanda_dia.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        doh_total = np.where(total_demanda > 0,
+                             (a_la_mano + llegadas).sum(axis=1) / total_demanda, np.nan)
+        percentiles = np.nanpercentile(np.where(con_venta, doh, np.nan), PERCENTILES, axis=1)
+
+    resultado = pd.DataFrame({
+        "Escenario": [e.get("nombre", f"Escenario {i}") for i, e in enumerate(escenarios)],
+        "Factor Venta": [e.get("factor_venta", 1.0) for e in escenarios],
+        "Llegada OC": [e.get("llegada_oc", 1.0) for e in escenarios],
+        "Retraso Transitos": [e.get("retraso_transitos", 0) for e in escenarios],
+        "Alcance": [_alcance(e) for e in escenarios],
+        "DOH Total": doh_total,
+    })
+    for p, valores in zip(PERCENTILES, percentiles):
+        resultado[f"DOH P{p}"] = valores
+    resultado["Categorias en Quiebre"] = quiebre.sum(axis=1)
+    resultado["Valor en Riesgo"] = faltante.sum(axis=1)
+    return resultado, sin_ligar
+
+
+def _alcance(escenario: dict):
+    partes = []
+    if escenario.get("categorias"):
+        partes.append("Categorías: " + ", ".join(map(str, escenario["categorias"])))
+    if escenario.get("proveedores"):
+        partes.append("Proveedores: " + ", ".join(map(str, escenario["proveedores"])))
+    return " | ".join(partes) or "Todas"
@@ -0,0 +1,103 @@
+# =========================================================
+# MÓDULO: Formato compartido para las hojas de Excel
+# DESCRIPCIÓN: Estilos compartidos (fuente y formato numérico);
+#              por rango, columna o fila se aplican solo esos
+#              atributos, sin borrar bordes ni alineación, y el
+#              formato resultante se reutiliza entre celdas con
+#              el mismo formato de origen. Los anchos de
+#              columna se calculan sobre el DataFrame (longitudes
+#              vectorizadas) en lugar de recorrer las celdas.
+# =========================================================
+from copy import copy
+
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter, range_boundaries
+
+FORMATO_MONEDA = '"$"#,##0.00'
+FORMATO_RATIO = "0.00"
+
+# Atributos de cada estilo. No son NamedStyle del libro: asignar cell.style
+# reemplaza bordes y alineación, y se aplican atributo por atributo.
+ESTILO_MONEDA = "moneda"
+ESTILO_RATIO = "ratio"
+ESTILO_ENCABEZADO = "encabezado"
+ESTILO_ENCABEZADO_NORMAL = "encabezado normal"
+ESTILO_TOTAL = "total"
+ESTILO_TOTAL_MONEDA = "total moneda"
+
+ESTILOS = {
+    ESTILO_MONEDA: {"number_format": FORMATO_MONEDA},
+    ESTILO_RATIO: {"number_format": FORMATO_RATIO},
+    ESTILO_ENCABEZADO: {"font": Font(bold=True)},
+    ESTILO_ENCABEZADO_NORMAL: {"font": Font(bold=False)},
+    ESTILO_TOTAL: {"font": Font(bold=True)},
+    ESTILO_TOTAL_MONEDA: {"font": Font(bold=True), "number_format": FORMATO_MONEDA},
+}
+
+
+def rango(min_col: int, min_row: int, max_col: int = None, max_row: int = None):
+    max_col = max_col or min_col
+    max_row = max_row or min_row
+    return f"{get_column_letter(min_col)}{min_row}:{get_column_letter(max_col)}{max_row}"
+
+
+def _celdas(ws, rango_celdas: str):
+    min_col, min_row, max_col, max_row = range_boundaries(rango_celdas)
+    if min_row > max_row or min_col > max_col:
+        return
+    for fila in ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col):
+        yield from fila
+
+
+def aplicar_estilo(ws, rango_celdas: str, estilo: str):
+    # Solo los atributos del estilo (fuente, formato numérico) sobre el formato
+    # que ya tiene la celda: se conservan bordes y alineación de los
+    # encabezados de pandas o de la plantilla. El formato resultante se arma
+    # una vez por formato de origen distinto y luego solo se copia. (Un
+    # column_dimensions no sirve: Excel lo usa solo en celdas vacías.)
+    atributos = ESTILOS[estilo]
+    convertidos = {}
+    for celda in _celdas(ws, rango_celdas):
+        origen = tuple(celda._style or ())  # None: formato por defecto
+        nuevo = convertidos.get(origen)
+        if nuevo is None:
+            for atributo, valor in atributos.items():
+                setattr(celda, atributo, valor)
+            convertidos[origen] = copy(celda._style)
+        else:
+            celda._style = copy(nuevo)
+
+
+def aplicar_formato_numero(ws, rango_celdas: str, formato: str):
+    # Para celdas de plantilla: solo cambia el formato numérico y respeta
+    # bordes, rellenos y fuentes que ya trae el diseño de la hoja.
+    for celda in _celdas(ws, rango_celdas):
+        celda.number_format = formato
+
+
+def anchos_desde_dataframe(ws, df, margen: int = 2, col_inicio: int = 1):
+    # Largo máximo por columna (encabezado incluido) con operaciones vectorizadas
+    for i, col in enumerate(df.columns):
+        valores = df[col].dropna()
+        largo = valores.astype(str).str.len().max() if not valores.empty else 0
+        largo = max(int(largo), len(str(col)))
+        ws.column_dimensions[get_column_letter(col_inicio + i)].width = largo + margen
+
+
+def formatear_tabla(ws, df, columnas_moneda=(), columnas_ratio=(), fila_total: bool = False, margen: int = 2):
+    # Formato estándar de una tabla escrita con df.to_excel(index=False) desde A1
+    n_cols = len(df.columns)
+    ultima_fila = len(df) + 1
+    fin_datos = ultima_fila - 1 if fila_total else ultima_fila
+
+    aplicar_estilo(ws, rango(1, 1, n_cols, 1), ESTILO_ENCABEZADO)
+    for i, col in enumerate(df.columns, start=1):
+        if col in columnas_moneda:
+            aplicar_estilo(ws, rango(i, 2, i, fin_datos), ESTILO_MONEDA)
+        elif col in columnas_ratio:
+            aplicar_estilo(ws, rango(i, 2, i, fin_datos), ESTILO_RATIO)
+        if fila_total:
+            estilo_total = ESTILO_TOTAL_MONEDA if col in columnas_moneda else ESTILO_TOTAL
+            aplicar_estilo(ws, rango(i, ultima_fila), estilo_total)
+
+    anchos_desde_dataframe(ws, df, margen=margen)
@@ -0,0 +1,85 @@
+# =========================================================
+# MÓDULO: Lectores rápidos para los extractos del ERP
+# DESCRIPCIÓN: CSV (plano, .gz, .zst) con el lector multihilo
+#              de Arrow y Parquet/Feather con memory-map.
+#              Si pyarrow no está instalado, CSV cae al parser
+#              C de pandas y Parquet/Feather no se pueden leer.
+# =========================================================
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAY_PYARROW = True
+except ImportError:
+    HAY_PYARROW = False
+
+EXT_CSV = (".csv", ".csv.gz", ".csv.zst")
+EXT_EXCEL = (".xlsx", ".xls")
+EXT_PARQUET = (".parquet",)
+EXT_FEATHER = (".feather",)
+EXTENSIONES_COMPUESTAS = (".csv.gz", ".csv.zst")
+
+
+def extension_de(path: str):
+    # Path.suffix de "X.csv.gz" es ".gz"; aquí devolvemos ".csv.gz"
+    nombre = Path(path).name.lower()
+    for ext in EXTENSIONES_COMPUESTAS:
+        if nombre.endswith(ext):
+            return ext
+    return Path(path).suffix.lower()
+
+
+def leer_csv(path: str, dtype: dict = None, nrows: int = None):
+    # La compresión (.gz / .zst) la detectan pandas y Arrow por la extensión
+    if HAY_PYARROW and nrows is None:
+        if dtype:
+            return _leer_csv_arrow(path, dtype)
+        return pd.read_csv(path, engine="pyarrow")
+    # El motor pyarrow no admite nrows; para muestras se usa el parser C
+    return pd.read_csv(path, dtype=dtype, nrows=nrows, low_memory=False)
+
+
+def _leer_csv_arrow(path: str, dtype: dict):
+    # Con engine="pyarrow", pandas aplica dtype después de inferir los tipos:
+    # "00123" ya llegó como 123 y el str queda "123". Aquí las columnas de
+    # texto se declaran a Arrow antes de convertir.
+    import pyarrow as pa
+    from pyarrow import csv
+    tipos = {c: pa.string() for c, tipo in dtype.items() if tipo is str}
+    opciones = csv.ConvertOptions(column_types=tipos, strings_can_be_null=True)
+    df = csv.read_csv(path, convert_options=opciones).to_pandas()
+    otros = {c: tipo for c, tipo in dtype.items() if tipo is not str}
+    return df.astype(otros) if otros else df
+
+
+def leer_parquet(path: str, columnas=None):
+    if not HAY_PYARROW:
+        raise ImportError("Leer Parquet requiere pyarrow (pip install pyarrow)")
+    return pd.read_parquet(path, engine="pyarrow", columns=columnas, memory_map=True)
+
+
+def leer_feather(path: str, columnas=None):
+    if not HAY_PYARROW:
+        raise ImportError("Leer Feather requiere pyarrow (pip install pyarrow)")
+    from pyarrow import feather
+    return feather.read_table(path, columns=columnas, memory_map=True).to_pandas()
+
+
+def leer_muestra_columnar(path: str, n: int):
+    # Primeras n filas de un Parquet/Feather sin leer el archivo completo
+    import pyarrow as pa
+    if extension_de(path) in EXT_PARQUET:
+        import pyarrow.parquet as pq
+        archivo = pq.ParquetFile(path, memory_map=True)
+        lote = next(archivo.iter_batches(batch_size=n), None)
+        if lote is None:
+            return archivo.schema_arrow.empty_table().to_pandas()
+        return lote.to_pandas()
+
+    with pa.memory_map(path, "r") as fuente:
+        lector = pa.ipc.open_file(fuente)
+        if lector.num_record_batches == 0:
+            return lector.schema.empty_table().to_pandas()
+        return lector.get_batch(0).slice(0, n).to_pandas()
@@ -0,0 +1,528 @@
+# =========================================================
+# MÓDULO: Motores de ejecución para las transformaciones
+# DESCRIPCIÓN: Interfaz única para las etapas de cálculo
+#              (Importe, ABC, DOH, Transitos, pivote de OC y
+#              ventanas de Entradas). Pandas es el motor por
+#              defecto; Polars y DuckDB son opcionales y se
+#              eligen por configuración (MOTOR_DATAFRAME).
+#              Todos los motores devuelven DataFrames de pandas
+#              para que la escritura a Excel no cambie.
+#              Polars y DuckDB son motores solo de cálculo: reciben
+#              el extracto ya cargado en pandas y lo pasan por
+#              Arrow, así que agregan el costo de conversión y no
+#              bajan el pico de memoria (para eso está el modo por
+#              bloques, agregacion_por_bloques.py).
+# =========================================================
+import os
+
+import numpy as np
+import pandas as pd
+
+import delta_inventario
+
+COLUMNAS_IMPORTE = ["Existencias", "CostoPromedio", "TipoCambio"]
+COLUMNAS_DOH = ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP"]
+COLUMNAS_DOH_TOTALES = ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP", "VPM",
+                        "PROYECCION", "DOH_PROY", "DOH_INM", "MESES_FINAL"]
+COLUMNAS_TRANSITOS = ["Mov", "MovID", "Estatus", "FechaEmision", "Articulo", "Descripcion1",
+                      "Cantidad", "AlmacenPartida", "AlmacenDestino", "Costo", "Observaciones",
+                      "CantidadPendiente", "Proyecto", "IMPORTE"]
+SIN_VENTA = "Sin Venta"
+
+
+# =====================================================
+# AUXILIARES COMUNES (lado pandas)
+# =====================================================
+def _importe_con_null(importe: pd.Series):
+    # Convención del reporte: importes en 0 o vacíos se guardan como "NULL"
+    return importe.astype(object).where(importe.notna() & (importe != 0), "NULL")
+
+
+def _con_sin_venta(valores: np.ndarray, vpm: np.ndarray):
+    return pd.Series(valores, dtype=object).where(vpm != 0, SIN_VENTA).to_numpy()
+
+
+def _cerrar_doh(df_doh: pd.DataFrame):
+    # Orden, totales y fila TOTAL: idéntico para todos los motores
+    df_doh = df_doh.sort_values(by="Disponible", ascending=False).reset_index(drop=True)
+
+    totales = {}
+    for col in ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP", "VPM", "PROYECCION"]:
+        totales[col] = df_doh[col].sum()
+    totales["DOH_PROY"] = (totales["Disponible"] + totales["Transitos"] + totales["OCompra"] - totales["PedidosP"]) / (totales["VPM"] * 12 / 360) if totales["VPM"] != 0 else SIN_VENTA
+    totales["DOH_INM"] = ((totales["Disponible"] + totales["Transitos"]) / totales["VPM"]) * 30 if totales["VPM"] != 0 else SIN_VENTA
+    totales["MESES_FINAL"] = totales["DOH_PROY"] / 30 if totales["DOH_PROY"] != SIN_VENTA else SIN_VENTA
+
+    # Por nombre: el extracto puede traer columnas además de las del cálculo
+    fila_total = pd.Series({"Categoria": "TOTAL", **{col: totales[col] for col in COLUMNAS_DOH_TOTALES}})
+    df_doh.loc[len(df_doh)] = fila_total.reindex(df_doh.columns)
+    return df_doh, totales
+
+
+def _con_columnas_doh(df_doh: pd.DataFrame, res: pd.DataFrame):
+    # Polars y DuckDB solo calculan sobre las columnas del DOH; el resto del
+    # extracto se conserva tal cual y en el mismo orden que en pandas
+    calculadas = {c: res[c].to_numpy() for c in COLUMNAS_DOH_TOTALES}
+    return df_doh.reset_index(drop=True).assign(**calculadas)
+
+
+def _cerrar_pivot_oc(resumen_oc: pd.DataFrame):
+    # Recibe la tabla dinámica (índice = Nombre Proveedor) y le da el formato del reporte
+    resumen_oc["IMPORTE PENDIENTE"] = resumen_oc.sum(axis=1)
+    resumen_oc = resumen_oc.sort_values(by="IMPORTE PENDIENTE", ascending=False)
+
+    resumen_oc = resumen_oc.reset_index()
+    resumen_oc = resumen_oc.rename(columns={"Nombre Proveedor": "NOMBRE DE PROVEEDOR"})
+    resumen_oc["NOMBRE DE PROVEEDOR"] = resumen_oc["NOMBRE DE PROVEEDOR"].astype(str).str.upper()
+
+    cols_proyectos = [c for c in resumen_oc.columns if c not in ["NOMBRE DE PROVEEDOR", "IMPORTE PENDIENTE"]]
+    resumen_oc = resumen_oc[["NOMBRE DE PROVEEDOR", "IMPORTE PENDIENTE"] + cols_proyectos]
+
+    fila_totales = {"NOMBRE DE PROVEEDOR": "TOTAL GENERAL"}
+    for col_tot in resumen_oc.columns:
+        if col_tot != "NOMBRE DE PROVEEDOR":
+            fila_totales[col_tot] = resumen_oc[col_tot].sum()
+    return pd.concat([resumen_oc, pd.DataFrame([fila_totales])], ignore_index=True)
+
+
+def _almacenes_norm(almacenes):
+    # Mismo criterio que el cruce del delta: "101", 101 y 101.0 son el mismo almacén
+    return delta_inventario.normalizar_llave(pd.Series(list(almacenes), dtype=object)).tolist()
+
+
+def _texto_plano(df: pd.DataFrame, columnas):
+    # Columnas object con tipos mezclados (int/str) rompen la conversión a
+    # Arrow; se pasan a texto conservando los vacíos.
+    sub = df[[c for c in columnas if c in df.columns]].copy()
+    for c in sub.columns:
+        if sub[c].dtype == object:
+            sub[c] = sub[c].where(sub[c].isna(), sub[c].astype(str))
+    return sub
+
+
+# =====================================================
+# MOTOR PANDAS (por defecto)
+# =====================================================
+class MotorPandas:
+    nombre = "pandas"
+
+    def __init__(self, **opciones):
+        self.opciones = opciones
+
+    # Los motores no escriben en los DataFrames que reciben: son salidas de
+    # otras etapas (y de sus checkpoints) que se leen en paralelo.
+    def agregar_importe(self, df_inventario: pd.DataFrame):
+        numericas = {c: pd.to_numeric(df_inventario[c], errors="coerce").fillna(0) for c in COLUMNAS_IMPORTE}
+        importe = numericas["Existencias"] * numericas["CostoPromedio"] * numericas["TipoCambio"]
+        return df_inventario.assign(**numericas, Importe=_importe_con_null(importe))
+
+    def importe_por_almacen(self, df_inventario: pd.DataFrame):
+        validos = df_inventario[df_inventario["Importe"] != "NULL"]
+        return validos.groupby("Almacen")["Importe"].sum()
+
+    def importe_por_categoria(self, df_inventario: pd.DataFrame, almacenes):
+        # Llave normalizada en los dos lados (igual que Polars y DuckDB): el extracto
+        # puede traer 101, 101.0 o "101" y la hoja de análisis el número
+        almacen = delta_inventario.normalizar_llave(df_inventario["Almacen"])
+        filtrado = df_inventario[almacen.isin(_almacenes_norm(almacenes))]
+        filtrado = filtrado[filtrado["Importe"] != "NULL"]
+        return filtrado.groupby("Categoria")["Importe"].sum().reset_index()
+
+    def sumas_abc(self, df_inventario: pd.DataFrame):
+        # Sin agregar columnas al Inventario: otras etapas lo leen en paralelo
+        almacen_norm = df_inventario["Almacen"].astype(str).str.strip().str.upper().rename("Almacen_norm")
+        abc_norm = (
+            df_inventario["ABCGeneral"]
+            .astype(str)
+            .str.strip()
+            .str.upper()
+            .fillna("NULL")  # pandas 3 conserva los vacíos al pasar a str
+            .replace({"": "NULL", "NAN": "NULL", "NONE": "NULL"})
+            .rename("ABCGeneral_norm")
+        )
+        importe_n = pd.to_numeric(df_inventario["Importe"], errors="coerce").fillna(0).rename("Importe_n")
+        return importe_n.groupby([almacen_norm, abc_norm]).sum().reset_index()
+
+    def calcular_doh(self, df_doh: pd.DataFrame):
+        df_doh = df_doh.copy()
+        for col in COLUMNAS_DOH:
+            df_doh[col] = pd.to_numeric(df_doh[col], errors="coerce").fillna(0)
+
+        df_doh["VPM"] = df_doh["Venta"] / 12
+        df_doh["PROYECCION"] = df_doh["Disponible"] + df_doh["Transitos"] + df_doh["OCompra"] - df_doh["PedidosP"]
+
+        vpm = df_doh["VPM"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            doh_proy = (df_doh["Disponible"] + df_doh["Transitos"] + df_doh["OCompra"] - df_doh["PedidosP"]).to_numpy() / (vpm * 12 / 360)
+            doh_inm = ((df_doh["Disponible"] + df_doh["Transitos"]).to_numpy() / vpm) * 30
+        df_doh["DOH_PROY"] = _con_sin_venta(doh_proy, vpm)
+        df_doh["DOH_INM"] = _con_sin_venta(doh_inm, vpm)
+        df_doh["MESES_FINAL"] = _con_sin_venta(doh_proy / 30, vpm)
+
+        return _cerrar_doh(df_doh)
+
+    def filtrar_transitos(self, df_transitos: pd.DataFrame):
+        df_transitos = df_transitos[df_transitos["Mov"].str.strip().str.upper() == "TRANSITO"].copy()
+        df_transitos["CantidadPendiente"] = pd.to_numeric(df_transitos["CantidadPendiente"], errors="coerce").fillna(0)
+        df_transitos["Costo"] = pd.to_numeric(df_transitos["Costo"], errors="coerce").fillna(0)
+        df_transitos["IMPORTE"] = df_transitos["CantidadPendiente"] * df_transitos["Costo"]
+        df_transitos["Proyecto"] = ""
+        return df_transitos[[c for c in COLUMNAS_TRANSITOS if c in df_transitos.columns]]
+
+    def pivot_oc(self, df_oc: pd.DataFrame):
+        importe = (pd.to_numeric(df_oc["ImportePendiente"], errors="coerce").fillna(0)
+                   * pd.to_numeric(df_oc["TipoCambio"], errors="coerce").fillna(0))
+        proyecto = df_oc["Proyecto"].fillna("sin asignar").replace("", "sin asignar").astype(str).str.strip().str.lower()
+        oc = pd.DataFrame({
+            "Nombre Proveedor": df_oc["Nombre Proveedor"],
+            "Proyecto": proyecto,
+            "Importe pendiente OK": importe,
+        })
+
+        resumen_oc = oc.pivot_table(
+            index="Nombre Proveedor",
+            columns="Proyecto",
+            values="Importe pendiente OK",
+            aggfunc="sum",
+            fill_value=0
+        )
+        return _cerrar_pivot_oc(resumen_oc)
+
+    def entradas_ventanas(self, df_entradas: pd.DataFrame, date_str: str):
+        # Devuelve (top 10 del último día operativo, importe de ese día, acumulado del mes)
+        # Copia de las 3 columnas: el extracto original se escribe tal cual en su hoja
+        df_entradas = df_entradas[["Nombre", "FechaEmision", "Importe2"]].copy()
+        df_entradas["Importe2"] = pd.to_numeric(df_entradas["Importe2"], errors="coerce").fillna(0)
+        df_entradas["FechaEmision"] = pd.to_datetime(df_entradas["FechaEmision"], errors="coerce")
+        fecha_hoy_dt = pd.to_datetime(date_str, format="%Y%m%d")
+
+        fechas_anteriores = df_entradas[df_entradas["FechaEmision"].dt.date < fecha_hoy_dt.date()]
+        fecha_ayer = fechas_anteriores["FechaEmision"].max()
+        df_solo_ayer = df_entradas[df_entradas["FechaEmision"] == fecha_ayer]
+
+        top_10_df = df_solo_ayer.groupby("Nombre")["Importe2"].sum().reset_index()
+        top_10_df = top_10_df.sort_values(by="Importe2", ascending=False).head(10)
+
+        importe_dia_anterior = df_solo_ayer["Importe2"].sum() if not fechas_anteriores.empty else 0
+
+        inicio_mes = fecha_hoy_dt.replace(day=1)
+        importe_acumulado_mes = df_entradas[
+            (df_entradas["FechaEmision"].dt.date >= inicio_mes.date()) &
+            (df_entradas["FechaEmision"].dt.date <= fecha_hoy_dt.date())
+        ]["Importe2"].sum()
+
+        return top_10_df, importe_dia_anterior, importe_acumulado_mes, fecha_ayer
+
+
+# =====================================================
+# MOTOR POLARS (multihilo, perezoso)
+# =====================================================
+class MotorPolars(MotorPandas):
+    nombre = "polars"
+
+    def __init__(self, **opciones):
+        import polars as pl
+        self.pl = pl
+        self.opciones = opciones
+
+    def _lazy(self, df, columnas):
+        return self.pl.from_pandas(_texto_plano(df, columnas)).lazy()
+
+    def _collect(self, lf):
+        # El motor streaming procesa por lotes y no necesita todo en memoria
+        try:
+            return lf.collect(engine="streaming")
+        except TypeError:
+            return lf.collect(streaming=True)
+
+    def _llave(self, col):
+        # Equivalente de delta_inventario.normalizar_llave
+        return (self.pl.col(col).cast(self.pl.Utf8).str.strip_chars()
+                .str.replace(delta_inventario.PATRON_CODIGO_ENTERO, "${1}"))
+
+    def _num(self, col):
+        pl = self.pl
+        return pl.col(col).cast(pl.Float64, strict=False).fill_null(0).fill_nan(0)
+
+    def agregar_importe(self, df_inventario: pd.DataFrame):
+        pl = self.pl
+        res = self._collect(
+            self._lazy(df_inventario, COLUMNAS_IMPORTE)
+            .select([self._num(c) for c in COLUMNAS_IMPORTE])
+            .with_columns((pl.col("Existencias") * pl.col("CostoPromedio") * pl.col("TipoCambio")).alias("Importe"))
+        ).to_pandas()
+        numericas = {c: res[c].to_numpy() for c in COLUMNAS_IMPORTE}
+        importe = pd.Series(res["Importe"].to_numpy(), index=df_inventario.index)
+        return df_inventario.assign(**numericas, Importe=_importe_con_null(importe))
+
+    def _importe_numerico(self, df_inventario, columnas):
+        # "NULL" -> null; con eso las sumas ignoran los importes en cero
+        sub = df_inventario[columnas].copy()
+        sub["Importe"] = pd.to_numeric(df_inventario["Importe"], errors="coerce")
+        return self._lazy(sub, list(sub.columns))
+
+    def importe_por_almacen(self, df_inventario: pd.DataFrame):
+        pl = self.pl
+        res = self._collect(
+            self._importe_numerico(df_inventario, ["Almacen"])
+            .filter(pl.col("Importe").is_not_null())
+            .group_by("Almacen").agg(pl.col("Importe").sum())
+        ).to_pandas()
+        return res.set_index("Almacen")["Importe"].sort_index()
+
+    def importe_por_categoria(self, df_inventario: pd.DataFrame, almacenes):
+        pl = self.pl
+        res = self._collect(
+            self._importe_numerico(df_inventario, ["Almacen", "Categoria"])
+            # Llave normalizada en los dos lados (ver MotorPandas.importe_por_categoria)
+            .filter(self._llave("Almacen").is_in(_almacenes_norm(almacenes)) & pl.col("Importe").is_not_null())
+            .group_by("Categoria").agg(pl.col("Importe").sum())
+        ).to_pandas()
+        return res.sort_values("Categoria").reset_index(drop=True)
+
+    def sumas_abc(self, df_inventario: pd.DataFrame):
+        pl = self.pl
+        sub = df_inventario[["Almacen", "ABCGeneral"]].astype(str)
+        sub["Importe_n"] = pd.to_numeric(df_inventario["Importe"], errors="coerce").fillna(0)
+        abc = pl.col("ABCGeneral").str.strip_chars().str.to_uppercase()
+        res = self._collect(
+            self._lazy(sub, list(sub.columns))
+            .with_columns(
+                pl.col("Almacen").str.strip_chars().str.to_uppercase().alias("Almacen_norm"),
+                pl.when(abc.is_null() | abc.is_in(["", "NAN", "NONE"])).then(pl.lit("NULL")).otherwise(abc).alias("ABCGeneral_norm"),
+            )
+            .group_by(["Almacen_norm", "ABCGeneral_norm"]).agg(pl.col("Importe_n").sum())
+        ).to_pandas()
+        return res.sort_values(["Almacen_norm", "ABCGeneral_norm"]).reset_index(drop=True)
+
+    def calcular_doh(self, df_doh: pd.DataFrame):
+        pl = self.pl
+        res = self._collect(
+            self._lazy(df_doh, ["Categoria"] + COLUMNAS_DOH)
+            .with_columns([self._num(c) for c in COLUMNAS_DOH])
+            .with_columns((pl.col("Venta") / 12).alias("VPM"))
+            .with_columns(
+                (pl.col("Disponible") + pl.col("Transitos") + pl.col("OCompra") - pl.col("PedidosP")).alias("PROYECCION"),
+            )
+            .with_columns(
+                (pl.col("PROYECCION") / (pl.col("VPM") * 12 / 360)).alias("DOH_PROY"),
+                ((pl.col("Disponible") + pl.col("Transitos")) / pl.col("VPM") * 30).alias("DOH_INM"),
+            )
+        ).to_pandas()
+
+        vpm = res["VPM"].to_numpy()
+        doh_proy = res["DOH_PROY"].to_numpy()
+        res["DOH_PROY"] = _con_sin_venta(doh_proy, vpm)
+        res["DOH_INM"] = _con_sin_venta(res["DOH_INM"].to_numpy(), vpm)
+        res["MESES_FINAL"] = _con_sin_venta(doh_proy / 30, vpm)
+        return _cerrar_doh(_con_columnas_doh(df_doh, res))
+
+    def filtrar_transitos(self, df_transitos: pd.DataFrame):
+        pl = self.pl
+        columnas = [c for c in COLUMNAS_TRANSITOS if c in df_transitos.columns and c != "IMPORTE"]
+        res = self._collect(
+            self._lazy(df_transitos, columnas)
+            .filter(pl.col("Mov").str.strip_chars().str.to_uppercase() == "TRANSITO")
+            .with_columns(self._num("CantidadPendiente"), self._num("Costo"), pl.lit("").alias("Proyecto"))
+            .with_columns((pl.col("CantidadPendiente") * pl.col("Costo")).alias("IMPORTE"))
+        ).to_pandas()
+        return res[[c for c in COLUMNAS_TRANSITOS if c in res.columns]]
+
+    def pivot_oc(self, df_oc: pd.DataFrame):
+        pl = self.pl
+        proyecto = pl.col("Proyecto").fill_null("sin asignar").str.strip_chars()
+        agg = self._collect(
+            self._lazy(df_oc, ["Nombre Proveedor", "Proyecto", "ImportePendiente", "TipoCambio"])
+            .with_columns(
+                (self._num("ImportePendiente") * self._num("TipoCambio")).alias("Importe pendiente OK"),
+                pl.when(pl.col("Proyecto").fill_null("") == "").then(pl.lit("sin asignar"))
+                .otherwise(proyecto).str.to_lowercase().alias("Proyecto"),
+            )
+            .group_by(["Nombre Proveedor", "Proyecto"]).agg(pl.col("Importe pendiente OK").sum())
+        ).to_pandas()
+        # El pivote final es pequeño (proveedores x proyectos); se arma en pandas
+        resumen_oc = agg.pivot_table(index="Nombre Proveedor", columns="Proyecto",
+                                     values="Importe pendiente OK", aggfunc="sum", fill_value=0)
+        return _cerrar_pivot_oc(resumen_oc)
+
+    def entradas_ventanas(self, df_entradas: pd.DataFrame, date_str: str):
+        pl = self.pl
+        # Copia de las 3 columnas: el extracto original se escribe tal cual en su hoja
+        df_entradas = df_entradas[["Nombre", "FechaEmision", "Importe2"]].copy()
+        df_entradas["Importe2"] = pd.to_numeric(df_entradas["Importe2"], errors="coerce").fillna(0)
+        df_entradas["FechaEmision"] = pd.to_datetime(df_entradas["FechaEmision"], errors="coerce")
+        fecha_hoy_dt = pd.to_datetime(date_str, format="%Y%m%d")
+        inicio_mes = fecha_hoy_dt.replace(day=1)
+
+        lf = self._lazy(df_entradas, ["Nombre", "FechaEmision", "Importe2"])
+        fecha_ayer = self._collect(
+            lf.filter(pl.col("FechaEmision").dt.date() < fecha_hoy_dt.date()).select(pl.col("FechaEmision").max())
+        ).item()
+        fecha_ayer = pd.Timestamp(fecha_ayer) if fecha_ayer is not None else pd.NaT
+
+        solo_ayer = lf.filter(pl.col("FechaEmision") == fecha_ayer.to_pydatetime()) if pd.notna(fecha_ayer) else lf.filter(pl.lit(False))
+        top = self._collect(solo_ayer.group_by("Nombre").agg(pl.col("Importe2").sum())).to_pandas()
+        top_10_df = top.sort_values("Nombre").sort_values(by="Importe2", ascending=False).head(10)
+        importe_dia_anterior = float(top["Importe2"].sum()) if pd.notna(fecha_ayer) else 0
+
+        importe_acumulado_mes = self._collect(
+            lf.filter(pl.col("FechaEmision").dt.date().is_between(inicio_mes.date(), fecha_hoy_dt.date()))
+            .select(pl.col("Importe2").sum())
+        ).item()
+        return top_10_df, importe_dia_anterior, importe_acumulado_mes, fecha_ayer
+
+
+# =====================================================
+# MOTOR DUCKDB (SQL multihilo con desborde a disco)
+# =====================================================
+class MotorDuckDB(MotorPandas):
+    nombre = "duckdb"
+
+    def __init__(self, memoria_max: str = None, carpeta_temporal: str = None, **opciones):
+        import duckdb
+        self.opciones = opciones
+        self.con = duckdb.connect()
+        self.con.execute(f"SET threads TO {os.cpu_count() or 1}")
+        if memoria_max:
+            self.con.execute(f"SET memory_limit = '{memoria_max}'")
+        if carpeta_temporal:
+            # Si la agregación no cabe en memory_limit, DuckDB desborda aquí
+            self.con.execute(f"SET temp_directory = '{carpeta_temporal}'")
+
+    def _sql(self, consulta, **tablas):
+        for nombre, df in tablas.items():
+            self.con.register(nombre, df)
+        try:
+            return self.con.execute(consulta).df()
+        finally:
+            for nombre in tablas:
+                self.con.unregister(nombre)
+
+    def _importe_numerico(self, df_inventario, columnas):
+        sub = _texto_plano(df_inventario, columnas)
+        sub["Importe"] = pd.to_numeric(df_inventario["Importe"], errors="coerce")
+        return sub
+
+    def agregar_importe(self, df_inventario: pd.DataFrame):
+        res = self._sql(
+            """
+            SELECT COALESCE(TRY_CAST(Existencias AS DOUBLE), 0) AS Existencias,
+                   COALESCE(TRY_CAST(CostoPromedio AS DOUBLE), 0) AS CostoPromedio,
+                   COALESCE(TRY_CAST(TipoCambio AS DOUBLE), 0) AS TipoCambio
+            FROM inv
+            """,
+            inv=_texto_plano(df_inventario, COLUMNAS_IMPORTE),
+        )
+        numericas = {c: pd.Series(res[c].to_numpy(), index=df_inventario.index) for c in COLUMNAS_IMPORTE}
+        importe = numericas["Existencias"] * numericas["CostoPromedio"] * numericas["TipoCambio"]
+        return df_inventario.assign(**numericas, Importe=_importe_con_null(importe))
+
+    def importe_por_almacen(self, df_inventario: pd.DataFrame):
+        res = self._sql(
+            "SELECT Almacen, SUM(Importe) AS Importe FROM inv WHERE Importe IS NOT NULL GROUP BY Almacen ORDER BY Almacen",
+            inv=self._importe_numerico(df_inventario, ["Almacen"]),
+        )
+        return res.set_index("Almacen")["Importe"]
+
+    def importe_por_categoria(self, df_inventario: pd.DataFrame, almacenes):
+        # Llave normalizada en los dos lados (ver MotorPandas.importe_por_categoria)
+        res = self._sql(
+            f"""
+            SELECT Categoria, SUM(Importe) AS Importe FROM inv
+            WHERE Importe IS NOT NULL
+              AND regexp_replace(TRIM(CAST(Almacen AS VARCHAR)), '{delta_inventario.PATRON_CODIGO_ENTERO}', '\\1')
+                  IN (SELECT Almacen FROM alm)
+            GROUP BY Categoria ORDER BY Categoria
+            """,
+            inv=self._importe_numerico(df_inventario, ["Almacen", "Categoria"]),
+            alm=pd.DataFrame({"Almacen": _almacenes_norm(almacenes)}),
+        )
+        return res
+
+    def sumas_abc(self, df_inventario: pd.DataFrame):
+        sub = df_inventario[["Almacen", "ABCGeneral"]].astype(str)
+        sub["Importe_n"] = pd.to_numeric(df_inventario["Importe"], errors="coerce").fillna(0)
+        return self._sql(
+            """
+            SELECT UPPER(TRIM(Almacen)) AS Almacen_norm,
+                   CASE WHEN COALESCE(UPPER(TRIM(ABCGeneral)), '') IN ('', 'NAN', 'NONE') THEN 'NULL'
+                        ELSE UPPER(TRIM(ABCGeneral)) END AS ABCGeneral_norm,
+                   SUM(Importe_n) AS Importe_n
+            FROM inv GROUP BY ALL ORDER BY ALL
+            """,
+            inv=sub,
+        )
+
+    def calcular_doh(self, df_doh: pd.DataFrame):
+        res = self._sql(
+            """
+            WITH base AS (
+                SELECT Categoria,
+                       COALESCE(TRY_CAST(Disponible AS DOUBLE), 0) AS Disponible,
+                       COALESCE(TRY_CAST(Transitos AS DOUBLE), 0) AS Transitos,
+                       COALESCE(TRY_CAST(Venta AS DOUBLE), 0) AS Venta,
+                       COALESCE(TRY_CAST(OCompra AS DOUBLE), 0) AS OCompra,
+                       COALESCE(TRY_CAST(PedidosP AS DOUBLE), 0) AS PedidosP
+                FROM doh
+            )
+            SELECT *, Venta / 12 AS VPM,
+                   Disponible + Transitos + OCompra - PedidosP AS PROYECCION,
+                   (Disponible + Transitos + OCompra - PedidosP) / NULLIF(Venta / 12 * 12 / 360, 0) AS DOH_PROY,
+                   (Disponible + Transitos) / NULLIF(Venta / 12, 0) * 30 AS DOH_INM
+            FROM base
+            """,
+            doh=_texto_plano(df_doh, ["Categoria"] + COLUMNAS_DOH),
+        )
+        vpm = res["VPM"].to_numpy()
+        doh_proy = res["DOH_PROY"].to_numpy(dtype=float)
+        res["DOH_PROY"] = _con_sin_venta(doh_proy, vpm)
+        res["DOH_INM"] = _con_sin_venta(res["DOH_INM"].to_numpy(dtype=float), vpm)
+        res["MESES_FINAL"] = _con_sin_venta(doh_proy / 30, vpm)
+        return _cerrar_doh(_con_columnas_doh(df_doh, res))
+
+    def filtrar_transitos(self, df_transitos: pd.DataFrame):
+        columnas = [c for c in COLUMNAS_TRANSITOS if c in df_transitos.columns and c not in ("IMPORTE", "Proyecto")]
+        res = self._sql(
+            """
+            SELECT * REPLACE (
+                       COALESCE(TRY_CAST(CantidadPendiente AS DOUBLE), 0) AS CantidadPendiente,
+                       COALESCE(TRY_CAST(Costo AS DOUBLE), 0) AS Costo),
+                   '' AS Proyecto,
+                   COALESCE(TRY_CAST(CantidadPendiente AS DOUBLE), 0) * COALESCE(TRY_CAST(Costo AS DOUBLE), 0) AS IMPORTE
+            FROM tr WHERE UPPER(TRIM(Mov)) = 'TRANSITO'
+            """,
+            tr=_texto_plano(df_transitos, columnas),
+        )
+        return res[[c for c in COLUMNAS_TRANSITOS if c in res.columns]]
+
+    def pivot_oc(self, df_oc: pd.DataFrame):
+        agg = self._sql(
+            """
+            SELECT "Nombre Proveedor",
+                   LOWER(CASE WHEN COALESCE(Proyecto, '') = '' THEN 'sin asignar' ELSE TRIM(Proyecto) END) AS Proyecto,
+                   SUM(COALESCE(TRY_CAST(ImportePendiente AS DOUBLE), 0) * COALESCE(TRY_CAST(TipoCambio AS DOUBLE), 0)) AS "Importe pendiente OK"
+            FROM oc GROUP BY ALL
+            """,
+            oc=_texto_plano(df_oc, ["Nombre Proveedor", "Proyecto", "ImportePendiente", "TipoCambio"]),
+        )
+        resumen_oc = agg.pivot_table(index="Nombre Proveedor", columns="Proyecto",
+                                     values="Importe pendiente OK", aggfunc="sum", fill_value=0)
+        return _cerrar_pivot_oc(resumen_oc)
+
+
+MOTORES = {
+    "pandas": MotorPandas,
+    "polars": MotorPolars,
+    "duckdb": MotorDuckDB,
+}
+
+
+def obtener_motor(nombre: str = "pandas", **opciones):
+    nombre = (nombre or "pandas").lower()
+    if nombre not in MOTORES:
+        raise ValueError(f"Motor desconocido: '{nombre}'. Opciones: {list(MOTORES)}")
+    try:
+        return MOTORES[nombre](**opciones)
+    except ImportError as e:
+        print(f"⚠ No se pudo cargar el motor '{nombre}' ({e}); se usará pandas.")
+        return MotorPandas()
@@ -0,0 +1,231 @@
+# =========================================================
+# MÓDULO: Ejecución multi-empresa
+# DESCRIPCIÓN: Corre el pipeline de Valor de Inventario para
+#              varias empresas / regiones definidas en un JSON,
+#              en paralelo (pool de procesos acotado), comparte
+#              el parseo de los extractos que leen varias
+#              empresas (si "cache_fuentes" está activo) y genera
+#              un consolidado (Excel + portal).
+#
+# USO:
+#   python multi_empresa.py ../config/empresas_ejemplo.json --max-procesos 4
+# =========================================================
+import argparse
+import contextlib
+import json
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+
+import valor_inventario
+import actualizar_portal
+
+ARCHIVO_CONSOLIDADO = "Consolidado Empresas.xlsx"
+HOJA_CONSOLIDADO = "Consolidado"
+LOG_EMPRESA = "ejecucion.log"
+
+
+# =====================================================
+# CONFIGURACIÓN
+# =====================================================
+def _resolver(ruta, base: Path):
+    # Rutas relativas en el JSON se toman desde la carpeta del JSON
+    if ruta is None:
+        return None
+    ruta = Path(ruta)
+    return str(ruta if ruta.is_absolute() or str(ruta).startswith("\\\\") else (base / ruta).resolve())
+
+
+def cargar_configuracion(ruta_config: str):
+    base = Path(ruta_config).resolve().parent
+    with open(ruta_config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+
+    defecto = valor_inventario.configuracion_por_defecto()
+    carpeta_cache = _resolver(config.get("carpeta_cache"), base) or defecto["carpeta_cache"]
+    # La cache de extractos es opcional: guarda en disco cada extracto parseado
+    usar_cache = config.get("cache_fuentes", valor_inventario.CACHE_FUENTES)
+    carpeta_cache_fuentes = os.path.join(carpeta_cache, "fuentes") if usar_cache else None
+
+    empresas = []
+    nombres = Counter(e["nombre"] for e in config["empresas"])
+    repetidos = [n for n, c in nombres.items() if c > 1]
+    if repetidos:
+        raise ValueError(f"Nombres de empresa repetidos en la configuración: {repetidos}")
+
+    for e in config["empresas"]:
+        empresas.append({
+            "nombre": e["nombre"],
+            "carpeta_origen": _resolver(e["carpeta_origen"], base),
+            "carpeta_destino": _resolver(e["carpeta_destino"], base),
+            # Cada empresa tiene sus propios snapshots para el delta diario
+            "carpeta_cache": os.path.join(carpeta_cache, "empresas", e["nombre"]),
+            "carpeta_cache_fuentes": carpeta_cache_fuentes,
+            "objetivo": e.get("objetivo", defecto["objetivo"]),
+            "tipos_almacen": e.get("tipos_almacen", defecto["tipos_almacen"]),
+            "clasificaciones": e.get("clasificaciones", defecto["clasificaciones"]),
+            "plantilla": _resolver(e.get("plantilla"), base),
+        })
+
+    return {
+        "empresas": empresas,
+        "carpeta_consolidado": _resolver(config.get("carpeta_consolidado", "consolidado"), base),
+        "carpeta_cache_fuentes": carpeta_cache_fuentes,
+        "max_procesos": config.get("max_procesos"),
+    }
+
+
+# =====================================================
+# TRABAJO POR PROCESO
+# =====================================================
+def _ejecutar_empresa(empresa: dict, reanudar: bool = False, comando_reanudar: str = None):
+    # Corre en un proceso del pool. La salida de cada empresa va a su propio
+    # log para que las corridas en paralelo no se mezclen en consola.
+    os.makedirs(empresa["carpeta_destino"], exist_ok=True)
+    destino_libro = os.path.join(empresa["carpeta_destino"], "Valor de Inventario.xlsx")
+    if empresa.get("plantilla") and not os.path.exists(destino_libro):
+        shutil.copy2(empresa["plantilla"], destino_libro)
+
+    parametros = {k: v for k, v in empresa.items() if k != "plantilla"}
+    ruta_log = os.path.join(empresa["carpeta_destino"], LOG_EMPRESA)
+    with open(ruta_log, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        info = valor_inventario.main(parametros, reanudar=reanudar or None, comando_reanudar=comando_reanudar)
+    return empresa["nombre"], info, ruta_log
+
+
+def _precargar_fuente(ruta: str, prefix: str, carpeta_cache_fuentes: str):
+    # Con el mismo prefijo que usará cada empresa, para caer en la misma llave
+    valor_inventario.cargar_con_cache(ruta, carpeta_cache_fuentes, prefix)
+    return ruta
+
+
+def fuentes_compartidas(empresas, date_str: str):
+    # Extractos (ruta, prefijo) que leen dos o más empresas: se parsean una sola vez
+    conteo = Counter()
+    for empresa in empresas:
+        for pref in valor_inventario.PREFIXES:
+            if pref == "Inventario" and valor_inventario.MODO_POR_BLOQUES:
+                continue  # en modo por bloques el Inventario no se parsea completo
+            try:
+                ruta = valor_inventario.encontrar_archivo(empresa["carpeta_origen"], pref, date_str)
+            except FileNotFoundError:
+                ruta = None
+            if ruta is not None:
+                conteo[(os.path.abspath(ruta), pref)] += 1
+    return [fuente for fuente, n in conteo.items() if n > 1]
+
+
+# =====================================================
+# CONSOLIDADO
+# =====================================================
+def consolidar(resultados: dict, carpeta_consolidado: str):
+    filas = []
+    for nombre, info in resultados.items():
+        if info is None:
+            continue
+        doh = info["doh"] if isinstance(info["doh"], (int, float)) else None
+        filas.append({
+            "Empresa": nombre,
+            "Fecha": info["fecha"],
+            "Valor Fisico": info["v_fisico"],
+            "Valor Transito": info["v_transito"],
+            "Valor Total": info["v_total"],
+            "Objetivo": info["objetivo"],
+            "Brecha vs Objetivo": info["v_total"] - info["objetivo"],
+            "DOH Proyectado": doh,
+            "Variacion Diaria": info["v_diaria"],
+            "Entradas Ayer": info["e_ayer"],
+            "Entradas Mes": info["e_mes"],
+        })
+    if not filas:
+        print("❌ Ninguna empresa terminó correctamente; no se genera consolidado.")
+        return None
+
+    df = pd.DataFrame(filas).sort_values("Valor Total", ascending=False).reset_index(drop=True)
+    total = {"Empresa": "TOTAL", "Fecha": df["Fecha"].iloc[0]}
+    for col in ["Valor Fisico", "Valor Transito", "Valor Total", "Objetivo", "Brecha vs Objetivo",
+                "Variacion Diaria", "Entradas Ayer", "Entradas Mes"]:
+        total[col] = df[col].sum()
+    # DOH total ponderado por valor físico (no es sumable entre empresas)
+    con_doh = df.dropna(subset=["DOH Proyectado"])
+    peso = con_doh["Valor Fisico"].sum()
+    total["DOH Proyectado"] = (con_doh["DOH Proyectado"] * con_doh["Valor Fisico"]).sum() / peso if peso else None
+    df = pd.concat([df, pd.DataFrame([total])], ignore_index=True)
+
+    os.makedirs(carpeta_consolidado, exist_ok=True)
+    ruta_libro = os.path.join(carpeta_consolidado, ARCHIVO_CONSOLIDADO)
+    with pd.ExcelWriter(ruta_libro, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name=HOJA_CONSOLIDADO, index=False)
+    print(f"✔ Consolidado Excel generado: {ruta_libro}")
+
+    actualizar_portal.actualizar_consolidado({
+        "ruta_destino": carpeta_consolidado,
+        "fecha": total["Fecha"],
+        "empresas": df.iloc[:-1].to_dict(orient="records"),
+        "total": total,
+    })
+    print(f"✔ Portal consolidado generado en: {carpeta_consolidado}")
+    return df
+
+
+# =====================================================
+# ORQUESTACIÓN
+# =====================================================
+def ejecutar_empresas(ruta_config: str, max_procesos: int = None, reanudar: bool = False):
+    config = cargar_configuracion(ruta_config)
+    empresas = config["empresas"]
+    max_procesos = max_procesos or config["max_procesos"] or min(len(empresas), os.cpu_count() or 1)
+    date_str, _ = valor_inventario.fecha_de_corte()
+    # Cada empresa reanuda su última ejecución de la fecha (el run id de una
+    # sola empresa no sirve con valor_inventario.py: es de otra empresa y caché)
+    comando_reanudar = f'python multi_empresa.py "{ruta_config}" --resume'
+
+    print(f"=== MULTI-EMPRESA: {len(empresas)} empresa(s), hasta {max_procesos} en paralelo ===")
+
+    with ProcessPoolExecutor(max_workers=max_procesos) as pool:
+        # 1. Precarga de extractos compartidos (un parseo por archivo)
+        compartidas = fuentes_compartidas(empresas, date_str) if config["carpeta_cache_fuentes"] else []
+        if compartidas:
+            print(f"ℹ {len(compartidas)} extracto(s) compartidos; se parsean una sola vez.")
+            futuros = [pool.submit(_precargar_fuente, ruta, pref, config["carpeta_cache_fuentes"])
+                       for ruta, pref in compartidas]
+            for futuro in as_completed(futuros):
+                try:
+                    futuro.result()
+                except Exception as e:
+                    print(f"⚠ No se pudo precargar un extracto compartido: {e}")
+
+        # 2. Una corrida completa del pipeline por empresa
+        resultados = {}
+        futuros = {pool.submit(_ejecutar_empresa, e, reanudar, comando_reanudar): e["nombre"] for e in empresas}
+        for futuro in as_completed(futuros):
+            nombre = futuros[futuro]
+            try:
+                _, info, ruta_log = futuro.result()
+                resultados[nombre] = info
+                estado = "✔" if info is not None else "❌"
+                print(f"{estado} {nombre}: terminado (log: {ruta_log})")
+            except Exception as e:
+                resultados[nombre] = None
+                print(f"❌ {nombre}: falló la corrida: {e}")
+        if any(info is None for info in resultados.values()):
+            print(f"  Corrige la causa y reanuda con: {comando_reanudar}")
+
+    # 3. Consolidado en el orden de la configuración
+    ordenados = {e["nombre"]: resultados.get(e["nombre"]) for e in empresas}
+    return consolidar(ordenados, config["carpeta_consolidado"])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline de Valor de Inventario para varias empresas.")
+    parser.add_argument("config", help="JSON con la definición de empresas")
+    parser.add_argument("--max-procesos", type=int, default=None,
+                        help="Procesos en paralelo (por defecto: núm. de empresas o núcleos)")
+    parser.add_argument("--resume", action="store_true",
+                        help="Cada empresa reanuda su última ejecución de la fecha (ver valor_inventario.py --resume)")
+    args = parser.parse_args()
+    ejecutar_empresas(args.config, args.max_procesos, args.resume)
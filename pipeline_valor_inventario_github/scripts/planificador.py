@@ -0,0 +1,234 @@
+# =========================================================
+# MÓDULO: Planificador de etapas (DAG)
+# DESCRIPCIÓN: Cada sección del pipeline se declara como una
+#              etapa con entradas y salidas explícitas. Las
+#              etapas independientes corren en paralelo en un
+#              pool de hilos; las que escriben el libro de Excel
+#              o el portal se serializan con un candado. Al final
+#              se reporta la ruta crítica de la corrida. Con un
+#              almacén de checkpoints (checkpoints.py) cada etapa
+#              guarda sus salidas y una reanudación reutiliza las
+#              que ya habían terminado.
+# =========================================================
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+COMPLETADA = "completada"
+FALLIDA = "fallida"
+OMITIDA = "omitida"
+REUTILIZADA = "reutilizada"
+TERMINADAS = (COMPLETADA, REUTILIZADA)
+
+
+class Etapa:
+    def __init__(self, nombre: str, funcion, entradas=(), salidas=(), escribe: bool = False,
+                 mensaje_error: str = None):
+        # funcion(ctx) -> dict con exactamente las llaves declaradas en `salidas`
+        self.nombre = nombre
+        self.funcion = funcion
+        self.entradas = tuple(entradas)
+        self.salidas = tuple(salidas)
+        self.escribe = escribe  # True: toca el libro/portal, corre bajo el candado de escritura
+        self.mensaje_error = mensaje_error or f"Error en la etapa '{nombre}'"
+
+
+class Planificador:
+    def __init__(self, etapas, max_workers: int = None):
+        self.etapas = {}
+        self.productor = {}
+        for etapa in etapas:
+            if etapa.nombre in self.etapas:
+                raise ValueError(f"Etapa repetida: '{etapa.nombre}'")
+            self.etapas[etapa.nombre] = etapa
+            for salida in etapa.salidas:
+                if salida in self.productor:
+                    raise ValueError(f"'{salida}' la producen '{self.productor[salida]}' y '{etapa.nombre}'")
+                self.productor[salida] = etapa.nombre
+        self.max_workers = max(1, max_workers or min(8, os.cpu_count() or 1))
+        self.candado_escritura = threading.Lock()
+        self.estadisticas = {}
+        self.tiempo_total = 0.0
+
+    # =====================================================
+    # GRAFO
+    # =====================================================
+    def dependencias(self, contexto: dict):
+        deps = {}
+        for etapa in self.etapas.values():
+            deps[etapa.nombre] = set()
+            for entrada in etapa.entradas:
+                if entrada in self.productor:
+                    deps[etapa.nombre].add(self.productor[entrada])
+                elif entrada not in contexto:
+                    raise ValueError(f"La etapa '{etapa.nombre}' requiere '{entrada}' y nadie la produce")
+        return deps
+
+    def orden_topologico(self, deps: dict):
+        # Kahn; a igualdad se respeta el orden de declaración
+        pendientes = {n: set(d) for n, d in deps.items()}
+        orden = []
+        while pendientes:
+            listos = [n for n in self.etapas if n in pendientes and not pendientes[n]]
+            if not listos:
+                raise ValueError(f"Dependencias circulares entre: {sorted(pendientes)}")
+            for n in listos:
+                orden.append(n)
+                del pendientes[n]
+            for d in pendientes.values():
+                d.difference_update(listos)
+        return orden
+
+    # =====================================================
+    # EJECUCIÓN
+    # =====================================================
+    def _correr(self, etapa: Etapa, ctx: dict, t0: float, almacen=None, reutilizar: bool = False):
+        espera = time.perf_counter()
+        # Las cargas de extractos no tienen pickle: "reutilizar" es volver a leerlas
+        if reutilizar and not almacen.recarga_de_fuente(etapa.nombre):
+            inicio = time.perf_counter()
+            resultado = almacen.cargar(etapa.nombre, etapa.salidas)
+            fin = time.perf_counter()
+            tiempos = {"inicio": inicio - t0, "fin": fin - t0, "duracion": fin - inicio, "espera": 0.0}
+            return resultado, tiempos, REUTILIZADA, True
+        if etapa.escribe:
+            with self.candado_escritura:
+                inicio = time.perf_counter()
+                resultado = etapa.funcion(ctx)
+        else:
+            inicio = time.perf_counter()
+            resultado = etapa.funcion(ctx)
+        fin = time.perf_counter()
+
+        resultado = resultado or {}
+        faltantes = [s for s in etapa.salidas if s not in resultado]
+        if faltantes:
+            raise RuntimeError(f"la etapa '{etapa.nombre}' no devolvió {faltantes}")
+        tiempos = {"inicio": inicio - t0, "fin": fin - t0, "duracion": fin - inicio, "espera": inicio - espera}
+        if reutilizar:
+            return resultado, {**tiempos, "recargada": True}, REUTILIZADA, True
+        # Se guarda antes de publicar las salidas: ninguna etapa dependiente
+        # puede haber modificado todavía los DataFrames.
+        checkpoint = almacen.guardar(etapa.nombre, resultado, etapa.salidas) if almacen else False
+        return resultado, tiempos, COMPLETADA, checkpoint
+
+    def _omitir_dependientes(self, nombre: str, dependientes: dict, pendientes: dict, almacen=None):
+        por_revisar = list(dependientes[nombre])
+        while por_revisar:
+            hijo = por_revisar.pop()
+            if hijo not in pendientes:
+                continue
+            del pendientes[hijo]
+            self.estadisticas[hijo] = {"estado": OMITIDA, "causa": nombre}
+            if almacen:
+                almacen.registrar(hijo, OMITIDA, causa=nombre)
+            print(f"✖ Se omite la etapa '{hijo}': depende de '{nombre}', que no terminó.")
+            por_revisar.extend(dependientes[hijo])
+
+    def reutilizables(self, orden, deps: dict, validas: set):
+        # Una etapa se reutiliza si tiene checkpoint válido y todas sus
+        # dependencias también se reutilizan; si no, se vuelve a correr.
+        reutilizar = set()
+        for n in orden:
+            if n in validas and all(p in reutilizar for p in deps[n]):
+                reutilizar.add(n)
+        return reutilizar
+
+    def ejecutar(self, contexto: dict, almacen=None):
+        ctx = dict(contexto)
+        deps = self.dependencias(ctx)
+        orden = self.orden_topologico(deps)
+        reutilizar = self.reutilizables(orden, deps, almacen.etapas_validas()) if almacen else set()
+        if reutilizar:
+            print(f"ℹ Reanudando '{almacen.run_id}': se reutilizan {len(reutilizar)} de {len(orden)} etapa(s).")
+        posicion = {n: i for i, n in enumerate(orden)}
+        dependientes = {n: set() for n in orden}
+        for n, d in deps.items():
+            for padre in d:
+                dependientes[padre].add(n)
+
+        pendientes = {n: set(d) for n, d in deps.items()}
+        self.estadisticas = {}
+        t0 = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            en_curso = {}
+            while pendientes or en_curso:
+                listos = sorted((n for n, d in pendientes.items() if not d), key=posicion.get)
+                for n in listos:
+                    del pendientes[n]
+                    en_curso[pool.submit(self._correr, self.etapas[n], ctx, t0, almacen, n in reutilizar)] = n
+
+                terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in sorted(terminados, key=lambda f: posicion[en_curso[f]]):
+                    n = en_curso.pop(futuro)
+                    try:
+                        resultado, tiempos, estado, checkpoint = futuro.result()
+                    except Exception as e:
+                        self.estadisticas[n] = {"estado": FALLIDA, "error": str(e)}
+                        print(f"❌ {self.etapas[n].mensaje_error}: {e}")
+                        if almacen:
+                            almacen.registrar(n, FALLIDA, error=str(e))
+                        self._omitir_dependientes(n, dependientes, pendientes, almacen)
+                        continue
+                    # Solo se publican las salidas declaradas
+                    for salida in self.etapas[n].salidas:
+                        ctx[salida] = resultado[salida]
+                    self.estadisticas[n] = {"estado": estado, **tiempos}
+                    if almacen and estado == COMPLETADA:
+                        almacen.registrar(n, COMPLETADA, duracion=round(tiempos["duracion"], 3), checkpoint=checkpoint)
+                    for hijo in dependientes[n]:
+                        if hijo in pendientes:
+                            pendientes[hijo].discard(n)
+
+        self.tiempo_total = time.perf_counter() - t0
+        self._deps = deps
+        self._orden = orden
+        return ctx
+
+    # =====================================================
+    # REPORTE
+    # =====================================================
+    def ruta_critica(self):
+        # Cadena de dependencias con mayor suma de duraciones (solo etapas terminadas)
+        acumulado, previo = {}, {}
+        for n in self._orden:
+            est = self.estadisticas.get(n, {})
+            if est.get("estado") not in TERMINADAS:
+                continue
+            padres = [p for p in self._deps[n] if p in acumulado]
+            mejor = max(padres, key=acumulado.get, default=None)
+            acumulado[n] = est["duracion"] + (acumulado[mejor] if mejor else 0.0)
+            previo[n] = mejor
+        if not acumulado:
+            return [], 0.0
+        n = max(acumulado, key=acumulado.get)
+        total = acumulado[n]
+        ruta = []
+        while n is not None:
+            ruta.append(n)
+            n = previo[n]
+        return ruta[::-1], total
+
+    def imprimir_reporte(self):
+        print(f"\n=== PLANIFICADOR: {len(self.etapas)} etapa(s), hasta {self.max_workers} en paralelo ===")
+        for n in self._orden:
+            est = self.estadisticas.get(n, {})
+            if est.get("estado") == COMPLETADA:
+                print(f"  {n:<28} {est['duracion']:>7.2f} s  (inicio {est['inicio']:>6.2f} s, espera {est['espera']:.2f} s)")
+            elif est.get("estado") == REUTILIZADA:
+                origen = "releída del extracto" if est.get("recargada") else "reutilizada del checkpoint"
+                print(f"  {n:<28} {est['duracion']:>7.2f} s  ({origen})")
+            else:
+                print(f"  {n:<28} {est.get('estado', 'sin ejecutar')}")
+        ruta, duracion_ruta = self.ruta_critica()
+        suma = sum(e.get("duracion", 0.0) for e in self.estadisticas.values())
+        print(f"⏱ Tiempo total: {self.tiempo_total:.2f} s | suma de etapas: {suma:.2f} s | "
+              f"ruta crítica: {duracion_ruta:.2f} s")
+        if ruta:
+            print(f"  Ruta crítica: {' → '.join(ruta)}")
+
+    def pendientes(self):
+        # Etapas que no terminaron (fallidas u omitidas)
+        return [n for n in self._orden if self.estadisticas.get(n, {}).get("estado") not in TERMINADAS]
@@ -0,0 +1,247 @@
+# =========================================================
+# MÓDULO: Recursos estáticos del portal
+# DESCRIPCIÓN: Etapa de publicación de recursos para index.html
+#              y el consolidado: redimensiona y recodifica las
+#              imágenes (WebP + PNG/JPEG, varios anchos), usa la
+#              versión SVG de la gráfica, saca el CSS a un archivo
+#              minificado, publica Bootstrap desde la copia
+#              versionada en web/vendor (sin ella conserva el
+#              enlace al CDN), nombra cada archivo con la huella de su
+#              contenido y escribe variantes .gz / .br al lado.
+#              Sin brotli solo se generan las .gz.
+# =========================================================
+import gzip
+import hashlib
+import os
+import re
+from io import BytesIO
+from pathlib import Path
+
+from PIL import Image
+
+try:
+    import brotli
+    HAY_BROTLI = True
+except ImportError:
+    HAY_BROTLI = False
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CARPETA_WEB = BASE_DIR / "web"
+CARPETA_VENDOR = CARPETA_WEB / "vendor"  # copias versionadas de los recursos del CDN (con su licencia)
+CARPETA_RECURSOS = "assets"              # subcarpeta del destino con los archivos publicados
+
+# Anchos (px reales) que se generan de cada imagen y el ancho con el que se
+# muestra, para que el navegador elija del srcset. "svg": también hay versión
+# vectorial junto al PNG (la gráfica la guarda así etapa_grafica).
+# "diferida": fuera de la primera pantalla, se carga con loading="lazy".
+IMAGENES_PORTAL = {
+    "Tamex.jpg": {"anchos": [60, 120], "sizes": "60px"},
+    "grafica_comportamiento.png": {"anchos": [800, 1200, 1800],
+                                   "sizes": "(max-width: 1400px) 100vw, 1320px", "svg": True, "diferida": True},
+}
+# Imágenes usadas como fondo en el CSS: un solo ancho (2x de la caja de 220 px)
+FONDOS_PORTAL = {"Almacen.png": 440}
+
+CALIDAD_WEBP = 82
+CALIDAD_JPEG = 85
+EXT_COMPRIMIBLES = (".html", ".css", ".js", ".svg", ".json")
+AHORRO_MINIMO = 0.9           # la variante .gz/.br se escribe solo si queda < 90 % del original
+
+PATRON_CDN = re.compile(r'(<link[^>]+href="|<script[^>]+src=")(https?://[^"]+)"')
+PATRON_ESTILO = re.compile(r"<style>(.*?)</style>", re.S)
+PATRON_IMG = re.compile(r'<img\s+src="([^"]+)"([^>]*)>')
+PATRON_URL_CSS = re.compile(r"background-image:\s*url\('([^']+)'\);?")
+
+
+# =====================================================
+# AUXILIARES
+# =====================================================
+def _huella(datos: bytes):
+    return hashlib.sha256(datos).hexdigest()[:10]
+
+
+def _buscar_origen(nombre: str, carpetas):
+    # Sin distinguir mayúsculas: en el repo el logo es "Tamex.JPG"
+    for carpeta in carpetas:
+        carpeta = Path(carpeta)
+        if not carpeta.is_dir():
+            continue
+        for archivo in carpeta.iterdir():
+            if archivo.is_file() and archivo.name.lower() == nombre.lower():
+                return archivo
+    return None
+
+
+def minificar_css(css: str):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)  # solo después de ':' (antes puede ser un selector descendiente)
+    return css.replace(";}", "}").strip()
+
+
+class _Publicacion:
+    # Archivos escritos en assets/ durante una publicación (para limpiar los viejos)
+    def __init__(self, carpeta_destino: str):
+        self.carpeta = Path(carpeta_destino) / CARPETA_RECURSOS
+        self.carpeta.mkdir(parents=True, exist_ok=True)
+        self.escritos = set()
+
+    def escribir(self, base: str, extension: str, datos: bytes):
+        nombre = f"{base}.{_huella(datos)}{extension}"
+        ruta = self.carpeta / nombre
+        if not ruta.exists():
+            ruta.write_bytes(datos)
+        self.escritos.add(nombre)
+        for variante in precomprimir(str(ruta)):
+            self.escritos.add(Path(variante).name)
+        return f"{CARPETA_RECURSOS}/{nombre}"
+
+    def limpiar(self):
+        # Solo se conserva lo que referencia el HTML recién generado
+        for archivo in self.carpeta.iterdir():
+            if archivo.is_file() and archivo.name not in self.escritos:
+                archivo.unlink()
+
+
+# =====================================================
+# IMÁGENES
+# =====================================================
+def _codificar(imagen: Image.Image, formato: str):
+    salida = BytesIO()
+    if formato == "WEBP":
+        # Con pocos colores (gráficas) gana la paleta sin pérdida; con
+        # degradados, la compresión con pérdida. Se queda la más chica.
+        imagen.save(salida, "WEBP", quality=CALIDAD_WEBP, method=6)
+        paleta = BytesIO()
+        imagen.quantize(colors=256, method=Image.Quantize.FASTOCTREE).convert("RGBA").save(
+            paleta, "WEBP", lossless=True, method=6)
+        if paleta.tell() < salida.tell():
+            salida = paleta
+    elif formato == "JPEG":
+        imagen.convert("RGB").save(salida, "JPEG", quality=CALIDAD_JPEG, optimize=True, progressive=True)
+    else:
+        # Paleta de 256 colores: logos, ilustraciones y gráficas casi no cambian
+        imagen.quantize(colors=256, method=Image.Quantize.FASTOCTREE).save(salida, "PNG", optimize=True)
+    return salida.getvalue()
+
+
+def _variantes(origen: Path, anchos, publicacion: _Publicacion):
+    # {formato: [(ruta publicada, ancho), ...]} sin ampliar nunca la imagen
+    with Image.open(origen) as original:
+        original.load()
+    respaldo = "JPEG" if origen.suffix.lower() in (".jpg", ".jpeg") else "PNG"
+    anchos = sorted({min(a, original.width) for a in anchos})
+    variantes = {"WEBP": [], respaldo: []}
+    for ancho in anchos:
+        alto = round(original.height * ancho / original.width)
+        imagen = original if ancho == original.width else original.resize((ancho, alto), Image.LANCZOS)
+        for formato in variantes:
+            extension = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}[formato]
+            ruta = publicacion.escribir(f"{origen.stem}-{ancho}w", extension, _codificar(imagen, formato))
+            variantes[formato].append((ruta, ancho))
+    return variantes, respaldo
+
+
+def _picture(nombre: str, atributos: str, carpetas, publicacion: _Publicacion):
+    config = IMAGENES_PORTAL.get(nombre)
+    origen = _buscar_origen(nombre, carpetas)
+    if config is None or origen is None:
+        return None
+    variantes, respaldo = _variantes(origen, config["anchos"], publicacion)
+
+    def srcset(lista):
+        return ", ".join(f"{ruta} {ancho}w" for ruta, ancho in lista)
+    fuentes = []
+    if config.get("svg"):
+        svg = origen.with_suffix(".svg")
+        if svg.exists():
+            fuentes.append(f'<source type="image/svg+xml" srcset="{publicacion.escribir(svg.stem, ".svg", svg.read_bytes())}">')
+    fuentes.append(f'<source type="image/webp" srcset="{srcset(variantes["WEBP"])}" sizes="{config["sizes"]}">')
+    ruta_img, _ = variantes[respaldo][-1]
+    carga = ' loading="lazy"' if config.get("diferida") else ""
+    img = (f'<img src="{ruta_img}" srcset="{srcset(variantes[respaldo])}" sizes="{config["sizes"]}"'
+           f'{atributos}{carga} decoding="async">')
+    return "<picture>" + "".join(fuentes) + img + "</picture>"
+
+
+def _fondo(nombre: str, carpetas, publicacion: _Publicacion):
+    origen = _buscar_origen(nombre, carpetas)
+    if nombre not in FONDOS_PORTAL or origen is None:
+        return None
+    variantes, respaldo = _variantes(origen, [FONDOS_PORTAL[nombre]], publicacion)
+    webp, _ = variantes["WEBP"][0]
+    png, _ = variantes[respaldo][0]
+    tipo = "image/jpeg" if respaldo == "JPEG" else "image/png"
+    # La primera línea queda para navegadores sin image-set()
+    return (f"background-image: url('{png}'); "
+            f"background-image: image-set(url('{webp}') type('image/webp'), url('{png}') type('{tipo}'));")
+
+
+# =====================================================
+# CSS / JS DEL CDN
+# =====================================================
+def _vendor(url: str):
+    # Copia local (versionada en el repo) del recurso del CDN. No se descarga
+    # en la corrida: varias empresas publicando a la vez escribirían el mismo
+    # archivo. Si falta, el portal sigue enlazando el CDN (como antes).
+    ruta = CARPETA_VENDOR / url.rstrip("/").split("/")[-1]
+    if not ruta.exists():
+        print(f"⚠ Falta la copia local de {url} en {ruta}; el portal enlaza el CDN. "
+              f"Agrégala a web/vendor/ (la misma versión que enlaza la plantilla) junto con su licencia.")
+        return None
+    return ruta
+
+
+# =====================================================
+# PUBLICACIÓN
+# =====================================================
+def publicar(html: str, carpeta_destino: str):
+    # Devuelve el HTML apuntando a los recursos optimizados de assets/
+    publicacion = _Publicacion(carpeta_destino)
+    carpetas = [CARPETA_WEB, carpeta_destino]
+
+    def cdn(m):
+        ruta = _vendor(m.group(2))
+        if ruta is None:
+            return m.group(0)
+        datos = ruta.read_bytes()
+        # Un .min.css ya viene minificado: se publica tal cual, con su aviso de licencia
+        if ruta.suffix == ".css" and ".min." not in ruta.name:
+            datos = minificar_css(datos.decode("utf-8")).encode("utf-8")
+        base = ruta.name[: -len(ruta.suffix)]
+        return f'{m.group(1)}{publicacion.escribir(base, ruta.suffix, datos)}"'
+    html = PATRON_CDN.sub(cdn, html)
+
+    def estilo(m):
+        css = PATRON_URL_CSS.sub(lambda u: _fondo(u.group(1), carpetas, publicacion) or u.group(0), m.group(1))
+        # Dentro de assets/ las rutas del CSS son relativas a ese archivo
+        css = css.replace(f"url('{CARPETA_RECURSOS}/", "url('")
+        ruta = publicacion.escribir("portal", ".css", minificar_css(css).encode("utf-8"))
+        return f'<link href="{ruta}" rel="stylesheet">'
+    html = PATRON_ESTILO.sub(estilo, html)
+
+    html = PATRON_IMG.sub(lambda m: _picture(m.group(1), m.group(2), carpetas, publicacion) or m.group(0), html)
+    publicacion.limpiar()
+    return html
+
+
+def precomprimir(ruta: str):
+    # Variantes .gz y .br junto al archivo (solo para texto y si reducen tamaño)
+    if not ruta.endswith(EXT_COMPRIMIBLES):
+        return []
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    candidatos = [(".gz", lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if HAY_BROTLI:
+        candidatos.append((".br", lambda d: brotli.compress(d, quality=11)))
+    escritos = []
+    for extension, comprimir in candidatos:
+        comprimido = comprimir(datos)
+        if len(comprimido) < len(datos) * AHORRO_MINIMO:
+            with open(ruta + extension, "wb") as f:
+                f.write(comprimido)
+            escritos.append(ruta + extension)
+        elif os.path.exists(ruta + extension):
+            os.remove(ruta + extension)
+    return escritos
@@ -0,0 +1,198 @@
+# =========================================================
+# MÓDULO: Resumen por periodos de Comportamiento
+# DESCRIPCIÓN: Tabla acumulada por semana, mes, trimestre y año
+#              (valor promedio, valor de cierre, variación neta,
+#              DOH promedio y días sobre objetivo). Se construye
+#              una sola vez desde la historia completa y después
+#              se actualiza solo con los días de Comportamiento
+#              posteriores a su último "Fin", sin volver a
+#              acumular la historia.
+# =========================================================
+import pandas as pd
+
+HOJA_RESUMEN_PERIODOS = "Resumen Periodos"
+TIPOS = ["Semana", "Mes", "Trimestre", "Año"]
+LLAVES = ["Tipo", "Periodo"]
+
+# Acumuladores que se guardan en la hoja; promedios y etiquetas se derivan
+COLUMNAS = [
+    "Tipo", "Periodo", "Etiqueta", "Inicio", "Fin", "Dias",
+    "Suma Valor", "Valor Promedio", "Valor Cierre", "Variacion Neta",
+    "Suma DOH", "Dias con DOH", "DOH Promedio", "Dias Sobre Objetivo",
+]
+COLUMNAS_MONEDA = ["Suma Valor", "Valor Promedio", "Valor Cierre", "Variacion Neta"]
+COLUMNAS_RATIO = ["Suma DOH", "DOH Promedio"]
+
+
+# =====================================================
+# LLAVES DE PERIODO
+# =====================================================
+def claves_periodo(fechas: pd.Series, tipo: str):
+    # Devuelve (Periodo ordenable, Etiqueta legible) para cada fecha
+    if tipo == "Semana":
+        iso = fechas.dt.isocalendar()
+        periodo = iso["year"].astype(str) + "-S" + iso["week"].astype(str).str.zfill(2)
+        etiqueta = "Sem " + iso["week"].astype(str).str.zfill(2) + "-" + (iso["year"] % 100).astype(str).str.zfill(2)
+    elif tipo == "Mes":
+        periodo = fechas.dt.strftime("%Y-%m")
+        etiqueta = fechas.dt.strftime("%b-%y")  # mismo formato que el Balance Mensual
+    elif tipo == "Trimestre":
+        periodo = fechas.dt.year.astype(str) + "-T" + fechas.dt.quarter.astype(str)
+        etiqueta = "T" + fechas.dt.quarter.astype(str) + "-" + fechas.dt.strftime("%y")
+    elif tipo == "Año":
+        periodo = fechas.dt.year.astype(str)
+        etiqueta = periodo
+    else:
+        raise ValueError(f"Tipo de periodo desconocido: '{tipo}'")
+    return periodo.astype(str), etiqueta.astype(str)
+
+
+def _normalizar(df_comport: pd.DataFrame):
+    # Columnas numéricas y fecha real; filas sin fecha válida no cuentan
+    df = pd.DataFrame({
+        "Fecha": pd.to_datetime(df_comport["Fecha"], format="%d/%m/%Y", errors="coerce"),
+        "Valor": pd.to_numeric(df_comport["Valor Total"], errors="coerce").fillna(0),
+        "DOH": pd.to_numeric(df_comport["DOH Proyectado"], errors="coerce"),
+        "Objetivo": pd.to_numeric(df_comport["Objetivo"], errors="coerce").fillna(0),
+        "Variacion": pd.to_numeric(df_comport["Variacion Diaria"], errors="coerce").fillna(0),
+    })
+    return df.dropna(subset=["Fecha"])
+
+
+def _derivar(resumen: pd.DataFrame):
+    resumen["Valor Promedio"] = resumen["Suma Valor"] / resumen["Dias"]
+    con_doh = resumen["Dias con DOH"] > 0
+    resumen["DOH Promedio"] = (resumen["Suma DOH"] / resumen["Dias con DOH"]).where(con_doh)
+    return resumen
+
+
+# =====================================================
+# CONSTRUCCIÓN INICIAL (una sola vez)
+# =====================================================
+def construir_desde_historia(df_comport: pd.DataFrame):
+    df = _normalizar(df_comport).sort_values("Fecha", kind="stable")
+    df["SobreObjetivo"] = (df["Valor"] > df["Objetivo"]).astype(int)
+    df["DiaDOH"] = df["DOH"].notna().astype(int)
+
+    partes = []
+    for tipo in TIPOS:
+        periodo, etiqueta = claves_periodo(df["Fecha"], tipo)
+        agg = df.assign(Periodo=periodo, Etiqueta=etiqueta).groupby("Periodo").agg(
+            Etiqueta=("Etiqueta", "first"),
+            Inicio=("Fecha", "min"),
+            Fin=("Fecha", "max"),
+            Dias=("Fecha", "size"),
+            **{
+                "Suma Valor": ("Valor", "sum"),
+                "Valor Cierre": ("Valor", "last"),
+                "Variacion Neta": ("Variacion", "sum"),
+                "Suma DOH": ("DOH", "sum"),
+                "Dias con DOH": ("DiaDOH", "sum"),
+                "Dias Sobre Objetivo": ("SobreObjetivo", "sum"),
+            },
+        ).reset_index()
+        agg.insert(0, "Tipo", tipo)
+        partes.append(agg)
+
+    resumen = pd.concat(partes, ignore_index=True)
+    return _derivar(resumen)[COLUMNAS]
+
+
+# =====================================================
+# ACTUALIZACIÓN INCREMENTAL (O(1) por día)
+# =====================================================
+def agregar_dia(resumen: pd.DataFrame, fila: dict):
+    # fila: la fila nueva de Comportamiento (Fecha DD/MM/AAAA, Valor Total, ...)
+    dia = _normalizar(pd.DataFrame([fila]))
+    if dia.empty:
+        return resumen
+    dia = dia.iloc[0]
+    fecha = dia["Fecha"]
+    tiene_doh = pd.notna(dia["DOH"])
+
+    resumen = resumen.set_index(LLAVES)
+    nuevas = []
+    for tipo in TIPOS:
+        periodo, etiqueta = claves_periodo(pd.Series([fecha]), tipo)
+        llave = (tipo, periodo.iloc[0])
+        if llave in resumen.index:
+            actual = resumen.loc[llave]
+            # Un día ya incluido (p. ej. al reanudar la corrida) no se vuelve a sumar
+            if fecha <= actual["Fin"]:
+                continue
+            resumen.loc[llave, ["Fin", "Dias", "Suma Valor", "Valor Cierre", "Variacion Neta",
+                                "Suma DOH", "Dias con DOH", "Dias Sobre Objetivo"]] = [
+                fecha,
+                actual["Dias"] + 1,
+                actual["Suma Valor"] + dia["Valor"],
+                dia["Valor"],
+                actual["Variacion Neta"] + dia["Variacion"],
+                actual["Suma DOH"] + (dia["DOH"] if tiene_doh else 0),
+                actual["Dias con DOH"] + int(tiene_doh),
+                actual["Dias Sobre Objetivo"] + int(dia["Valor"] > dia["Objetivo"]),
+            ]
+        else:
+            nuevas.append({
+                "Tipo": tipo, "Periodo": llave[1], "Etiqueta": etiqueta.iloc[0],
+                "Inicio": fecha, "Fin": fecha, "Dias": 1,
+                "Suma Valor": dia["Valor"], "Valor Cierre": dia["Valor"], "Variacion Neta": dia["Variacion"],
+                "Suma DOH": dia["DOH"] if tiene_doh else 0, "Dias con DOH": int(tiene_doh),
+                "Dias Sobre Objetivo": int(dia["Valor"] > dia["Objetivo"]),
+            })
+
+    resumen = resumen.reset_index()
+    if nuevas:
+        resumen = pd.concat([resumen, pd.DataFrame(nuevas)], ignore_index=True)
+    resumen = resumen.sort_values(LLAVES, key=lambda c: c.map(TIPOS.index) if c.name == "Tipo" else c,
+                                  kind="stable").reset_index(drop=True)
+    return _derivar(resumen)[COLUMNAS]
+
+
+def ponerse_al_dia(resumen: pd.DataFrame, df_comport: pd.DataFrame):
+    # Suma, en orden de fecha, cada día de Comportamiento posterior al último
+    # día acumulado. No depende de qué escribió la corrida actual: si una
+    # corrida anterior guardó Comportamiento pero falló antes de guardar esta
+    # hoja, el día pendiente se recupera aquí. Devuelve (resumen, días sumados).
+    ultimo = resumen["Fin"].max() if not resumen.empty else None
+    fechas = _normalizar(df_comport)["Fecha"]
+    if ultimo is not None and pd.notna(ultimo):
+        fechas = fechas[fechas > pd.Timestamp(ultimo)]
+    pendientes = df_comport.loc[fechas.sort_values(kind="stable").index]
+    for fila in pendientes.to_dict(orient="records"):
+        resumen = agregar_dia(resumen, fila)
+    return resumen, len(pendientes)
+
+
+# =====================================================
+# CONSULTAS
+# =====================================================
+def ultimos(resumen: pd.DataFrame, tipo: str, n: int, fecha_ref=None):
+    # Los n periodos que terminan en el de fecha_ref (por defecto, el más
+    # reciente). Los periodos sin datos se devuelven en cero, igual que el
+    # Balance Mensual original.
+    del_tipo = resumen[resumen["Tipo"] == tipo]
+    if del_tipo.empty or n <= 0:
+        return del_tipo.iloc[0:0]
+    fecha_ref = pd.Timestamp(fecha_ref) if fecha_ref is not None else del_tipo["Fin"].max()
+
+    if tipo == "Semana":
+        fechas = pd.Series([fecha_ref - pd.Timedelta(weeks=i) for i in range(n - 1, -1, -1)])
+    else:
+        freq = {"Mes": "M", "Trimestre": "Q", "Año": "Y"}[tipo]
+        fechas = pd.Series(pd.period_range(end=fecha_ref.to_period(freq), periods=n, freq=freq).to_timestamp())
+    periodo, etiqueta = claves_periodo(fechas, tipo)
+
+    base = pd.DataFrame({"Tipo": tipo, "Periodo": periodo.values, "Etiqueta": etiqueta.values})
+    tabla = base.merge(del_tipo.drop(columns=["Etiqueta"]), on=LLAVES, how="left")
+    numericas = [c for c in COLUMNAS if c not in ("Tipo", "Periodo", "Etiqueta", "Inicio", "Fin", "DOH Promedio")]
+    tabla[numericas] = tabla[numericas].fillna(0)
+    return tabla[COLUMNAS]
+
+
+def leer(archivo_valor: str):
+    # None si el libro todavía no tiene la hoja (se construye desde la historia)
+    try:
+        resumen = pd.read_excel(archivo_valor, sheet_name=HOJA_RESUMEN_PERIODOS, dtype={"Periodo": str})
+    except ValueError:
+        return None
+    return resumen[COLUMNAS]
@@ -0,0 +1,147 @@
+# =========================================================
+# MÓDULO: Validación previa de esquema (preflight)
+# DESCRIPCIÓN: Lee solo el encabezado y las primeras filas de
+#              cada extracto antes del parseo completo y los
+#              compara contra el esquema declarado. Reporta
+#              todos los problemas juntos en lugar de descubrirlos
+#              uno por uno dentro de cada sección.
+# =========================================================
+import pandas as pd
+from openpyxl import load_workbook
+
+import formatos_fuente
+
+FILAS_MUESTRA = 50
+MIN_PROPORCION_TIPO = 0.9  # % mínimo de la muestra que debe convertirse al tipo esperado
+
+# Columnas requeridas por fuente y el tipo que esperan las secciones de main()
+ESQUEMAS = {
+    "Inventario": {
+        "Almacen": "texto",
+        "Articulo": "texto",
+        "Categoria": "texto",
+        "ABCGeneral": "texto",
+        "Existencias": "numerico",
+        "CostoPromedio": "numerico",
+        "TipoCambio": "numerico",
+    },
+    "TransitosPendientes": {
+        "Mov": "texto",
+        "CantidadPendiente": "numerico",
+        "Costo": "numerico",
+    },
+    "DOH_C": {
+        "Categoria": "texto",
+        "Disponible": "numerico",
+        "Transitos": "numerico",
+        "Venta": "numerico",
+        "OCompra": "numerico",
+        "PedidosP": "numerico",
+    },
+    "OCPendiente": {
+        "Nombre Proveedor": "texto",
+        "Proyecto": "texto",
+        "ImportePendiente": "numerico",
+        "TipoCambio": "numerico",
+    },
+    "Entradas X Planeacion": {
+        "Nombre": "texto",
+        "FechaEmision": "fecha",
+        "Importe2": "numerico",
+    },
+}
+
+ERROR = "ERROR"
+ADVERTENCIA = "ADVERTENCIA"
+
+
+# =====================================================
+# LECTURA DE ENCABEZADOS
+# =====================================================
+def _leer_xlsx(path: str, n: int):
+    # Modo read_only: openpyxl hace streaming de la hoja y se detiene en la fila n+1
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        filas = list(ws.iter_rows(min_row=1, max_row=n + 1, values_only=True))
+    finally:
+        wb.close()
+    if not filas:
+        return pd.DataFrame()
+    columnas = [str(c) if c is not None else "" for c in filas[0]]
+    return pd.DataFrame(filas[1:], columns=columnas)
+
+
+def leer_encabezado(path: str, n: int = FILAS_MUESTRA):
+    ext = formatos_fuente.extension_de(path)
+    if ext == ".xlsx":
+        return _leer_xlsx(path, n)
+    if ext in formatos_fuente.EXT_CSV:
+        return formatos_fuente.leer_csv(path, nrows=n)
+    if ext in formatos_fuente.EXT_PARQUET + formatos_fuente.EXT_FEATHER:
+        return formatos_fuente.leer_muestra_columnar(path, n)
+    return pd.read_excel(path, nrows=n)
+
+
+# =====================================================
+# VALIDACIÓN
+# =====================================================
+def _proporcion_valida(serie: pd.Series, tipo: str):
+    muestra = serie.dropna()
+    muestra = muestra[muestra.astype(str).str.strip() != ""]
+    if muestra.empty:
+        return 1.0
+    if tipo == "numerico":
+        convertidos = pd.to_numeric(muestra, errors="coerce")
+    elif tipo == "fecha":
+        convertidos = pd.to_datetime(muestra, errors="coerce")
+    else:
+        return 1.0
+    return convertidos.notna().mean()
+
+
+def validar_fuente(prefijo: str, path: str, n: int = FILAS_MUESTRA):
+    # Devuelve la lista de problemas de UNA fuente: [(nivel, fuente, mensaje), ...]
+    esquema = ESQUEMAS.get(prefijo, {})
+    try:
+        muestra = leer_encabezado(path, n)
+    except Exception as e:
+        return [(ERROR, prefijo, f"No se pudo leer el encabezado: {e}")]
+
+    problemas = []
+    faltantes = [c for c in esquema if c not in muestra.columns]
+    if faltantes:
+        problemas.append((ERROR, prefijo, f"Faltan columnas: {faltantes}"))
+
+    for col, tipo in esquema.items():
+        if col in faltantes:
+            continue
+        proporcion = _proporcion_valida(muestra[col], tipo)
+        if proporcion < MIN_PROPORCION_TIPO:
+            problemas.append((ADVERTENCIA, prefijo,
+                              f"'{col}' debería ser {tipo}; solo {proporcion:.0%} de las primeras {len(muestra)} filas lo es"))
+    return problemas
+
+
+def validar_fuentes(rutas: dict, n: int = FILAS_MUESTRA):
+    # rutas: {prefijo: path o None}. Las fuentes sin archivo ya se reportan al buscarlas.
+    problemas = []
+    for prefijo, path in rutas.items():
+        if path is not None:
+            problemas.extend(validar_fuente(prefijo, path, n))
+    return problemas
+
+
+def imprimir_reporte(problemas):
+    if not problemas:
+        print("✔ Preflight de esquema: todas las fuentes tienen las columnas esperadas.")
+        return
+    print(f"\n=== PREFLIGHT DE ESQUEMA: {len(problemas)} problema(s) ===")
+    for nivel, fuente, mensaje in problemas:
+        icono = "❌" if nivel == ERROR else "⚠"
+        print(f"  {icono} [{fuente}] {mensaje}")
+    print()
+
+
+def fuentes_con_error(problemas):
+    return {fuente for nivel, fuente, _ in problemas if nivel == ERROR}
@@ -7,15 +7,29 @@
 # =========================================================
 import pandas as pd
 import os
-import shutil
+import argparse
+import hashlib
+import time
 from pathlib import Path
 import datetime
 from openpyxl import load_workbook
 from openpyxl.drawing.image import Image as XLImage
-from openpyxl.styles import Font
+import matplotlib
+matplotlib.use("Agg")  # La gráfica se genera en un hilo del planificador; sin backend de ventana
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import actualizar_portal  # Así conectamos ambos archivos
+import delta_inventario
+import motor_dataframe
+import validacion_esquema
+import formato_excel
+import formatos_fuente
+import agregacion_por_bloques
+import planificador
+import checkpoints
+import resumen_periodos
+import clasificacion_abc
+import escenarios_doh
 
 # ==========================================================
 # CONFIGURACIÓN PORTABLE Y SEGURIDAD (MODO DEMO)
@@ -41,17 +55,6 @@ else:
 
 os.makedirs(CARPETA_DESTINO, exist_ok=True)
 
-# --- FUNCIÓN PARA COPIAR IMÁGENES AUTOMÁTICAMENTE ---
-def asegurar_recursos_web(destino):
-    ruta_web = os.path.join(BASE_DIR, "web")
-    archivos = ["Tamex.jpg", "Almacen.png"] 
-    for f in archivos:
-        origen = os.path.join(ruta_web, f)
-        meta = os.path.join(destino, f)
-        if os.path.exists(origen):
-            shutil.copy2(origen, meta)
-            print(f"✅ Recurso copiado: {f}")
-
 ARCHIVO_VALOR_INVENTARIO = os.path.join(CARPETA_DESTINO, "Valor de Inventario.xlsx")
 HOJA_ANALISIS_GENERAL = "Analisis General"
 HOJA_ABC = "ABC"
@@ -61,12 +64,81 @@ HOJA_HISTORICO_CATEGORIA = "Historico Categoria"
 HOJA_HISTORICO_ALMACEN = "Historico Almacen"
 HOJA_COMPORTAMIENTO = "Comportamiento"
 HOJA_RESUMEN_BALANCE = "Resumen y Balance"
+HOJA_DELTA_SKU = "Delta Diario SKU"
+HOJA_DELTA_ALMACEN = "Delta Diario Almacen"
+
+# Copias columnares locales del Inventario (para el delta día contra día)
+CARPETA_CACHE = str(BASE_DIR / "cache")
+# Cache de extractos ya parseados en CARPETA_CACHE/fuentes (pickle del extracto
+# completo). Apagada por defecto: deja en disco copias de los extractos y solo
+# conviene en una carpeta privada, p. ej. para que varias empresas compartan el
+# parseo (ver multi_empresa.py). Se borran los que llevan más de
+# DIAS_CACHE_FUENTES días sin usarse.
+CACHE_FUENTES = False
+DIAS_CACHE_FUENTES = 7
+TOP_MOVIMIENTOS = 20
+
+# Resumen por periodos de Comportamiento (hoja "Resumen Periodos").
+# Balance Mensual muestra MESES_BALANCE meses desde A14; como el Top 10
+# empieza en A21, caben a lo más 6 (el portal muestra una tarjeta por cada
+# uno de los MESES_BALANCE meses, sin ese tope). El portal muestra los periodos de
+# PERIODOS_PORTAL ("Semana", "Mes", "Trimestre" o "Año": cuántos de cada uno).
+MESES_BALANCE = 3
+PERIODOS_PORTAL = {"Mes": 6, "Trimestre": 4}
 
 PREFIXES = ["Inventario", "TransitosPendientes", "DOH_C", "OCPendiente", "Entradas X Planeacion"]
-EXTS = [".xlsx", ".xls", ".csv"]
+# Prioridad de formatos al buscar cada extracto: gana el primero que exista.
+# Los columnares/CSV comprimidos van primero porque se leen mucho más rápido.
+EXTS = [".parquet", ".feather", ".csv.zst", ".csv.gz", ".csv", ".xlsx", ".xls"]
 
 CLASIFICACIONES = ["NULL","A","B","C","D","E","I","N","X"]
 OBJETIVO_CONSTANTE = 1875000000  
+TIPOS_ALMACEN_VALIDOS = ["ALMACENES FACTURACIÓN", "ALMACENES CONSIGNACION", "ALMACENES MALESTADO"]
+
+# Clasificación ABC de la hoja ABC: "extracto" (por defecto) usa ABCGeneral
+# tal cual viene, con sus clases D/E/I/N/X; "almacen" o "global" la calculan
+# por Pareto del Importe (solo A/B/C/NULL, ver clasificacion_abc.py).
+# Los umbrales son la participación de cada clase (A, B, C). El eje XYZ
+# (rotación por la Venta de DOH_C) es opcional: UMBRALES_XYZ = None lo apaga.
+CRITERIO_ABC = "extracto"
+UMBRALES_ABC = (80, 15, 5)
+UMBRALES_XYZ = (80, 15, 5)
+HOJA_RECLASIFICACION_ABC = "Reclasificacion ABC"
+TOP_RECLASIFICACIONES = 500
+
+# Escenarios what-if de DOH (hoja "Escenarios DOH" y portal). Con
+# ARCHIVO_ESCENARIOS_DOH (JSON, ver config/escenarios_ejemplo.json) se usan
+# esos escenarios; si es None, la rejilla de choques globales de abajo.
+# Una categoría entra en quiebre si no cubre la demanda del horizonte.
+ARCHIVO_ESCENARIOS_DOH = None
+FACTORES_VENTA_ESCENARIOS = [0.80, 0.85, 0.90, 0.95, 1.00, 1.05, 1.10, 1.15, 1.20, 1.25, 1.30]
+LLEGADAS_OC_ESCENARIOS = [0.50, 0.75, 1.00]
+RETRASOS_TRANSITO_ESCENARIOS = [0, 15, 30, 45]
+HORIZONTE_ESCENARIOS_DIAS = 30
+HOJA_ESCENARIOS_DOH = "Escenarios DOH"
+ESCENARIOS_PORTAL = 10
+
+# Motor para las transformaciones: "pandas" (por defecto), "polars" o "duckdb".
+# Polars y DuckDB usan todos los núcleos; DuckDB además puede desbordar a disco
+# cuando la agregación no cabe en MEMORIA_MAXIMA_MOTOR (p. ej. "8GB"). Ambos
+# son solo de cálculo: parten del extracto ya cargado en pandas, así que no
+# bajan el pico de memoria (para eso, MODO_POR_BLOQUES).
+MOTOR_DATAFRAME = "pandas"
+MEMORIA_MAXIMA_MOTOR = None
+
+# Preflight de esquema: si es True, cualquier ERROR detiene la corrida antes
+# de parsear; si es False, solo se omite la fuente con problemas.
+PREFLIGHT_ESTRICTO = False
+
+# Modo por bloques (out-of-core) para el Inventario: en lugar de cargar el
+# extracto completo se lee en bloques y solo se acumulan las sumas que usan
+# las hojas. El tamaño de bloque sale de MEMORIA_MAXIMA_BLOQUES_MB.
+MODO_POR_BLOQUES = False
+MEMORIA_MAXIMA_BLOQUES_MB = 512
+
+# Etapas que el planificador corre a la vez (None = según núcleos).
+# Las escrituras al libro y al portal siempre van de una en una.
+MAX_WORKERS = None
 
 # =====================================================
 # FUNCIONES AUXILIARES
@@ -77,857 +149,1145 @@ def fecha_hoy_str():
 def fecha_hoy_formato_ddmmyyyy():
     return datetime.datetime.now().strftime("%d/%m/%Y")
 
-def encontrar_archivo(folder: str, prefix: str, date_str: str):
+def fecha_de_corte():
+    # Devuelve (AAAAMMDD para buscar archivos, DD/MM/AAAA para las hojas)
+    if MODO_DEMO:
+        return "20260206", "06/02/2026"  # Fecha fija para cuando no estemos en la red de la empresa, así mantenemos consistencia en los datos de ejemplo
+    return fecha_hoy_str(), fecha_hoy_formato_ddmmyyyy()
+
+def encontrar_archivo(folder: str, prefix: str, date_str: str, exts: list = None):
     folder_path = Path(folder)
     if not folder_path.exists():
         raise FileNotFoundError(f"La carpeta no existe o no es accesible: {folder}")
     pattern_base = f"{prefix} {date_str}"
-    for ext in EXTS:
+    for ext in exts or EXTS:
         matches = list(folder_path.glob(pattern_base + ext))
         if matches:
             return str(matches[0])
     matches_any = list(folder_path.glob(pattern_base + "*"))
     return str(matches_any[0]) if matches_any else None
 
-def cargar_en_dataframe(path: str):
+def configuracion_por_defecto():
+    # Parámetros de una empresa/unidad de negocio. main() usa estos valores
+    # salvo que reciba otros (ver multi_empresa.py).
+    return {
+        "nombre": "Principal",
+        "carpeta_origen": UNC_FOLDER,
+        "carpeta_destino": CARPETA_DESTINO,
+        "carpeta_cache": CARPETA_CACHE,
+        "carpeta_cache_fuentes": os.path.join(CARPETA_CACHE, "fuentes") if CACHE_FUENTES else None,
+        "objetivo": OBJETIVO_CONSTANTE,
+        "tipos_almacen": TIPOS_ALMACEN_VALIDOS,
+        "clasificaciones": CLASIFICACIONES,
+    }
+
+def tipos_texto(prefix: str, path: str):
+    # Columnas de texto declaradas en el esquema (códigos de artículo,
+    # almacén, proveedor...) se leen como str para que no cambien de tipo
+    # según el contenido del día.
+    esquema = validacion_esquema.ESQUEMAS.get(prefix, {})
+    columnas = formatos_fuente.leer_csv(path, nrows=0).columns
+    return {c: str for c, tipo in esquema.items() if tipo == "texto" and c in columnas}
+
+def cargar_en_dataframe(path: str, prefix: str = None):
     if path is None:
         return None
-    ext = Path(path).suffix.lower()
-    if ext in [".xlsx", ".xls"]:
+    ext = formatos_fuente.extension_de(path)
+    if ext in formatos_fuente.EXT_EXCEL:
         return pd.read_excel(path)
-    elif ext == ".csv":
-        return pd.read_csv(path)
+    elif ext in formatos_fuente.EXT_CSV:
+        return formatos_fuente.leer_csv(path, dtype=tipos_texto(prefix, path))
+    elif ext in formatos_fuente.EXT_PARQUET:
+        return formatos_fuente.leer_parquet(path)
+    elif ext in formatos_fuente.EXT_FEATHER:
+        return formatos_fuente.leer_feather(path)
     try:
         return pd.read_excel(path)
-    except:
-        return pd.read_csv(path)
+    except ValueError:
+        return formatos_fuente.leer_csv(path)
+
+def cargar_con_cache(path: str, carpeta_cache_fuentes: str = None, prefix: str = None):
+    # Cache de extractos ya parseados, compartida entre empresas que leen el
+    # mismo archivo. La llave incluye fecha de modificación y tamaño, así un
+    # extracto regenerado nunca se confunde con el anterior, y el prefijo,
+    # porque de él dependen los tipos de texto con que se leyó el CSV.
+    if path is None or carpeta_cache_fuentes is None:
+        return cargar_en_dataframe(path, prefix)
+    stat = os.stat(path)
+    llave = hashlib.sha1(f"{os.path.abspath(path)}|{stat.st_mtime_ns}|{stat.st_size}|{prefix}".encode("utf-8")).hexdigest()
+    ruta_cache = os.path.join(carpeta_cache_fuentes, f"{llave}.pkl")
+    if os.path.exists(ruta_cache):
+        os.utime(ruta_cache)  # sigue en uso: la limpieza no la alcanza
+        return pd.read_pickle(ruta_cache)
+
+    df = cargar_en_dataframe(path, prefix)
+    os.makedirs(carpeta_cache_fuentes, exist_ok=True)
+    # Escritura atómica: otro proceso puede estar leyendo la misma llave
+    temporal = f"{ruta_cache}.{os.getpid()}.tmp"
+    df.to_pickle(temporal)
+    os.replace(temporal, ruta_cache)
+    limpiar_cache_fuentes(carpeta_cache_fuentes)
+    return df
+
+def limpiar_cache_fuentes(carpeta_cache_fuentes: str):
+    limite = time.time() - DIAS_CACHE_FUENTES * 86400
+    for archivo in Path(carpeta_cache_fuentes).glob("*.pkl"):
+        try:
+            if archivo.stat().st_mtime < limite:
+                archivo.unlink()
+        except OSError:
+            pass  # otro proceso ya la borró
+
 
 # =====================================================
-# PROCESO PRINCIPAL
+# ETAPAS DEL PROCESO
 # =====================================================
-def main():
-    if MODO_DEMO:
-        date_str = "20260206"  # Fecha fija para cuando no estemos en la red de la empresa, así mantenemos consistencia en los datos de ejemplo
-        fecha_hoy = "06/02/2026"
-        print(f"🚀 MODO DEMO: Tiempo congelado en {fecha_hoy} para consistencia de datos.")
-    else:
-
-        date_str = fecha_hoy_str()
-        fecha_hoy = fecha_hoy_formato_ddmmyyyy()
-        print(f"\n=== BUSCANDO ARCHIVOS DEL DÍA {date_str} ===\n")
+# Cada etapa recibe el contexto de la corrida (configuración + salidas de
+# las etapas previas) y devuelve un dict con sus salidas declaradas.
+# Las dependencias entre etapas se declaran en construir_etapas().
 
-    resultados = {}
-    for pref in PREFIXES:
-        ruta = encontrar_archivo(UNC_FOLDER, pref, date_str)
-        if ruta is None:
-            print(f"✖ No se encontró archivo: '{pref} {date_str}'\n")
-            resultados[pref] = {"path": None, "df": None}
-            continue
-        print(f"✔ Encontrado: {ruta}")
-        df = cargar_en_dataframe(ruta)
-        resultados[pref] = {"path": ruta, "df": df}
-        print(f"  → Cargado correctamente ({len(df)} filas, {len(df.columns)} columnas)\n")
+# =====================================================
+# 1. Carga de extractos
+# =====================================================
+FUENTES = {
+    "Inventario": "df_inventario_crudo",
+    "TransitosPendientes": "df_transitos_crudo",
+    "DOH_C": "df_doh_crudo",
+    "OCPendiente": "df_oc",
+    "Entradas X Planeacion": "df_entradas",
+}
+
+def etapa_carga(pref: str):
+    salida = FUENTES[pref]
+
+    def cargar(ctx):
+        ruta = ctx["rutas"][pref]
+        if ruta is None or pref in ctx["fuentes_invalidas"]:
+            if ruta is not None:
+                print(f"✖ Se omite '{pref}' por errores de esquema.\n")
+            return {salida: None}
+        if pref == "Inventario" and MODO_POR_BLOQUES:
+            # Se agrega por bloques en la etapa 2; nunca se carga completo
+            return {salida: None}
+        df = cargar_con_cache(ruta, ctx["empresa"]["carpeta_cache_fuentes"], pref)
+        print(f"✔ Cargado '{pref}' ({len(df)} filas, {len(df.columns)} columnas)")
+        return {salida: df}
+
+    return cargar
 
-    # =====================================================
-    # 2. Agregar columna IMPORTE a Inventario
-    # =====================================================
-    df_inventario = resultados["Inventario"]["df"]
-    if df_inventario is not None:
+# =====================================================
+# 2. Agregar columna IMPORTE a Inventario
+# =====================================================
+def etapa_importe_inventario(ctx):
+    df_inventario = ctx["df_inventario_crudo"]
+    agregados_inv = None
+    ruta_inv = ctx["rutas"]["Inventario"]
+    if MODO_POR_BLOQUES and ruta_inv is not None and "Inventario" not in ctx["fuentes_invalidas"]:
+        ruta_proyeccion = os.path.join(ctx["carpeta_cache"], "bloques", f"Inventario_{ctx['date_str']}.parquet")
+        agregados_inv = agregacion_por_bloques.agregar_inventario(ruta_inv, MEMORIA_MAXIMA_BLOQUES_MB, ruta_proyeccion)
+        print("✔ Se agregó la columna 'Importe' y se reemplazaron vacíos por 'NULL'.")
+    elif df_inventario is not None:
         columnas_necesarias = ["Existencias", "CostoPromedio", "TipoCambio"]
         faltantes = [c for c in columnas_necesarias if c not in df_inventario.columns]
         if faltantes:
             print(f"❌ No se puede crear 'Importe'. Faltan columnas: {faltantes}")
         else:
-            for c in columnas_necesarias:
-                df_inventario[c] = pd.to_numeric(df_inventario[c], errors="coerce").fillna(0)
-            df_inventario["Importe"] = (
-                df_inventario["Existencias"]
-                * df_inventario["CostoPromedio"]
-                * df_inventario["TipoCambio"]
-            )
-            df_inventario["Importe"] = df_inventario["Importe"].apply(lambda x: x if pd.notna(x) and x != 0 else "NULL")
+            df_inventario = ctx["motor"].agregar_importe(df_inventario)
             print("✔ Se agregó la columna 'Importe' y se reemplazaron vacíos por 'NULL'.")
 
-    # =====================================================
-    # 3. Previsualización
-    # =====================================================
-    for pref in PREFIXES:
-        df = resultados[pref]["df"]
+    hay_inventario = agregados_inv is not None or (df_inventario is not None and "Importe" in df_inventario.columns)
+    return {"df_inventario": df_inventario, "agregados_inv": agregados_inv, "hay_inventario": hay_inventario}
+
+def importe_por_almacen(ctx):
+    if ctx["agregados_inv"] is not None:
+        return ctx["agregados_inv"].importe_por_almacen()
+    return ctx["motor"].importe_por_almacen(ctx["df_inventario"])
+
+def importe_de_almacenes(ctx, almacenes: pd.Series):
+    # Importe de cada almacén de una hoja. Llave normalizada en los dos lados:
+    # el extracto CSV trae el Almacen como texto y las hojas como número.
+    importe = importe_por_almacen(ctx)
+    importe = importe.groupby(delta_inventario.normalizar_llave(pd.Series(importe.index)).to_numpy()).sum()
+    return delta_inventario.normalizar_llave(almacenes).map(importe).fillna(0)
+
+# =====================================================
+# 3. Previsualización
+# =====================================================
+def etapa_previsualizacion(ctx):
+    for pref, salida in FUENTES.items():
+        df = ctx[salida]
+        if pref == "Inventario":
+            df = ctx["agregados_inv"].muestra if ctx["agregados_inv"] is not None else ctx["df_inventario"]
         print(f"\n=== PREVISUALIZACIÓN: {pref} ===")
         if df is not None:
             print(df.head(10))
         else:
             print(f"No se cargó ningún DataFrame para {pref}.")
-    if df_inventario is not None and "Importe" in df_inventario.columns:
-        suma_importe = df_inventario.loc[df_inventario["Importe"]!="NULL","Importe"].sum()
+    if ctx["hay_inventario"]:
+        if ctx["agregados_inv"] is not None:
+            suma_importe = ctx["agregados_inv"].suma_importe()
+        else:
+            df_inventario = ctx["df_inventario"]
+            suma_importe = df_inventario.loc[df_inventario["Importe"]!="NULL","Importe"].sum()
         print(f"\n💰 Suma total de 'Importe' en Inventario (ignorando NULL): {suma_importe:,.2f}")
+    return {}
 
-    # =====================================================
-    # 4. Actualizar Analisis General
-    # =====================================================
-    if df_inventario is not None and os.path.exists(ARCHIVO_VALOR_INVENTARIO):
-        try:
-            df_valor = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_ANALISIS_GENERAL)
-            df_valor.columns = df_valor.columns.str.strip()
-            columnas_valor = ["Tipo de Almacen", "Almacen", "IMPORTE"]
-            faltantes_valor = [c for c in columnas_valor if c not in df_valor.columns]
-            if faltantes_valor:
-                print(f"❌ No se puede actualizar Analisis General. Faltan columnas: {faltantes_valor}")
-            else:
-                df_agg = df_inventario[df_inventario["Importe"]!="NULL"].groupby("Almacen")["Importe"].sum().reset_index()
-                df_valor["IMPORTE"] = df_valor["Almacen"].map(df_agg.set_index("Almacen")["Importe"]).fillna(0)
-                with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl", mode="a", if_sheet_exists="replace") as writer:
-                    df_valor.to_excel(writer, sheet_name=HOJA_ANALISIS_GENERAL, index=False)
-                print(f"✔ Hoja '{HOJA_ANALISIS_GENERAL}' actualizada.")
-        except Exception as e:
-            print(f"❌ Error al actualizar hoja Analisis General: {e}")
+# =====================================================
+# 4. Actualizar Analisis General
+# =====================================================
+def etapa_analisis_general(ctx):
+    archivo_valor = ctx["archivo_valor"]
+    if ctx["hay_inventario"] and os.path.exists(archivo_valor):
+        df_valor = pd.read_excel(archivo_valor, sheet_name=HOJA_ANALISIS_GENERAL)
+        df_valor.columns = df_valor.columns.str.strip()
+        columnas_valor = ["Tipo de Almacen", "Almacen", "IMPORTE"]
+        faltantes_valor = [c for c in columnas_valor if c not in df_valor.columns]
+        if faltantes_valor:
+            print(f"❌ No se puede actualizar Analisis General. Faltan columnas: {faltantes_valor}")
+        else:
+            df_valor["IMPORTE"] = importe_de_almacenes(ctx, df_valor["Almacen"])
+            with pd.ExcelWriter(archivo_valor, engine="openpyxl", mode="a", if_sheet_exists="replace") as writer:
+                df_valor.to_excel(writer, sheet_name=HOJA_ANALISIS_GENERAL, index=False)
+            print(f"✔ Hoja '{HOJA_ANALISIS_GENERAL}' actualizada.")
+    return {"hoja_analisis_general": True}
 
-    # =====================================================
-    # 5. Actualizar ABC
-    # =====================================================
-    try:
-        df_inventario["Almacen_norm"] = df_inventario["Almacen"].astype(str).str.strip().str.upper()
-        df_inventario["ABCGeneral_norm"] = (
-            df_inventario["ABCGeneral"]
-            .astype(str)
-            .str.strip()
-            .str.upper()
-            .replace({"": "NULL", "NAN": "NULL", "NONE": "NULL"})
-        )
-        df_inventario["Importe_n"] = pd.to_numeric(df_inventario["Importe"], errors="coerce").fillna(0)
+# =====================================================
+# 5. Actualizar ABC
+# =====================================================
+def etapa_clasificar_abc(ctx):
+    if CRITERIO_ABC == "extracto" or not ctx["hay_inventario"]:
+        return {"abc_calculado": None}
+    # El Pareto necesita ordenar todos los SKUs: en modo por bloques el importe
+    # por SKU se acumula row group por row group de la proyección en Parquet,
+    # sin volver a cargarla completa.
+    if ctx["agregados_inv"] is not None:
+        skus = ctx["agregados_inv"].skus_abc()
+    else:
+        skus = clasificacion_abc.sumas_por_sku(ctx["df_inventario"])
+    df_doh = ctx["df_doh"] if UMBRALES_XYZ else None
+    abc_calculado = clasificacion_abc.clasificar_skus(
+        skus, UMBRALES_ABC, df_doh=df_doh, umbrales_xyz=UMBRALES_XYZ)
+    return {"abc_calculado": abc_calculado}
+
+def etapa_abc(ctx):
+    if not ctx["hay_inventario"]:
+        return {}
+    archivo_valor = ctx["archivo_valor"]
+    clasificaciones = ctx["clasificaciones"]
+    abc_calculado = ctx["abc_calculado"]
+    columna_abc = "ABC Global" if CRITERIO_ABC == "global" else "ABC Almacen"
+    if abc_calculado is not None:
+        df_sumas = clasificacion_abc.sumas_por_clase(abc_calculado, columna_abc)
+    elif ctx["agregados_inv"] is not None:
+        df_sumas = ctx["agregados_inv"].sumas_abc()
+    else:
+        df_sumas = ctx["motor"].sumas_abc(ctx["df_inventario"])
 
-        df_sumas = (
-            df_inventario.groupby(["Almacen_norm", "ABCGeneral_norm"])["Importe_n"]
-            .sum()
-            .reset_index()
-        )
+    df_abc = pd.read_excel(archivo_valor, sheet_name=HOJA_ABC)
+    df_abc["Almacen_norm"] = df_abc["Almacen"].astype(str).str.strip().str.upper()
 
-        df_abc = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_ABC)
-        df_abc["Almacen_norm"] = df_abc["Almacen"].astype(str).str.strip().str.upper()
-
-        for idx, row in df_abc.iterrows():
-            almacen = row["Almacen_norm"]
-            if almacen == "TOTAL":
-                continue
-            for clas in CLASIFICACIONES:
-                encontrado = df_sumas[
-                    (df_sumas["Almacen_norm"] == almacen) &
-                    (df_sumas["ABCGeneral_norm"] == clas)
-                ]
-                valor = encontrado["Importe_n"].values[0] if not encontrado.empty else 0
-                df_abc.at[idx, clas] = valor
-
-        total_idx = df_abc[df_abc["Almacen_norm"] == "TOTAL"].index[0]
-        for clas in CLASIFICACIONES:
-            df_abc.at[total_idx, clas] = df_abc.loc[df_abc["Almacen_norm"]!="TOTAL", clas].sum()
-        df_abc["TOTAL"] = df_abc[CLASIFICACIONES].sum(axis=1)
-        df_abc = df_abc.drop(columns=["Almacen_norm"], errors="ignore")
-
-        with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl",
+    for idx, row in df_abc.iterrows():
+        almacen = row["Almacen_norm"]
+        if almacen == "TOTAL":
+            continue
+        for clas in clasificaciones:
+            encontrado = df_sumas[
+                (df_sumas["Almacen_norm"] == almacen) &
+                (df_sumas["ABCGeneral_norm"] == clas)
+            ]
+            valor = encontrado["Importe_n"].values[0] if not encontrado.empty else 0
+            df_abc.at[idx, clas] = valor
+
+    total_idx = df_abc[df_abc["Almacen_norm"] == "TOTAL"].index[0]
+    for clas in clasificaciones:
+        df_abc.at[total_idx, clas] = df_abc.loc[df_abc["Almacen_norm"]!="TOTAL", clas].sum()
+    df_abc["TOTAL"] = df_abc[clasificaciones].sum(axis=1)
+    df_abc = df_abc.drop(columns=["Almacen_norm"], errors="ignore")
+
+    reclasificados = None
+    if abc_calculado is not None:
+        reclasificados = clasificacion_abc.reporte_reclasificacion(abc_calculado, columna_abc)
+
+    with pd.ExcelWriter(archivo_valor, engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        df_abc.to_excel(writer, sheet_name=HOJA_ABC, index=False)
+        if reclasificados is not None:
+            top = reclasificados.head(TOP_RECLASIFICACIONES)
+            top.to_excel(writer, sheet_name=HOJA_RECLASIFICACION_ABC, index=False)
+            formato_excel.formatear_tabla(writer.sheets[HOJA_RECLASIFICACION_ABC], top,
+                                          columnas_moneda=["Importe"])
+
+    print("✔ Hoja ABC actualizada correctamente.")
+    if reclasificados is not None:
+        participacion = reclasificados["Importe"].sum() / abc_calculado["Importe"].sum() if abc_calculado["Importe"].sum() else 0
+        print(f"✔ ABC calculado ({CRITERIO_ABC}, umbrales {'/'.join(map(str, UMBRALES_ABC))}): "
+              f"{len(reclasificados):,} SKU(s) cambian de clase vs. el extracto ({participacion:.1%} del importe).")
+    return {}
+
+# =====================================================
+# 6. Actualizar hoja Transitos
+# =====================================================
+def etapa_filtrar_transitos(ctx):
+    df_transitos = ctx["df_transitos_crudo"]
+    if df_transitos is not None:
+        df_transitos = ctx["motor"].filtrar_transitos(df_transitos)
+    return {"df_transitos": df_transitos}
+
+def etapa_escribir_transitos(ctx):
+    df_transitos = ctx["df_transitos"]
+    if df_transitos is not None:
+        with pd.ExcelWriter(ctx["archivo_valor"], engine="openpyxl",
                             mode="a", if_sheet_exists="replace") as writer:
-            df_abc.to_excel(writer, sheet_name=HOJA_ABC, index=False)
+            df_transitos.to_excel(writer, sheet_name=HOJA_TRANSITOS, index=False)
 
-        print("✔ Hoja ABC actualizada correctamente.")
+        print("✔ Hoja Transitos actualizada correctamente.")
+    return {}
 
-    except Exception as e:
-        print(f"❌ Error al actualizar hoja ABC: {e}")
+# =====================================================
+# 7. Actualizar hoja Dias Inventario
+# =====================================================
+def etapa_calcular_doh(ctx):
+    df_doh = ctx["df_doh_crudo"]
+    totales = {}
+    if df_doh is not None:
+        df_doh, totales = ctx["motor"].calcular_doh(df_doh)
+    return {"df_doh": df_doh, "totales": totales}
 
-    # =====================================================
-    # 6. Actualizar hoja Transitos
-    # =====================================================
-    df_transitos = resultados["TransitosPendientes"]["df"]
-    if df_transitos is not None:
-        try:
-            df_transitos = df_transitos[df_transitos["Mov"].str.strip().str.upper() == "TRANSITO"].copy()
+def etapa_escribir_doh(ctx):
+    df_doh = ctx["df_doh"]
+    if df_doh is not None:
+        with pd.ExcelWriter(ctx["archivo_valor"], engine="openpyxl",
+                            mode="a", if_sheet_exists="replace") as writer:
+            df_doh.to_excel(writer, sheet_name=HOJA_DIAS_INV, index=False)
 
-            df_transitos["CantidadPendiente"] = pd.to_numeric(df_transitos["CantidadPendiente"], errors="coerce").fillna(0)
-            df_transitos["Costo"] = pd.to_numeric(df_transitos["Costo"], errors="coerce").fillna(0)
-            df_transitos["IMPORTE"] = df_transitos["CantidadPendiente"] * df_transitos["Costo"]
-            df_transitos["Proyecto"] = ""
+        print("✔ Hoja Dias Inventario actualizada correctamente.")
+    return {}
 
-            columnas_finales = ["Mov","MovID","Estatus","FechaEmision","Articulo","Descripcion1",
-                                "Cantidad","AlmacenPartida","AlmacenDestino","Costo","Observaciones",
-                                "CantidadPendiente","Proyecto","IMPORTE"]
+# =====================================================
+# 7.1 Escenarios what-if de DOH
+# =====================================================
+def etapa_escenarios_doh(ctx):
+    df_doh = ctx["df_doh"]
+    if df_doh is None:
+        return {"escenarios_doh": None}
+    if ARCHIVO_ESCENARIOS_DOH:
+        escenarios = escenarios_doh.cargar_escenarios(ARCHIVO_ESCENARIOS_DOH)
+    else:
+        escenarios = escenarios_doh.rejilla(FACTORES_VENTA_ESCENARIOS, LLEGADAS_OC_ESCENARIOS,
+                                            RETRASOS_TRANSITO_ESCENARIOS)
+    df_cat = escenarios_doh.preparar_categorias(df_doh)
+
+    # Choques por proveedor: la OC se liga a la categoría por el Articulo del
+    # Inventario (en modo por bloques no hay Inventario completo para ligarla)
+    proveedores = None
+    if ctx["df_oc"] is not None and ctx["df_inventario"] is not None and "Categoria" in ctx["df_inventario"].columns:
+        df_inv = ctx["df_inventario"]
+        articulo_categoria = pd.Series(
+            df_inv["Categoria"].astype(str).str.strip().str.upper().to_numpy(),
+            index=df_inv["Articulo"].astype(str).str.strip().str.upper().to_numpy(),
+        )
+        articulo_categoria = articulo_categoria[~articulo_categoria.index.duplicated()]
+        proveedores = escenarios_doh.participacion_proveedores(ctx["df_oc"], articulo_categoria,
+                                                               df_cat["Categoria_norm"])
+
+    resultado, sin_ligar = escenarios_doh.evaluar(escenarios, df_cat, HORIZONTE_ESCENARIOS_DIAS, proveedores)
+    if sin_ligar:
+        print(f"ℹ Escenarios: sin OC ligadas a una categoría para {sorted(sin_ligar)}; el choque no los afecta.")
+    print(f"✔ {len(resultado)} escenario(s) de DOH evaluados sobre {len(df_cat)} categorías.")
+    return {"escenarios_doh": resultado}
+
+def etapa_escribir_escenarios(ctx):
+    resultado = ctx["escenarios_doh"]
+    if resultado is None:
+        return {}
+    with pd.ExcelWriter(ctx["archivo_valor"], engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        resultado.to_excel(writer, sheet_name=HOJA_ESCENARIOS_DOH, index=False)
+        formato_excel.formatear_tabla(writer.sheets[HOJA_ESCENARIOS_DOH], resultado,
+                                      columnas_moneda=["Valor en Riesgo"],
+                                      columnas_ratio=["DOH Total"] + [f"DOH P{p}" for p in escenarios_doh.PERCENTILES])
+    print(f"✔ Hoja '{HOJA_ESCENARIOS_DOH}' actualizada.")
+    return {}
 
-            df_transitos = df_transitos[[c for c in columnas_finales if c in df_transitos.columns]]
+# =====================================================
+# 8. Actualizar Historico Categoria
+# =====================================================
+def etapa_historico_categoria(ctx):
+    archivo_valor = ctx["archivo_valor"]
+    if not (ctx["hay_inventario"] and os.path.exists(archivo_valor)):
+        return {}
+    df_analisis = pd.read_excel(archivo_valor, sheet_name=HOJA_ANALISIS_GENERAL)
+    df_analisis["Tipo de Almacen"] = df_analisis["Tipo de Almacen"].astype(str).str.strip().str.upper()
+    almacenes_filtrados = df_analisis[df_analisis["Tipo de Almacen"].isin(ctx["tipos_almacen"])]["Almacen"].tolist()
+
+    df_hist = pd.read_excel(archivo_valor, sheet_name=HOJA_HISTORICO_CATEGORIA)
+
+    if ctx["agregados_inv"] is not None:
+        df_sum = ctx["agregados_inv"].importe_por_categoria(almacenes_filtrados)
+    else:
+        df_sum = ctx["motor"].importe_por_categoria(ctx["df_inventario"], almacenes_filtrados)
 
-            with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl",
-                                mode="a", if_sheet_exists="replace") as writer:
-                df_transitos.to_excel(writer, sheet_name=HOJA_TRANSITOS, index=False)
+    col_fecha = ctx["fecha_hoy"]
 
-            print("✔ Hoja Transitos actualizada correctamente.")
+    if col_fecha not in df_hist.columns:
+        insert_pos = df_hist.columns.get_loc("Categoria") + 1
+        df_hist.insert(insert_pos, col_fecha, 0)
 
-        except Exception as e:
-            print(f"❌ Error al actualizar hoja Transitos: {e}")
+    for idx, row in df_sum.iterrows():
+        cat = row["Categoria"]
+        valor = row["Importe"]
+        if cat in df_hist["Categoria"].values:
+            df_hist.loc[df_hist["Categoria"] == cat, col_fecha] = valor
+        else:
+            nueva_fila = {c: 0 for c in df_hist.columns}
+            nueva_fila["Categoria"] = cat
+            nueva_fila[col_fecha] = valor
+            df_hist = pd.concat([df_hist, pd.DataFrame([nueva_fila])], ignore_index=True)
 
-    # =====================================================
-    # 7. Actualizar hoja Dias Inventario
-    # =====================================================
-    df_doh = resultados["DOH_C"]["df"]
-    totales = {} # Definir fuera para acceso global en el script
-    if df_doh is not None:
-        try:
-            for col in ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP"]:
-                df_doh[col] = pd.to_numeric(df_doh[col], errors="coerce").fillna(0)
+    df_hist[col_fecha] = df_hist[col_fecha].fillna(0)
+    df_hist = df_hist.sort_values(by=col_fecha, ascending=False).reset_index(drop=True)
 
-            df_doh["VPM"] = df_doh["Venta"] / 12
-            df_doh["PROYECCION"] = df_doh["Disponible"] + df_doh["Transitos"] + df_doh["OCompra"] - df_doh["PedidosP"]
+    with pd.ExcelWriter(archivo_valor, engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        df_hist.to_excel(writer, sheet_name=HOJA_HISTORICO_CATEGORIA, index=False)
 
-            df_doh["DOH_PROY"] = df_doh.apply(
-                lambda r: "Sin Venta" if r["VPM"] == 0 else
-                (r["Disponible"] + r["Transitos"] + r["OCompra"] - r["PedidosP"]) / (r["VPM"] * 12 / 360),
-                axis=1
-            )
+    print(f"✔ Hoja '{HOJA_HISTORICO_CATEGORIA}' actualizada correctamente y ordenada de mayor a menor por '{col_fecha}'.")
+    return {}
 
-            df_doh["DOH_INM"] = df_doh.apply(
-                lambda r: "Sin Venta" if r["VPM"] == 0 else
-                ((r["Disponible"] + r["Transitos"]) / r["VPM"]) * 30,
-                axis=1
-            )
+# =====================================================
+# 9. Actualizar Historico Almacen
+# =====================================================
+def etapa_historico_almacen(ctx):
+    archivo_valor = ctx["archivo_valor"]
+    if not (ctx["hay_inventario"] and os.path.exists(archivo_valor)):
+        return {}
+    df_hist_alm = pd.read_excel(archivo_valor, sheet_name=HOJA_HISTORICO_ALMACEN)
 
-            df_doh["MESES_FINAL"] = df_doh["DOH_PROY"].apply(lambda val: val if val=="Sin Venta" else val/30)
+    col_fecha = ctx["fecha_hoy"]
 
-            df_doh = df_doh.sort_values(by="Disponible", ascending=False).reset_index(drop=True)
+    if col_fecha not in df_hist_alm.columns:
+        insert_pos = df_hist_alm.columns.get_loc("Almacen") + 1
+        df_hist_alm.insert(insert_pos, col_fecha, 0)
 
-            for col in ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP", "VPM", "PROYECCION"]:
-                totales[col] = df_doh[col].sum()
-            totales["DOH_PROY"] = (totales["Disponible"] + totales["Transitos"] + totales["OCompra"] - totales["PedidosP"]) / (totales["VPM"] * 12 / 360) if totales["VPM"] !=0 else "Sin Venta"
-            totales["DOH_INM"] = ((totales["Disponible"] + totales["Transitos"]) / totales["VPM"]) * 30 if totales["VPM"] !=0 else "Sin Venta"
-            totales["MESES_FINAL"] = totales["DOH_PROY"]/30 if totales["DOH_PROY"] != "Sin Venta" else "Sin Venta"
+    df_hist_alm[col_fecha] = importe_de_almacenes(ctx, df_hist_alm["Almacen"])
 
-            df_doh.loc[len(df_doh)] = [ "TOTAL" ] + [totales[col] for col in ["Disponible", "Transitos", "Venta", "OCompra", "PedidosP", "VPM", "PROYECCION","DOH_PROY","DOH_INM","MESES_FINAL"]]
+    with pd.ExcelWriter(archivo_valor, engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        df_hist_alm.to_excel(writer, sheet_name=HOJA_HISTORICO_ALMACEN, index=False)
 
-            with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl",
-                                mode="a", if_sheet_exists="replace") as writer:
-                df_doh.to_excel(writer, sheet_name=HOJA_DIAS_INV, index=False)
+    print(f"✔ Hoja '{HOJA_HISTORICO_ALMACEN}' actualizada correctamente.")
+    return {}
 
-            print("✔ Hoja Dias Inventario actualizada correctamente.")
+# =====================================================
+# 9.1 Delta diario por SKU (vs. corte anterior)
+# =====================================================
+def etapa_calcular_delta(ctx):
+    vacio = {"delta": None, "delta_top_df": pd.DataFrame(), "delta_almacen": None, "fecha_delta_anterior": None}
+    if not ctx["hay_inventario"]:
+        return vacio
+    if ctx["agregados_inv"] is not None:
+        snap_hoy = ctx["agregados_inv"].snapshot()
+    else:
+        snap_hoy = delta_inventario.preparar_snapshot(ctx["df_inventario"])
+    fecha_ant, snap_ant = delta_inventario.cargar_snapshot_anterior(ctx["carpeta_cache"], ctx["date_str"])
+    delta_inventario.guardar_snapshot(snap_hoy, ctx["carpeta_cache"], ctx["date_str"])
+
+    if snap_ant is None:
+        print("ℹ No hay corte anterior en cache; el delta por SKU se calculará a partir de mañana.")
+        return vacio
+    delta = delta_inventario.calcular_delta(snap_ant, snap_hoy)
+    return {
+        "delta": delta,
+        "delta_top_df": delta_inventario.top_movimientos(delta, TOP_MOVIMIENTOS),
+        "delta_almacen": delta_inventario.resumen_por_almacen(delta),
+        "fecha_delta_anterior": fecha_ant,
+    }
+
+def etapa_escribir_delta(ctx):
+    delta, delta_top_df, delta_almacen = ctx["delta"], ctx["delta_top_df"], ctx["delta_almacen"]
+    if delta is None:
+        return {}
+    columnas_importe = [c for c in delta_top_df.columns if c.startswith(("Importe", "Delta", "Efecto"))]
+    with pd.ExcelWriter(ctx["archivo_valor"], engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        delta_top_df.to_excel(writer, sheet_name=HOJA_DELTA_SKU, index=False)
+        delta_almacen.to_excel(writer, sheet_name=HOJA_DELTA_ALMACEN, index=False)
+        formato_excel.formatear_tabla(writer.sheets[HOJA_DELTA_SKU], delta_top_df,
+                                      columnas_moneda=columnas_importe)
+        formato_excel.formatear_tabla(writer.sheets[HOJA_DELTA_ALMACEN], delta_almacen,
+                                      columnas_moneda=columnas_importe)
+
+    print(f"✔ Delta por SKU vs. {ctx['fecha_delta_anterior']}: {len(delta):,} movimientos, "
+          f"variación neta {delta['Delta Importe'].sum():,.2f}.")
+    return {}
 
-        except Exception as e:
-            print(f"❌ Error al actualizar hoja Dias Inventario: {e}")
+# =====================================================
+# 10. Actualizar hoja Comportamiento (fila más reciente arriba)
+# =====================================================
+def etapa_comportamiento(ctx):
+    archivo_valor = ctx["archivo_valor"]
+    fecha_hoy = ctx["fecha_hoy"]
+    df_transitos = ctx["df_transitos"]
+    totales = ctx["totales"]
 
-    # =====================================================
-    # 8. Actualizar Historico Categoria
-    # =====================================================
-    if df_inventario is not None and os.path.exists(ARCHIVO_VALOR_INVENTARIO):
-        try:
-            df_analisis = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_ANALISIS_GENERAL)
-            df_analisis["Tipo de Almacen"] = df_analisis["Tipo de Almacen"].astype(str).str.strip().str.upper()
-            almacenes_validos = ["ALMACENES FACTURACIÓN", "ALMACENES CONSIGNACION", "ALMACENES MALESTADO"]
-            almacenes_filtrados = df_analisis[df_analisis["Tipo de Almacen"].isin(almacenes_validos)]["Almacen"].tolist()
+    df_comport = pd.read_excel(archivo_valor, sheet_name=HOJA_COMPORTAMIENTO)
+    df_analisis = pd.read_excel(archivo_valor, sheet_name=HOJA_ANALISIS_GENERAL)
 
-            df_inv_filtrado = df_inventario[df_inventario["Almacen"].isin(almacenes_filtrados)]
-            df_inv_filtrado = df_inv_filtrado[df_inv_filtrado["Importe"] != "NULL"]
+    # Solo sumar ABC + DOH + STOCK de los tipos de almacén válidos
+    df_analisis_filtrado = df_analisis[df_analisis["Tipo de Almacen"].str.strip().str.upper().isin(ctx["tipos_almacen"])]
 
-            df_hist = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_HISTORICO_CATEGORIA)
+    valor_inventario_total = df_analisis_filtrado["IMPORTE"].sum()
+    valor_transitos_total = df_transitos["IMPORTE"].sum() if df_transitos is not None else 0
+    valor_total_dia = valor_inventario_total + valor_transitos_total
 
-            df_sum = df_inv_filtrado.groupby("Categoria")["Importe"].sum().reset_index()
+    doh_proy_total = totales.get("DOH_PROY", 0)
 
-            col_fecha = fecha_hoy
+    # --- NUEVA LÓGICA: no duplicar fecha ---
+    if (df_comport["Fecha"].astype(str).str.strip() == fecha_hoy).any():
+        print(f"ℹ Ya existe un registro para la fecha {fecha_hoy}, no se agregará fila duplicada.")
+        # NUEVA LÍNEA: Buscamos el valor que ya existe en el DataFrame para usarlo en el portal
+        variacion_diaria = df_comport.loc[df_comport["Fecha"].astype(str).str.strip() == fecha_hoy, "Variacion Diaria"].values[0]
 
-            if col_fecha not in df_hist.columns:
-                insert_pos = df_hist.columns.get_loc("Categoria") + 1
-                df_hist.insert(insert_pos, col_fecha, 0)
+    else:
+        ultimo_valor = df_comport.iloc[0]["Valor Total"] if not df_comport.empty else 0
+        variacion_diaria = valor_total_dia - ultimo_valor
+
+        fila_nueva = {
+            "Fecha": fecha_hoy,
+            "Valor Total": valor_total_dia,
+            "DOH Proyectado": doh_proy_total,
+            "Objetivo": ctx["objetivo"],
+            "Variacion Diaria": variacion_diaria
+        }
 
-            for idx, row in df_sum.iterrows():
-                cat = row["Categoria"]
-                valor = row["Importe"]
-                if cat in df_hist["Categoria"].values:
-                    df_hist.loc[df_hist["Categoria"] == cat, col_fecha] = valor
-                else:
-                    nueva_fila = {c: 0 for c in df_hist.columns}
-                    nueva_fila["Categoria"] = cat
-                    nueva_fila[col_fecha] = valor
-                    df_hist = pd.concat([df_hist, pd.DataFrame([nueva_fila])], ignore_index=True)
+        df_comport = pd.concat([pd.DataFrame([fila_nueva]), df_comport], ignore_index=True)
 
-            df_hist[col_fecha] = df_hist[col_fecha].fillna(0)
-            df_hist = df_hist.sort_values(by=col_fecha, ascending=False).reset_index(drop=True)
+    df_comport["Fecha"] = df_comport["Fecha"].apply(
+        lambda x: x.strftime("%d/%m/%Y") if isinstance(x, (datetime.datetime, pd.Timestamp)) else x
+    )
 
-            with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl",
-                                mode="a", if_sheet_exists="replace") as writer:
-                df_hist.to_excel(writer, sheet_name=HOJA_HISTORICO_CATEGORIA, index=False)
+    with pd.ExcelWriter(archivo_valor, engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        df_comport.to_excel(writer, sheet_name=HOJA_COMPORTAMIENTO, index=False)
 
-            print(f"✔ Hoja '{HOJA_HISTORICO_CATEGORIA}' actualizada correctamente y ordenada de mayor a menor por '{col_fecha}'.")
+    print(f"✔ Hoja '{HOJA_COMPORTAMIENTO}' actualizada correctamente con la fila del día en curso arriba.")
+    return {
+        "df_comport": df_comport,
+        "valor_inventario_total": valor_inventario_total,
+        "valor_transitos_total": valor_transitos_total,
+        "valor_total_dia": valor_total_dia,
+        "variacion_diaria": variacion_diaria,
+    }
 
-        except Exception as e:
-            print(f"❌ Error al actualizar hoja Historico Categoria: {e}")
+# =====================================================
+# 10.1 Resumen por periodos (semana, mes, trimestre, año)
+# =====================================================
+def etapa_resumen_periodos(ctx):
+    archivo_valor = ctx["archivo_valor"]
+
+    # La hoja guarda los acumulados: cada día de Comportamiento posterior a su
+    # último "Fin" suma una fila por tipo de periodo (normalmente solo el de
+    # hoy; más si una corrida anterior falló antes de guardar esta hoja).
+    # Solo la primera vez (o si se borró la hoja) se recorre la historia
+    # completa de Comportamiento.
+    resumen = resumen_periodos.leer(archivo_valor)
+    if resumen is None:
+        resumen = resumen_periodos.construir_desde_historia(ctx["df_comport"])
+        print(f"ℹ Hoja '{resumen_periodos.HOJA_RESUMEN_PERIODOS}' construida desde la historia de Comportamiento.")
+    else:
+        resumen, dias = resumen_periodos.ponerse_al_dia(resumen, ctx["df_comport"])
+        if dias == 0:
+            return {"resumen_periodos": resumen}
+        if dias > 1:
+            print(f"ℹ '{resumen_periodos.HOJA_RESUMEN_PERIODOS}' estaba atrasada: se sumaron {dias} días pendientes.")
+
+    with pd.ExcelWriter(archivo_valor, engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        resumen.to_excel(writer, sheet_name=resumen_periodos.HOJA_RESUMEN_PERIODOS, index=False)
+        formato_excel.formatear_tabla(writer.sheets[resumen_periodos.HOJA_RESUMEN_PERIODOS], resumen,
+                                      columnas_moneda=resumen_periodos.COLUMNAS_MONEDA,
+                                      columnas_ratio=resumen_periodos.COLUMNAS_RATIO)
+
+    print(f"✔ Hoja '{resumen_periodos.HOJA_RESUMEN_PERIODOS}' actualizada ({len(resumen)} periodos).")
+    return {"resumen_periodos": resumen}
 
-    # =====================================================
-    # 9. Actualizar Historico Almacen
-    # =====================================================
-    if df_inventario is not None and os.path.exists(ARCHIVO_VALOR_INVENTARIO):
-        try:
-            df_hist_alm = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_HISTORICO_ALMACEN)
+# =====================================================
+# 11. Generar gráfica mensual Valor Total vs Objetivo
+# =====================================================
+def etapa_grafica(ctx):
+    # =======================================================
+    # VARIABLE DE CONTROL
+    # =======================================================
+    DIAS_A_MOSTRAR = 7 # Define el número de días a incluir en la gráfica (Día actual + 6 días anteriores)
 
-            col_fecha = fecha_hoy
+    # Comportamiento ya actualizado por la etapa 10 (no se vuelve a leer el libro)
+    df_comp = ctx["df_comport"].copy()
 
-            if col_fecha not in df_hist_alm.columns:
-                insert_pos = df_hist_alm.columns.get_loc("Almacen") + 1
-                df_hist_alm.insert(insert_pos, col_fecha, 0)
+    # Convertir fechas
+    df_comp["Fecha"] = pd.to_datetime(df_comp["Fecha"], format="%d/%m/%Y", errors="coerce")
 
-            for idx, row in df_hist_alm.iterrows():
-                almacen = row["Almacen"]
-                valor = df_inventario.loc[df_inventario["Almacen"] == almacen, "Importe"]
-                valor = valor[valor != "NULL"].sum() if not valor.empty else 0
-                df_hist_alm.loc[idx, col_fecha] = valor
+    # 1. Ordenar por fecha ascendente para la gráfica (el más antiguo primero)
+    df_comp = df_comp.sort_values("Fecha", ascending=True)
 
-            with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl",
-                                mode="a", if_sheet_exists="replace") as writer:
-                df_hist_alm.to_excel(writer, sheet_name=HOJA_HISTORICO_ALMACEN, index=False)
+    # APLICAR FILTRO DE DÍAS USANDO LA VARIABLE
+    df_ultimos_dias = df_comp.tail(DIAS_A_MOSTRAR).copy()
 
-            print(f"✔ Hoja '{HOJA_HISTORICO_ALMACEN}' actualizada correctamente.")
+    fecha_max = df_ultimos_dias["Fecha"].max()
 
-        except Exception as e:
-            print(f"❌ Error al actualizar hoja Historico Almacen: {e}")
+    # Crear columna Etiqueta X (solo el número del día)
+    df_ultimos_dias["EtiquetaX"] = df_ultimos_dias["Fecha"].dt.strftime("%d-%b")
 
-    # =====================================================
-    # 10. Actualizar hoja Comportamiento (fila más reciente arriba)
-    # =====================================================
-    try:
-        df_comport = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_COMPORTAMIENTO)
-        df_analisis = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_ANALISIS_GENERAL)
+    # 3. Asignar datos diarios
+    x_labels = df_ultimos_dias["EtiquetaX"]
+    valores = df_ultimos_dias["Valor Total"]
+    objetivo_plot = df_ultimos_dias["Objetivo"]
+    doh_proyectado = pd.to_numeric(df_ultimos_dias["DOH Proyectado"], errors='coerce').fillna(0)
 
-        almacenes_principales = [
-            "ALMACENES FACTURACIÓN",
-            "ALMACENES CONSIGNACION",
-            "ALMACENES MALESTADO"
-        ]
+    # 4. Crear la gráfica y los DOS EJES Y
+    fig, ax1 = plt.subplots(figsize=(12, 6))
 
-        # Solo sumar ABC + DOH + STOCK de esos 3 tipos
-        df_analisis_filtrado = df_analisis[df_analisis["Tipo de Almacen"].str.strip().str.upper().isin(almacenes_principales)]
+    # ax1 será el eje primario (Valor Total / Objetivo)
+    ax1.plot(x_labels, valores, marker="o", label="Valor Total", color='C0', linewidth=1.0, alpha=0.6)
+    ax1.plot(x_labels, objetivo_plot, marker="x", linestyle="--", label="Objetivo", color='C1', linewidth=1.0, alpha=0.6)
 
-        valor_inventario_total = df_analisis_filtrado["IMPORTE"].sum()
-        valor_transitos_total = df_transitos["IMPORTE"].sum() if df_transitos is not None else 0
-        valor_total_dia = valor_inventario_total + valor_transitos_total
+    # ax2 será el eje secundario (DOH Proyectado)
+    ax2 = ax1.twinx()
+    ax2.plot(x_labels, doh_proyectado, marker="^", linestyle="-.", label="DOH Proyectado", color='C2', linewidth=1.0, alpha=0.6)
 
-        doh_proy_total = totales.get("DOH_PROY", 0)
-        objetivo = OBJETIVO_CONSTANTE
+    # --- Configuración Ejes y Etiquetas ---
 
-        # --- NUEVA LÓGICA: no duplicar fecha ---
-        if (df_comport["Fecha"].astype(str).str.strip() == fecha_hoy).any():
-            print(f"ℹ Ya existe un registro para la fecha {fecha_hoy}, no se agregará fila duplicada.")
-            # NUEVA LÍNEA: Buscamos el valor que ya existe en el DataFrame para usarlo en el portal
-            variacion_diaria = df_comport.loc[df_comport["Fecha"].astype(str).str.strip() == fecha_hoy, "Variacion Diaria"].values[0]
+    # Configurar Eje X (Común)
+    ax1.set_xlabel("Día")
+    ax1.tick_params(axis='x', rotation=45)
+    ax1.grid(True, linestyle=':', alpha=0.5, color='gray')
 
+    # Configurar Eje Y Primario (Valor Total / Objetivo)
+    ax1.set_ylabel("Valor Total")
 
+    # Definir la función de formato para MILLONES ($M)
+    def format_millions(x, pos):
+        if x >= 1e6:
+            return f'${x*1e-6:,.0f}M'
+        elif x >= 1e3:
+            return f'${x*1e-3:1.0f}K'
         else:
-            ultimo_valor = df_comport.iloc[0]["Valor Total"] if not df_comport.empty else 0
-            variacion_diaria = valor_total_dia - ultimo_valor
+            return f'${x:1.0f}'
 
-            fila_nueva = {
-                "Fecha": fecha_hoy,
-                "Valor Total": valor_total_dia,
-                "DOH Proyectado": doh_proy_total,
-                "Objetivo": objetivo,
-                "Variacion Diaria": variacion_diaria
-            }
+    formatter = ticker.FuncFormatter(format_millions)
+    ax1.yaxis.set_major_formatter(formatter)
 
-            df_comport = pd.concat([pd.DataFrame([fila_nueva]), df_comport], ignore_index=True)
+    # Configurar Eje Y Secundario (DOH Proyectado)
+    ax2.set_ylabel("DOH Proyectado (Días)", color='C2')
+    ax2.tick_params(axis='y', labelcolor='C2')
+    ax2.grid(False)
 
-        df_comport["Fecha"] = df_comport["Fecha"].apply(
-            lambda x: x.strftime("%d/%m/%Y") if isinstance(x, (datetime.datetime, pd.Timestamp)) else x
-        )
+    # 5. Título y Leyenda Unificada
+    plt.title(f"Valor Total, Objetivo y DOH - Comportamiento Diario (Últimos {DIAS_A_MOSTRAR} días)")
 
-        with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl",
-                            mode="a", if_sheet_exists="replace") as writer:
-            df_comport.to_excel(writer, sheet_name=HOJA_COMPORTAMIENTO, index=False)
+    # Mover leyenda fuera del gráfico
+    lines1, labels1 = ax1.get_legend_handles_labels()
+    lines2, labels2 = ax2.get_legend_handles_labels()
+    ax1.legend(lines1 + lines2, labels1 + labels2,
+            loc='upper left',
+            bbox_to_anchor=(1.05, 1.05))
 
-        print(f"✔ Hoja '{HOJA_COMPORTAMIENTO}' actualizada correctamente con la fila del día en curso arriba.")
+    # --- Etiquetas de Datos (Destacadas) ---
 
-    except Exception as e:
-        print(f"❌ Error al actualizar hoja Comportamiento: {e}")
+    def label_format(val):
+        return f'{val:,.0f}'
 
-    # =====================================================
-    # 11. Generar gráfica mensual Valor Total vs Objetivo
-    # =====================================================
-    try:
-        # =======================================================
-        # VARIABLE DE CONTROL
-        # =======================================================
-        DIAS_A_MOSTRAR = 7 # Define el número de días a incluir en la gráfica (Día actual + 6 días anteriores)
-        
-        # Leer hoja Comportamiento
-        df_comp = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_COMPORTAMIENTO)
-
-        # Convertir fechas
-        df_comp["Fecha"] = pd.to_datetime(df_comp["Fecha"], format="%d/%m/%Y", errors="coerce")
-        
-        # 1. Ordenar por fecha ascendente para la gráfica (el más antiguo primero)
-        df_comp = df_comp.sort_values("Fecha", ascending=True)
-
-        # APLICAR FILTRO DE DÍAS USANDO LA VARIABLE
-        df_ultimos_dias = df_comp.tail(DIAS_A_MOSTRAR).copy()
-
-        fecha_max = df_ultimos_dias["Fecha"].max()
-        
-        # Crear columna Etiqueta X (solo el número del día)
-        df_ultimos_dias["EtiquetaX"] = df_ultimos_dias["Fecha"].dt.strftime("%d-%b") 
-        
-        # 3. Asignar datos diarios
-        x_labels = df_ultimos_dias["EtiquetaX"]
-        valores = df_ultimos_dias["Valor Total"]
-        objetivo_plot = df_ultimos_dias["Objetivo"] 
-        doh_proyectado = pd.to_numeric(df_ultimos_dias["DOH Proyectado"], errors='coerce').fillna(0)
-
-        # 4. Crear la gráfica y los DOS EJES Y
-        fig, ax1 = plt.subplots(figsize=(12, 6)) 
-        
-        # ax1 será el eje primario (Valor Total / Objetivo)
-        ax1.plot(x_labels, valores, marker="o", label="Valor Total", color='C0', linewidth=1.0, alpha=0.6)
-        ax1.plot(x_labels, objetivo_plot, marker="x", linestyle="--", label="Objetivo", color='C1', linewidth=1.0, alpha=0.6)
-
-        # ax2 será el eje secundario (DOH Proyectado)
-        ax2 = ax1.twinx() 
-        ax2.plot(x_labels, doh_proyectado, marker="^", linestyle="-.", label="DOH Proyectado", color='C2', linewidth=1.0, alpha=0.6)
-        
-        # --- Configuración Ejes y Etiquetas ---
-        
-        # Configurar Eje X (Común)
-        ax1.set_xlabel("Día")
-        ax1.tick_params(axis='x', rotation=45)
-        ax1.grid(True, linestyle=':', alpha=0.5, color='gray')
-        
-        # Configurar Eje Y Primario (Valor Total / Objetivo)
-        ax1.set_ylabel("Valor Total")
-        
-        # Definir la función de formato para MILLONES ($M)
-        def format_millions(x, pos):
-            if x >= 1e6:
-                return f'${x*1e-6:,.0f}M' 
-            elif x >= 1e3:
-                return f'${x*1e-3:1.0f}K'
-            else:
-                return f'${x:1.0f}'
-
-        formatter = ticker.FuncFormatter(format_millions)
-        ax1.yaxis.set_major_formatter(formatter)
-        
-        # Configurar Eje Y Secundario (DOH Proyectado)
-        ax2.set_ylabel("DOH Proyectado (Días)", color='C2')
-        ax2.tick_params(axis='y', labelcolor='C2')
-        ax2.grid(False) 
-
-        # 5. Título y Leyenda Unificada
-        plt.title(f"Valor Total, Objetivo y DOH - Comportamiento Diario (Últimos {DIAS_A_MOSTRAR} días)")
-        
-        # Mover leyenda fuera del gráfico
-        lines1, labels1 = ax1.get_legend_handles_labels()
-        lines2, labels2 = ax2.get_legend_handles_labels()
-        ax1.legend(lines1 + lines2, labels1 + labels2, 
-                loc='upper left', 
-                bbox_to_anchor=(1.05, 1.05)) 
-        
-        # --- Etiquetas de Datos (Destacadas) ---
-        
-        def label_format(val):
-            return f'{val:,.0f}'
-            
-        # Etiquetas para Valor Total (Eje 1)
-        for i, val in enumerate(valores):
-            ax1.text(i, val * 1.0005, label_format(val), ha='center', va='bottom', fontsize=7, color='C0', fontweight='bold')
-            
-        # Etiquetas para Objetivo (Eje 1)
-        for i, obj in enumerate(objetivo_plot):
-            ax1.text(i, obj * 0.995, label_format(obj), ha='center', va='top', fontsize=8, color='C1', fontweight='bold')
-            
-        # Etiquetas para DOH Proyectado
-        for i, doh in enumerate(doh_proyectado):
-            ax2.text(i, doh * 1.0005, f'{doh:,.2f}', ha='center', va='bottom', fontsize=8, color='C2', fontweight='bold') 
-
-        # Ajustar límite Y primario
-        y_min_ax1 = min(valores.min(), objetivo_plot.min())
-        y_max_ax1 = max(valores.max(), objetivo_plot.max())
-        ax1.set_ylim(y_min_ax1 * 0.95, y_max_ax1 * 1.05) 
-
-        # --- Guardado e Inserción ---
-        
-        # 1. Ruta absoluta a tu carpeta de prueba
-        ruta_grafica_final = os.path.join(CARPETA_DESTINO, "grafica_comportamiento.png")
-        
-        # 2. Guardar la imagen físicamente
-        fig.canvas.draw()
-        plt.tight_layout()
-        fig.savefig(ruta_grafica_final, dpi=150, bbox_inches='tight', facecolor='white')
-
-        plt.close(fig)
-
-        print(f"✔ Gráfica guardada físicamente en: {ruta_grafica_final}")
-
-       
-    except Exception as e:
-        print(f"❌ Error al generar la imagen de la gráfica: {e}")
+    # Etiquetas para Valor Total (Eje 1)
+    for i, val in enumerate(valores):
+        ax1.text(i, val * 1.0005, label_format(val), ha='center', va='bottom', fontsize=7, color='C0', fontweight='bold')
 
-    # =====================================================
-    # 12. Actualizar hoja Resumen y Balance con Métricas Clave
-    # =====================================================
-    if os.path.exists(ARCHIVO_VALOR_INVENTARIO):
-        try:
-            # Se unifica el proceso de escritura de métricas en este bloque
-            wb = load_workbook(ARCHIVO_VALOR_INVENTARIO)
-            
-            if HOJA_RESUMEN_BALANCE not in wb.sheetnames:
-                print(f"❌ Error: La hoja '{HOJA_RESUMEN_BALANCE}' no existe en el archivo.")
-                return 
-                
-            ws = wb[HOJA_RESUMEN_BALANCE]
-
-            # Se agregara le fecha en las Metricas Clave del Día
-            ws["B3"] = fecha_hoy
-            ws["B3"].number_format = "DD/MM/YYYY"
-
-            # Diccionario de valores a escribir (Celda: Valor)
-            valores_clave = {
-                "B5": valor_transitos_total,       # Valor Transito
-                "B6": valor_inventario_total,      # Valor Inventario Físico
-                "B7": valor_total_dia,             # Valor Total
-                "B8": OBJETIVO_CONSTANTE,          # Objetivo
-                "B9": totales.get("DOH_PROY", "N/A"), # DOH Proyectado
-                "B10": totales.get("DOH_INM", "N/A") # DOH Inmediato
-            }
-            
-            # Formato de moneda para los valores
-            currency_format = '"$"#,##0.00'
-            
-            for celda, valor in valores_clave.items():
-                if isinstance(valor, (float, int)):
-                    ws[celda] = valor
-                    if celda in ["B5", "B6", "B7", "B8"]:
-                         ws[celda].number_format = currency_format
-                    elif celda in ["B9", "B10"]:
-                         ws[celda].number_format = "0.00"
-                else:
-                    ws[celda] = str(valor)
-            wb.save(ARCHIVO_VALOR_INVENTARIO)
-            print(f"✔ Hoja '{HOJA_RESUMEN_BALANCE}' actualizada con métricas clave.")
-
-        except Exception as e:
-            print(f"❌ Error al actualizar hoja Resumen y Balance (Métricas): {e}")
+    # Etiquetas para Objetivo (Eje 1)
+    for i, obj in enumerate(objetivo_plot):
+        ax1.text(i, obj * 0.995, label_format(obj), ha='center', va='top', fontsize=8, color='C1', fontweight='bold')
 
-    # =====================================================
-    # 13. Actualizar Balance Mensual (Últimos 3 meses) e Insertar Gráfica
-    # =====================================================
-    if os.path.exists(ARCHIVO_VALOR_INVENTARIO):
-        try:
-            # 1. CÁLCULO: Leer datos de Comportamiento y agrupar por Mes-Año
-            df_comp_mensual = pd.read_excel(ARCHIVO_VALOR_INVENTARIO, sheet_name=HOJA_COMPORTAMIENTO)
-            
-            # Asegurar que la columna Fecha sea datetime y Variacion Diaria sea numérica
-            df_comp_mensual["Fecha"] = pd.to_datetime(df_comp_mensual["Fecha"], format="%d/%m/%Y", errors="coerce")
-            df_comp_mensual["Variacion Diaria"] = pd.to_numeric(df_comp_mensual["Variacion Diaria"], errors="coerce").fillna(0)
-
-            df_comp_mensual["MesAnio"] = df_comp_mensual["Fecha"].dt.strftime("%b-%y")
-            df_mensual_agg = df_comp_mensual.groupby("MesAnio")["Variacion Diaria"].sum().reset_index()
-
-            # 2. CÁLCULO: Generar el rango dinámico de 3 meses (MES ACTUAL + 2 ANTERIORES)
-            fecha_max_data = df_comp_mensual["Fecha"].max() 
-            rango_meses_period = pd.period_range(end=fecha_max_data.to_period('M'), periods=3, freq='M')
-            rango_meses_str = [p.strftime("%b-%y") for p in rango_meses_period]
-            
-            df_resultado_mensual = pd.DataFrame(rango_meses_str, columns=["MesAnio"])
-            df_resultado_mensual = pd.merge(
-                df_resultado_mensual, 
-                df_mensual_agg, 
-                on="MesAnio", 
-                how="left"
-            ).fillna(0)
-            
-            # 3. ESCRITURA EN EXCEL: Datos y Gráfica
-            wb = load_workbook(ARCHIVO_VALOR_INVENTARIO)
-            ws = wb[HOJA_RESUMEN_BALANCE]
-
-            # LIMPIEZA: Borrar rango antiguo (A14:B25) para asegurar que no queden datos de meses viejos
-            for row_clean in range(14, 26):
-                ws[f'A{row_clean}'] = None
-                ws[f'B{row_clean}'] = None
-            
-            # Escritura de Meses y Valores (A14:B16 - últimos 3 meses)
-            currency_format = '"$"#,##0.00' 
-            for i, row_data in df_resultado_mensual.iterrows():
-                fila_actual = 14 + i
-                ws.cell(row=fila_actual, column=1).value = row_data["MesAnio"]
-                ws.cell(row=fila_actual, column=2).value = row_data["Variacion Diaria"]
-                ws.cell(row=fila_actual, column=2).number_format = currency_format
-            # --- INSERTAR LOGO TAMEX EN A1 ---
-            ruta_logo = os.path.join(BASE_DIR, "web", "Tamex.jpg")
-            if os.path.exists(ruta_logo):
-                img_logo = XLImage(ruta_logo)
-                # Escala pequeña para que quepa en la celda A1 (ajusta ancho/alto si es necesario)
-                img_logo.width = 110 
-                img_logo.height = 55
-                ws.add_image(img_logo, "A1")
-                print("✔ Logo Tamex insertado en A1.")    
-
-            # INSERTAR GRÁFICA EXCLUSIVAMENTE AQUÍ
-            if ws._images:
-                ws._images.clear() 
-                # Re-agregamos el logo después de limpiar
-                if os.path.exists(ruta_logo):
-                    img_logo = XLImage(ruta_logo)
-                    img_logo.width = 140; img_logo.height = 85
-                    ws.add_image(img_logo, "A1")
-            
-
-            # --- CORRECCIÓN UNIFICADA ---
-            ruta_grafica_final = os.path.join(CARPETA_DESTINO, "grafica_comportamiento.png")
-            if os.path.exists(ruta_grafica_final):
-                img_comp = XLImage(ruta_grafica_final)
-                img_comp.width = 700 
-                img_comp.height = 350
-                ws.add_image(img_comp, "D3") 
-                print(f"✔ Gráfica sincronizada insertada en Excel desde: {ruta_grafica_final}")
-
-            wb.save(ARCHIVO_VALOR_INVENTARIO)
-        except Exception as e:
-            print(f"❌ Error al actualizar Balance Mensual y Gráfica: {e}")
+    # Etiquetas para DOH Proyectado
+    for i, doh in enumerate(doh_proyectado):
+        ax2.text(i, doh * 1.0005, f'{doh:,.2f}', ha='center', va='bottom', fontsize=8, color='C2', fontweight='bold')
+
+    # Ajustar límite Y primario
+    y_min_ax1 = min(valores.min(), objetivo_plot.min())
+    y_max_ax1 = max(valores.max(), objetivo_plot.max())
+    ax1.set_ylim(y_min_ax1 * 0.95, y_max_ax1 * 1.05)
+
+    # --- Guardado e Inserción ---
+
+    # 1. Ruta absoluta a tu carpeta de prueba
+    ruta_grafica_final = os.path.join(ctx["carpeta_destino"], "grafica_comportamiento.png")
+
+    # 2. Guardar la imagen físicamente
+    fig.canvas.draw()
+    plt.tight_layout()
+    fig.savefig(ruta_grafica_final, dpi=150, bbox_inches='tight', facecolor='white')
+    # 3. Versión vectorial para el portal (texto como texto: pesa menos y se
+    #    comprime bien). Sin fecha ni ids aleatorios: misma gráfica, mismo archivo.
+    with plt.rc_context({"svg.fonttype": "none", "svg.hashsalt": "valor-inventario"}):
+        fig.savefig(os.path.splitext(ruta_grafica_final)[0] + ".svg", format="svg",
+                    bbox_inches='tight', facecolor='white', metadata={"Date": None})
+
+    plt.close(fig)
+
+    print(f"✔ Gráfica guardada físicamente en: {ruta_grafica_final}")
+    return {"ruta_grafica": ruta_grafica_final}
+
+# =====================================================
+# 12. Actualizar hoja Resumen y Balance con Métricas Clave
+# =====================================================
+def etapa_resumen_metricas(ctx):
+    archivo_valor = ctx["archivo_valor"]
+    if not os.path.exists(archivo_valor):
+        return {}
+    totales = ctx["totales"]
+    # Se unifica el proceso de escritura de métricas en este bloque
+    wb = load_workbook(archivo_valor)
+
+    if HOJA_RESUMEN_BALANCE not in wb.sheetnames:
+        raise ValueError(f"La hoja '{HOJA_RESUMEN_BALANCE}' no existe en el archivo.")
+
+    ws = wb[HOJA_RESUMEN_BALANCE]
+
+    # Se agregara le fecha en las Metricas Clave del Día
+    ws["B3"] = ctx["fecha_hoy"]
+    ws["B3"].number_format = "DD/MM/YYYY"
+
+    # Diccionario de valores a escribir (Celda: Valor)
+    valores_clave = {
+        "B5": ctx["valor_transitos_total"],       # Valor Transito
+        "B6": ctx["valor_inventario_total"],      # Valor Inventario Físico
+        "B7": ctx["valor_total_dia"],             # Valor Total
+        "B8": ctx["objetivo"],          # Objetivo
+        "B9": totales.get("DOH_PROY", "N/A"), # DOH Proyectado
+        "B10": totales.get("DOH_INM", "N/A") # DOH Inmediato
+    }
+
+    for celda, valor in valores_clave.items():
+        ws[celda] = valor if isinstance(valor, (float, int)) else str(valor)
+
+    # Formato por rango: moneda (B5:B8) y razón (B9:B10)
+    formato_excel.aplicar_formato_numero(ws, "B5:B8", formato_excel.FORMATO_MONEDA)
+    formato_excel.aplicar_formato_numero(ws, "B9:B10", formato_excel.FORMATO_RATIO)
+    wb.save(archivo_valor)
+    print(f"✔ Hoja '{HOJA_RESUMEN_BALANCE}' actualizada con métricas clave.")
+    return {}
+
+# =====================================================
+# 13. Actualizar Balance Mensual (últimos meses) e Insertar Gráfica
+# =====================================================
+def etapa_balance_mensual(ctx):
+    archivo_valor = ctx["archivo_valor"]
+    if not os.path.exists(archivo_valor):
+        return {"df_resultado_mensual": None}
+    # 1-2. CÁLCULO: variación neta de los últimos meses (mes actual + anteriores),
+    #      tomada del resumen por periodos; los meses sin datos quedan en 0
+    meses = min(MESES_BALANCE, 6)
+    ultimos_meses = resumen_periodos.ultimos(ctx["resumen_periodos"], "Mes", meses)
+    df_resultado_mensual = pd.DataFrame({
+        "MesAnio": ultimos_meses["Etiqueta"],
+        "Variacion Diaria": ultimos_meses["Variacion Neta"],
+    }).reset_index(drop=True)
+
+    # 3. ESCRITURA EN EXCEL: Datos y Gráfica
+    wb = load_workbook(archivo_valor)
+    ws = wb[HOJA_RESUMEN_BALANCE]
+
+    # LIMPIEZA: Borrar rango antiguo (A14:B25) para asegurar que no queden datos de meses viejos
+    for row_clean in range(14, 26):
+        ws[f'A{row_clean}'] = None
+        ws[f'B{row_clean}'] = None
+
+    # Escritura de Meses y Valores (desde A14 - últimos MESES_BALANCE meses)
+    for i, row_data in df_resultado_mensual.iterrows():
+        fila_actual = 14 + i
+        ws.cell(row=fila_actual, column=1).value = row_data["MesAnio"]
+        ws.cell(row=fila_actual, column=2).value = row_data["Variacion Diaria"]
+    if not df_resultado_mensual.empty:
+        formato_excel.aplicar_formato_numero(
+            ws, f"B14:B{13 + len(df_resultado_mensual)}", formato_excel.FORMATO_MONEDA)
+    # --- INSERTAR LOGO TAMEX EN A1 ---
+    ruta_logo = os.path.join(BASE_DIR, "web", "Tamex.jpg")
+    if os.path.exists(ruta_logo):
+        img_logo = XLImage(ruta_logo)
+        # Escala pequeña para que quepa en la celda A1 (ajusta ancho/alto si es necesario)
+        img_logo.width = 110
+        img_logo.height = 55
+        ws.add_image(img_logo, "A1")
+        print("✔ Logo Tamex insertado en A1.")
+
+    # INSERTAR GRÁFICA EXCLUSIVAMENTE AQUÍ
+    if ws._images:
+        ws._images.clear()
+        # Re-agregamos el logo después de limpiar
+        if os.path.exists(ruta_logo):
+            img_logo = XLImage(ruta_logo)
+            img_logo.width = 140; img_logo.height = 85
+            ws.add_image(img_logo, "A1")
+
+
+    # --- CORRECCIÓN UNIFICADA ---
+    ruta_grafica_final = ctx["ruta_grafica"]
+    if os.path.exists(ruta_grafica_final):
+        img_comp = XLImage(ruta_grafica_final)
+        img_comp.width = 700
+        img_comp.height = 350
+        ws.add_image(img_comp, "D3")
+        print(f"✔ Gráfica sincronizada insertada en Excel desde: {ruta_grafica_final}")
+
+    wb.save(archivo_valor)
+    return {"df_resultado_mensual": df_resultado_mensual}
+
+# =====================================================
+# 14. Actualizar OCPendientes por Proveedor (Tabla Dinámica Mejorada)
+# =====================================================
+def etapa_pivot_oc(ctx):
+    df_oc = ctx["df_oc"]
+    if df_oc is None:
+        return {"resumen_oc": None}
+    print("--- Procesando OCPendientes por Proveedor ---")
+
+    # 1-8. Importe en pesos, tabla dinámica Proveedor x Proyecto,
+    #      total horizontal, orden descendente y fila TOTAL GENERAL
+    return {"resumen_oc": ctx["motor"].pivot_oc(df_oc)}
+
+def etapa_escribir_oc(ctx):
+    resumen_oc = ctx["resumen_oc"]
+    if resumen_oc is None:
+        return {}
+    # 9. Guardar en Excel y aplicar FORMATO
+    HOJA_OC_PROV_NAME = "OCPendientes por Proveedor"
+    with pd.ExcelWriter(ctx["archivo_valor"], engine="openpyxl", mode="a", if_sheet_exists="replace") as writer:
+        resumen_oc.to_excel(writer, sheet_name=HOJA_OC_PROV_NAME, index=False)
+
+        ws_oc = writer.sheets[HOJA_OC_PROV_NAME]
+        n_cols = len(resumen_oc.columns)
+        fila_total = len(resumen_oc) + 1
+
+        # 1. Encabezados: Negrita solo para Proveedor e Importe Pendiente,
+        #    proyectos (en minúsculas) sin negrita
+        formato_excel.aplicar_estilo(ws_oc, "A1:B1", formato_excel.ESTILO_ENCABEZADO)
+        if n_cols > 2:
+            formato_excel.aplicar_estilo(ws_oc, formato_excel.rango(3, 1, n_cols, 1), formato_excel.ESTILO_ENCABEZADO_NORMAL)
+
+        # 2. Formato de moneda para todas las columnas de importe
+        formato_excel.aplicar_estilo(ws_oc, formato_excel.rango(2, 2, n_cols, fila_total - 1), formato_excel.ESTILO_MONEDA)
+
+        # 3. Fila de TOTAL GENERAL (siempre en negrita)
+        formato_excel.aplicar_estilo(ws_oc, formato_excel.rango(1, fila_total), formato_excel.ESTILO_TOTAL)
+        formato_excel.aplicar_estilo(ws_oc, formato_excel.rango(2, fila_total, n_cols, fila_total), formato_excel.ESTILO_TOTAL_MONEDA)
+
+        # 4. Ancho de columnas a partir del DataFrame
+        formato_excel.anchos_desde_dataframe(ws_oc, resumen_oc, margen=4)
+
+    print(f"✔ Hoja '{HOJA_OC_PROV_NAME}' actualizada. Columna duplicada eliminada.")
+    return {}
+
+# =====================================================
+# 15. Actualizar hoja Entradas X Planeación (Copia Espejo)
+# =====================================================
+def etapa_escribir_entradas(ctx):
+    df_entradas = ctx["df_entradas"]
+    if df_entradas is None:
+        return {}
+    print("--- Procesando Entradas X Planeación ---")
+    HOJA_ENTRADAS_NAME = "Entradas X Planeación"
+
+    with pd.ExcelWriter(ctx["archivo_valor"], engine="openpyxl",
+                        mode="a", if_sheet_exists="replace") as writer:
+        df_entradas.to_excel(writer, sheet_name=HOJA_ENTRADAS_NAME, index=False)
+
+        # Auto-ajuste de columnas (desde el DataFrame, no celda por celda)
+        formato_excel.anchos_desde_dataframe(writer.sheets[HOJA_ENTRADAS_NAME], df_entradas, margen=2)
+
+    print(f"✔ Hoja '{HOJA_ENTRADAS_NAME}' actualizada correctamente.")
+    return {}
+
+# =====================================================
+# 15.1. TOP 10 ENTRADAS (NUEVA SECCIÓN)
+# =====================================================
+def etapa_ventanas_entradas(ctx):
+    df_entradas = ctx["df_entradas"]
+    if df_entradas is None:
+        # El portal necesita el Top 10 y los importes; sin el extracto no se publica
+        raise ValueError("No se cargó 'Entradas X Planeacion'.")
+    print("--- Generando Top 10 de Entradas ---")
+
+    # 1-2. Último día operativo anterior a hoy, Top 10 por proveedor,
+    #      importe de ese día y acumulado del mes (ver 15.2)
+    top_10_df, importe_dia_anterior, importe_acumulado_mes, fecha_ayer = ctx["motor"].entradas_ventanas(df_entradas, ctx["date_str"])
+    return {
+        "top_10_df": top_10_df,
+        "importe_dia_anterior": importe_dia_anterior,
+        "importe_acumulado_mes": importe_acumulado_mes,
+        "fecha_ayer": fecha_ayer,
+    }
+
+def etapa_escribir_top10(ctx):
+    top_10_df = ctx["top_10_df"]
+
+    # 3. Cargar el Workbook para escribir en celdas específicas
+    wb = load_workbook(ctx["archivo_valor"])
+    ws_resumen = wb[HOJA_RESUMEN_BALANCE]
+
+    # 4. Limpiar rango antiguo (A21:B30)
+    for r in range(21, 31):
+        ws_resumen[f"A{r}"] = None
+        ws_resumen[f"B{r}"] = None
+
+    # 5. Escribir los datos y aplicar formato
+    for i, (idx, row) in enumerate(top_10_df.iterrows()):
+        fila = 21 + i
+        ws_resumen[f"A{fila}"] = str(row["Nombre"]).upper()
+        ws_resumen[f"B{fila}"] = row["Importe2"]
+    if not top_10_df.empty:
+        formato_excel.aplicar_formato_numero(
+            ws_resumen, f"B21:B{20 + len(top_10_df)}", formato_excel.FORMATO_MONEDA)
+
+    # 6. Ajustar ancho de columnas A y B
+    if not top_10_df.empty:
+        max_len_nombre = top_10_df["Nombre"].astype(str).map(len).max()
+        ws_resumen.column_dimensions['A'].width = max_len_nombre + 5
+    ws_resumen.column_dimensions['B'].width = 18
 
     # =====================================================
-    # 14. Actualizar OCPendientes por Proveedor (Tabla Dinámica Mejorada)
-    # =====================================================
-    df_oc = resultados["OCPendiente"]["df"]
-    if df_oc is not None:
-        try:
-            print("--- Procesando OCPendientes por Proveedor ---")
-            
-            # 1. Asegurar tipos de datos numéricos
-            df_oc["ImportePendiente"] = pd.to_numeric(df_oc["ImportePendiente"], errors="coerce").fillna(0)
-            df_oc["TipoCambio"] = pd.to_numeric(df_oc["TipoCambio"], errors="coerce").fillna(0)
-            
-            # 2. Crear columna calculada
-            df_oc["Importe pendiente OK"] = df_oc["ImportePendiente"] * df_oc["TipoCambio"]
-            
-            # 3. Limpiar columna Proyecto y pasar a MINÚSCULAS
-            df_oc["Proyecto"] = df_oc["Proyecto"].fillna("sin asignar").replace("", "sin asignar").astype(str).str.strip().str.lower()
-            
-            # 4. Crear la Pivot Table
-            resumen_oc = df_oc.pivot_table(
-                index="Nombre Proveedor", 
-                columns="Proyecto", 
-                values="Importe pendiente OK", 
-                aggfunc="sum", 
-                fill_value=0
-            )
-            
-            # 5. Calcular la columna de Total Horizontal (IMPORTE PENDIENTE)
-            # Al no hacer reset_index aún, Nombre Proveedor es el índice, no una columna.
-            resumen_oc["IMPORTE PENDIENTE"] = resumen_oc.sum(axis=1)
-            
-            # 6. Ordenar de mayor a menor por el total
-            resumen_oc = resumen_oc.sort_values(by="IMPORTE PENDIENTE", ascending=False)
-            
-            # 7. Ahora sí, bajamos el índice a columna y renombramos
-            resumen_oc = resumen_oc.reset_index()
-            resumen_oc = resumen_oc.rename(columns={"Nombre Proveedor": "NOMBRE DE PROVEEDOR"})
-            
-            # Convertimos los nombres de proveedores a MAYÚSCULAS
-            resumen_oc["NOMBRE DE PROVEEDOR"] = resumen_oc["NOMBRE DE PROVEEDOR"].astype(str).str.upper()
-
-            # --- REORDENAR: Solo las columnas necesarias (Elimina cualquier duplicada) ---
-            # Identificamos los nombres de los proyectos (en minúsculas)
-            cols_proyectos = [c for c in resumen_oc.columns if c not in ["NOMBRE DE PROVEEDOR", "IMPORTE PENDIENTE"]]
-            
-            # Forzamos el orden: PROVEEDOR (A), TOTAL (B), PROYECTOS (C en adelante)
-            columnas_finales = ["NOMBRE DE PROVEEDOR", "IMPORTE PENDIENTE"] + cols_proyectos
-            resumen_oc = resumen_oc[columnas_finales]
-
-            # 8. Agregar Fila de TOTALES al final
-            fila_totales = {"NOMBRE DE PROVEEDOR": "TOTAL GENERAL"}
-            for col_tot in resumen_oc.columns:
-                if col_tot != "NOMBRE DE PROVEEDOR":
-                    fila_totales[col_tot] = resumen_oc[col_tot].sum()
-            
-            resumen_oc = pd.concat([resumen_oc, pd.DataFrame([fila_totales])], ignore_index=True)
-
-            # 9. Guardar en Excel y aplicar FORMATO
-            HOJA_OC_PROV_NAME = "OCPendientes por Proveedor"
-            with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl", mode="a", if_sheet_exists="replace") as writer:
-                resumen_oc.to_excel(writer, sheet_name=HOJA_OC_PROV_NAME, index=False)
-                
-                ws_oc = writer.sheets[HOJA_OC_PROV_NAME]
-                from openpyxl.styles import Font
-                
-                for col_cells in ws_oc.columns:
-                    max_len = 0
-                    column_letter = col_cells[0].column_letter
-                    header_value = col_cells[0].value 
-                    
-                    for cell in col_cells:
-                        # 1. Encabezados: Negrita solo para Proveedor e Importe Pendiente
-                        if cell.row == 1:
-                            if header_value in ["NOMBRE DE PROVEEDOR", "IMPORTE PENDIENTE"]:
-                                cell.font = Font(bold=True)
-                            else:
-                                cell.font = Font(bold=False) # Proyectos en minúsculas sin negrita
-
-                        # 2. Formato de moneda para valores numéricos
-                        if cell.row > 1 and isinstance(cell.value, (int, float)):
-                            cell.number_format = '"$"#,##0.00'
-                        
-                        # 3. Fila de TOTAL GENERAL (siempre en negrita)
-                        if ws_oc.cell(row=cell.row, column=1).value == "TOTAL GENERAL":
-                            cell.font = Font(bold=True)
-
-                        # 4. Cálculo de ancho para auto-ajuste
-                        try:
-                            if len(str(cell.value)) > max_len:
-                                max_len = len(str(cell.value))
-                        except: pass
-                    
-                    ws_oc.column_dimensions[column_letter].width = max_len + 4
-
-            print(f"✔ Hoja '{HOJA_OC_PROV_NAME}' actualizada. Columna duplicada eliminada.")
-
-        except Exception as e:
-            print(f"❌ Error al procesar OCPendientes por Proveedor: {e}")
-    
-    # =====================================================
-    # 15. Actualizar hoja Entradas X Planeación (Copia Espejo)
-    # =====================================================
-    df_entradas = resultados["Entradas X Planeacion"]["df"]
-    if df_entradas is not None:
-        try:
-            print("--- Procesando Entradas X Planeación ---")
-            HOJA_ENTRADAS_NAME = "Entradas X Planeación"
-            
-            with pd.ExcelWriter(ARCHIVO_VALOR_INVENTARIO, engine="openpyxl", 
-                                mode="a", if_sheet_exists="replace") as writer:
-                df_entradas.to_excel(writer, sheet_name=HOJA_ENTRADAS_NAME, index=False)
-                
-                # Auto-ajuste de columnas
-                ws_ent = writer.sheets[HOJA_ENTRADAS_NAME]
-                for col_cells in ws_ent.columns:
-                    max_len = 0
-                    column_letter = col_cells[0].column_letter
-                    for cell in col_cells:
-                        try:
-                            if cell.value:
-                                length = len(str(cell.value))
-                                if length > max_len: max_len = length
-                        except: pass
-                    ws_ent.column_dimensions[column_letter].width = max_len + 2
-
-            print(f"✔ Hoja '{HOJA_ENTRADAS_NAME}' actualizada correctamente.")
-
-        except Exception as e:
-            print(f"❌ Error al procesar la hoja Entradas X Planeación: {e}")
-    
-    # =====================================================
-    # 15.1. TOP 10 ENTRADAS (NUEVA SECCIÓN)
-    # =====================================================
-    if df_entradas is not None:
-        try:
-            print("--- Generando Top 10 de Entradas ---")
-            
-            # 1. Asegurar que Importe2 sea numérico
-            df_entradas["Importe2"] = pd.to_numeric(df_entradas["Importe2"], errors="coerce").fillna(0)
-
-            # Buscar la última fecha con datos que no sea hoy
-            df_entradas['FechaEmision'] = pd.to_datetime(df_entradas['FechaEmision'], errors='coerce')
-            fecha_ayer = df_entradas[df_entradas['FechaEmision'].dt.date < pd.to_datetime(date_str,format='%Y%m%d').date()]['FechaEmision'].max()
-            
-            # Crear el recorte del último día operativo
-            df_solo_ayer = df_entradas[df_entradas['FechaEmision'] == fecha_ayer]
-            
-            # 2. Agrupar, Sumar y Ordenar
-            top_10_df = df_solo_ayer.groupby("Nombre")["Importe2"].sum().reset_index()
-            top_10_df = top_10_df.sort_values(by="Importe2", ascending=False).head(10)
-
-            # 3. Cargar el Workbook para escribir en celdas específicas
-            wb = load_workbook(ARCHIVO_VALOR_INVENTARIO)
-            ws_resumen = wb[HOJA_RESUMEN_BALANCE]
-
-            # 4. Limpiar rango antiguo (A21:B30)
-            for r in range(21, 31):
-                ws_resumen[f"A{r}"] = None
-                ws_resumen[f"B{r}"] = None
-
-            # 5. Escribir los datos y aplicar formato
-            currency_format = '"$"#,##0.00'
-            for i, (idx, row) in enumerate(top_10_df.iterrows()):
-                fila = 21 + i
-                ws_resumen[f"A{fila}"] = str(row["Nombre"]).upper()
-                ws_resumen[f"B{fila}"] = row["Importe2"]
-                ws_resumen[f"B{fila}"].number_format = currency_format
-
-            # 6. Ajustar ancho de columnas A y B
-            if not top_10_df.empty:
-                max_len_nombre = top_10_df["Nombre"].astype(str).map(len).max()
-                ws_resumen.column_dimensions['A'].width = max_len_nombre + 5
-            ws_resumen.column_dimensions['B'].width = 18
-
-            # =====================================================
-            # 15.2. CÁLCULO DE IMPORTES ADICIONALES (B32 y B34)
-            # =====================================================
-            print("--- Calculando Importes Ayer y Mes ---")
-            
-            # Asegurar formato de fecha
-            df_entradas['FechaEmision'] = pd.to_datetime(df_entradas['FechaEmision'], errors='coerce')
-            fecha_hoy_dt = pd.to_datetime(date_str, format='%Y%m%d')
-            
-            # A. Cálculo Día Anterior (B32)
-            fechas_anteriores = df_entradas[df_entradas['FechaEmision'].dt.date < fecha_hoy_dt.date()]
-            importe_dia_anterior = 0
-            if not fechas_anteriores.empty:
-                ultima_fecha = fechas_anteriores['FechaEmision'].max()
-                importe_dia_anterior = fechas_anteriores[fechas_anteriores['FechaEmision'] == ultima_fecha]['Importe2'].sum()
-                print(f"ℹ️ Día anterior detectado: {ultima_fecha.date()}")
-
-            # B. Cálculo Acumulado Mes (B34)
-            inicio_mes = fecha_hoy_dt.replace(day=1)
-            importe_acumulado_mes = df_entradas[
-                (df_entradas['FechaEmision'].dt.date >= inicio_mes.date()) & 
-                (df_entradas['FechaEmision'].dt.date <= fecha_hoy_dt.date())
-            ]['Importe2'].sum()
-
-            # C. Escribir en Excel con formato
-            ws_resumen["B32"] = importe_dia_anterior
-            ws_resumen["B34"] = importe_acumulado_mes
-            ws_resumen["B32"].number_format = currency_format
-            ws_resumen["B34"].number_format = currency_format
-
-            # 7. GUARDADO FINAL ÚNICO
-            wb.save(ARCHIVO_VALOR_INVENTARIO)
-            print("✔ Top 10 e Importes (B32, B34) actualizados correctamente.")
-
-        except Exception as e:
-            print(f"❌ Error al procesar sección de Entradas: {e}")
-    # =====================================================
-    # 16. ACTUALIZACIÓN DEL PORTAL WEB (NUEVA SECCIÓN)
+    # 15.2. CÁLCULO DE IMPORTES ADICIONALES (B32 y B34)
     # =====================================================
-    try:
+    print("--- Calculando Importes Ayer y Mes ---")
 
-        info_para_web = {
-            'fecha': fecha_hoy,
-            'v_total': valor_total_dia,         
-            'v_transito': valor_transitos_total, 
-            'v_fisico': valor_inventario_total, 
-            'doh': totales.get("DOH_PROY", 0),
-            'v_diaria': variacion_diaria,
-            'e_ayer': importe_dia_anterior,
-            'e_mes': importe_acumulado_mes,
-            'top_10': top_10_df.to_dict(orient='records'),
-            'm1_n': df_resultado_mensual.iloc[0]['MesAnio'], 
-            'm1_v': df_resultado_mensual.iloc[0]['Variacion Diaria'],
-            'm2_n': df_resultado_mensual.iloc[1]['MesAnio'], 
-            'm2_v': df_resultado_mensual.iloc[1]['Variacion Diaria'],
-            'm3_n': df_resultado_mensual.iloc[2]['MesAnio'], 
-            'm3_v': df_resultado_mensual.iloc[2]['Variacion Diaria'],
-            'ruta_destino': CARPETA_DESTINO      
-        }
+    # A. Día Anterior (B32) y B. Acumulado Mes (B34): calculados en la etapa 15.1
+    if pd.notna(ctx["fecha_ayer"]):
+        print(f"ℹ️ Día anterior detectado: {ctx['fecha_ayer'].date()}")
+
+    # C. Escribir en Excel con formato
+    ws_resumen["B32"] = ctx["importe_dia_anterior"]
+    ws_resumen["B34"] = ctx["importe_acumulado_mes"]
+    formato_excel.aplicar_formato_numero(ws_resumen, "B32", formato_excel.FORMATO_MONEDA)
+    formato_excel.aplicar_formato_numero(ws_resumen, "B34", formato_excel.FORMATO_MONEDA)
 
-        # 2. Generar el index.html
-        actualizar_portal.actualizar_index(info_para_web)
-        # 1. Copiamos los recursos visuales a la carpeta final
-        asegurar_recursos_web(CARPETA_DESTINO)
+    # 7. GUARDADO FINAL ÚNICO
+    wb.save(ctx["archivo_valor"])
+    print("✔ Top 10 e Importes (B32, B34) actualizados correctamente.")
+    return {}
+
+# =====================================================
+# 16. ACTUALIZACIÓN DEL PORTAL WEB (NUEVA SECCIÓN)
+# =====================================================
+def etapa_portal(ctx):
+    carpeta_destino = ctx["carpeta_destino"]
+    info_para_web = {
+        'fecha': ctx["fecha_hoy"],
+        'v_total': ctx["valor_total_dia"],
+        'v_transito': ctx["valor_transitos_total"],
+        'v_fisico': ctx["valor_inventario_total"],
+        'doh': ctx["totales"].get("DOH_PROY", 0),
+        'v_diaria': ctx["variacion_diaria"],
+        'e_ayer': ctx["importe_dia_anterior"],
+        'e_mes': ctx["importe_acumulado_mes"],
+        'top_10': ctx["top_10_df"].to_dict(orient='records'),
+        'delta_top': ctx["delta_top_df"].to_dict(orient='records'),
+        'meses': [
+            {'Etiqueta': fila['Etiqueta'], 'Variacion Neta': fila['Variacion Neta']}
+            for fila in resumen_periodos.ultimos(ctx["resumen_periodos"], "Mes", MESES_BALANCE).to_dict(orient='records')
+        ],
+        'escenarios': (
+            ctx["escenarios_doh"].sort_values("Valor en Riesgo", ascending=False, kind="stable")
+            .head(ESCENARIOS_PORTAL).to_dict(orient='records')
+            if ctx["escenarios_doh"] is not None else []
+        ),
+        'periodos': [
+            fila
+            for tipo, n in PERIODOS_PORTAL.items()
+            for fila in resumen_periodos.ultimos(ctx["resumen_periodos"], tipo, n).to_dict(orient='records')
+        ],
+        'ruta_destino': carpeta_destino,
+        'empresa': ctx["empresa"]['nombre'],
+        'objetivo': ctx["objetivo"]
+    }
+
+    # 2. Generar el index.html (los recursos visuales se publican optimizados en assets/)
+    actualizar_portal.actualizar_index(info_para_web)
+
+    print(f"✨ ¡Prueba generada! Revisa tu carpeta: {carpeta_destino}")
+
+    print(f"✔ ¡Prueba generada! Revisa tu carpeta: {carpeta_destino}")
+    return {"info_para_web": info_para_web}
+
+# =====================================================
+# GRAFO DE ETAPAS
+# =====================================================
+def construir_etapas():
+    # escribe=True: la etapa lee o guarda el libro / portal y corre bajo el
+    # candado de escritura. Las demás solo calculan y corren en paralelo.
+    E = planificador.Etapa
+    inventario = ["df_inventario", "agregados_inv", "hay_inventario"]
+    etapas = [E(f"cargar {pref}", etapa_carga(pref), salidas=[salida],
+                mensaje_error=f"Error al cargar '{pref}'")
+              for pref, salida in FUENTES.items()]
+    etapas += [
+        E("importe inventario", etapa_importe_inventario, ["df_inventario_crudo"], inventario,
+          mensaje_error="Error al calcular el Importe de Inventario"),
+        E("previsualizacion", etapa_previsualizacion, inventario + list(FUENTES.values())[1:]),
+        E("analisis general", etapa_analisis_general, inventario, ["hoja_analisis_general"], escribe=True,
+          mensaje_error="Error al actualizar hoja Analisis General"),
+        E("clasificar abc", etapa_clasificar_abc, inventario + ["df_doh"], ["abc_calculado"],
+          mensaje_error="Error al calcular la clasificación ABC"),
+        E("abc", etapa_abc, inventario + ["abc_calculado"], escribe=True,
+          mensaje_error="Error al actualizar hoja ABC"),
+        E("filtrar transitos", etapa_filtrar_transitos, ["df_transitos_crudo"], ["df_transitos"],
+          mensaje_error="Error al actualizar hoja Transitos"),
+        E("escribir transitos", etapa_escribir_transitos, ["df_transitos"], escribe=True,
+          mensaje_error="Error al actualizar hoja Transitos"),
+        E("calcular doh", etapa_calcular_doh, ["df_doh_crudo"], ["df_doh", "totales"],
+          mensaje_error="Error al actualizar hoja Dias Inventario"),
+        E("escribir doh", etapa_escribir_doh, ["df_doh"], escribe=True,
+          mensaje_error="Error al actualizar hoja Dias Inventario"),
+        E("escenarios doh", etapa_escenarios_doh, inventario + ["df_doh", "df_oc"], ["escenarios_doh"],
+          mensaje_error="Error al evaluar los escenarios de DOH"),
+        E("escribir escenarios", etapa_escribir_escenarios, ["escenarios_doh"], escribe=True,
+          mensaje_error="Error al actualizar hoja Escenarios DOH"),
+        E("historico categoria", etapa_historico_categoria, inventario, escribe=True,
+          mensaje_error="Error al actualizar hoja Historico Categoria"),
+        E("historico almacen", etapa_historico_almacen, inventario, escribe=True,
+          mensaje_error="Error al actualizar hoja Historico Almacen"),
+        E("calcular delta", etapa_calcular_delta, inventario,
+          ["delta", "delta_top_df", "delta_almacen", "fecha_delta_anterior"],
+          mensaje_error="Error al calcular el delta diario por SKU"),
+        E("escribir delta", etapa_escribir_delta, ["delta", "delta_top_df", "delta_almacen", "fecha_delta_anterior"],
+          escribe=True, mensaje_error="Error al escribir el delta diario por SKU"),
+        E("comportamiento", etapa_comportamiento, ["hoja_analisis_general", "df_transitos", "totales"],
+          ["df_comport", "valor_inventario_total", "valor_transitos_total", "valor_total_dia", "variacion_diaria"],
+          escribe=True, mensaje_error="Error al actualizar hoja Comportamiento"),
+        E("resumen periodos", etapa_resumen_periodos, ["df_comport"],
+          ["resumen_periodos"], escribe=True, mensaje_error="Error al actualizar hoja Resumen Periodos"),
+        E("grafica", etapa_grafica, ["df_comport"], ["ruta_grafica"],
+          mensaje_error="Error al generar la imagen de la gráfica"),
+        E("resumen metricas", etapa_resumen_metricas,
+          ["valor_inventario_total", "valor_transitos_total", "valor_total_dia", "totales"], escribe=True,
+          mensaje_error="Error al actualizar hoja Resumen y Balance (Métricas)"),
+        E("balance mensual", etapa_balance_mensual, ["resumen_periodos", "ruta_grafica"], ["df_resultado_mensual"],
+          escribe=True, mensaje_error="Error al actualizar Balance Mensual y Gráfica"),
+        E("pivot oc", etapa_pivot_oc, ["df_oc"], ["resumen_oc"],
+          mensaje_error="Error al procesar OCPendientes por Proveedor"),
+        E("escribir oc", etapa_escribir_oc, ["resumen_oc"], escribe=True,
+          mensaje_error="Error al procesar OCPendientes por Proveedor"),
+        E("escribir entradas", etapa_escribir_entradas, ["df_entradas"], escribe=True,
+          mensaje_error="Error al procesar la hoja Entradas X Planeación"),
+        E("ventanas entradas", etapa_ventanas_entradas, ["df_entradas"],
+          ["top_10_df", "importe_dia_anterior", "importe_acumulado_mes", "fecha_ayer"],
+          mensaje_error="Error al procesar sección de Entradas"),
+        # Balance mensual limpia A14:B25, que se traslapa con el Top 10 (A21:B30):
+        # el Top 10 se escribe después.
+        E("escribir top 10", etapa_escribir_top10,
+          ["top_10_df", "importe_dia_anterior", "importe_acumulado_mes", "fecha_ayer", "df_resultado_mensual"],
+          escribe=True,
+          mensaje_error="Error al procesar sección de Entradas"),
+        E("portal", etapa_portal,
+          ["valor_total_dia", "valor_transitos_total", "valor_inventario_total", "totales", "variacion_diaria",
+           "importe_dia_anterior", "importe_acumulado_mes", "top_10_df", "delta_top_df", "ruta_grafica",
+           "resumen_periodos", "escenarios_doh"],
+          ["info_para_web"], escribe=True, mensaje_error="Error en la actualización final"),
+    ]
+    return etapas
+
+# =====================================================
+# PROCESO PRINCIPAL
+# =====================================================
+def main(empresa: dict = None, max_workers: int = None, reanudar=None, comando_reanudar: str = None):
+    # reanudar: None = corrida nueva; True = última ejecución de la fecha;
+    # str = id de una ejecución concreta (ver cache/ejecuciones/).
+    # comando_reanudar: el que se sugiere si quedan etapas pendientes; una
+    # empresa de multi_empresa.py no se reanuda desde valor_inventario.py.
+    date_str, fecha_hoy = fecha_de_corte()
+    if MODO_DEMO:
+        print(f"🚀 MODO DEMO: Tiempo congelado en {fecha_hoy} para consistencia de datos.")
+    else:
+        print(f"\n=== BUSCANDO ARCHIVOS DEL DÍA {date_str} ===\n")
+
+    empresa = {**configuracion_por_defecto(), **(empresa or {})}
+    carpeta_origen = empresa["carpeta_origen"]
+    carpeta_destino = empresa["carpeta_destino"]
+    carpeta_cache = empresa["carpeta_cache"]
+    os.makedirs(carpeta_destino, exist_ok=True)
+    print(f"🏷 Empresa: {empresa['nombre']} | origen: {carpeta_origen} | destino: {carpeta_destino}")
+
+    motor = motor_dataframe.obtener_motor(
+        MOTOR_DATAFRAME,
+        memoria_max=MEMORIA_MAXIMA_MOTOR,
+        carpeta_temporal=os.path.join(carpeta_cache, "tmp_motor"),
+    )
+    print(f"⚙ Motor de transformaciones: {motor.nombre}")
+
+    rutas = {}
+    for pref in PREFIXES:
+        rutas[pref] = encontrar_archivo(carpeta_origen, pref, date_str)
+        if rutas[pref] is None:
+            print(f"✖ No se encontró archivo: '{pref} {date_str}'\n")
+        else:
+            print(f"✔ Encontrado: {rutas[pref]}")
+
+    # =====================================================
+    # 1.1 Preflight: validar encabezados antes del parseo completo
+    # =====================================================
+    problemas = validacion_esquema.validar_fuentes(rutas)
+    validacion_esquema.imprimir_reporte(problemas)
+    fuentes_invalidas = validacion_esquema.fuentes_con_error(problemas)
+    if fuentes_invalidas and PREFLIGHT_ESTRICTO:
+        print(f"❌ Preflight estricto: se cancela la corrida por errores en {sorted(fuentes_invalidas)}.")
+        return
+
+    contexto = {
+        "date_str": date_str,
+        "fecha_hoy": fecha_hoy,
+        "empresa": empresa,
+        "carpeta_destino": carpeta_destino,
+        "carpeta_cache": carpeta_cache,
+        "archivo_valor": os.path.join(carpeta_destino, "Valor de Inventario.xlsx"),
+        "objetivo": empresa["objetivo"],
+        "tipos_almacen": [t.strip().upper() for t in empresa["tipos_almacen"]],
+        "clasificaciones": empresa["clasificaciones"],
+        "motor": motor,
+        "rutas": rutas,
+        "fuentes_invalidas": fuentes_invalidas,
+    }
+
+    # Checkpoints por etapa: cada carga queda ligada a su extracto para
+    # invalidarla si el archivo cambia antes de reanudar
+    fuentes_por_etapa = {f"cargar {pref}": rutas[pref] for pref in PREFIXES}
+    almacen = None
+    if reanudar:
+        run_id = reanudar if isinstance(reanudar, str) else None
+        almacen = checkpoints.AlmacenEtapas.reanudar(carpeta_cache, run_id, date_str, empresa["nombre"], fuentes_por_etapa)
+        if almacen is None:
+            print("ℹ No hay ejecución previa de esta fecha para reanudar; se corre completa.")
+    if almacen is None:
+        almacen = checkpoints.AlmacenEtapas.nueva(carpeta_cache, date_str, empresa["nombre"], fuentes_por_etapa)
+    print(f"🏷 Ejecución: {almacen.run_id}")
+
+    plan = planificador.Planificador(construir_etapas(), max_workers or MAX_WORKERS)
+    contexto = plan.ejecutar(contexto, almacen)
+    plan.imprimir_reporte()
+
+    pendientes = plan.pendientes()
+    if pendientes:
+        print(f"⚠ {len(pendientes)} etapa(s) sin terminar: {', '.join(pendientes)}.")
+        comando = comando_reanudar or f"python valor_inventario.py --resume {almacen.run_id}"
+        print(f"  Corrige la causa y reanuda con: {comando}")
+    else:
+        almacen.descartar_salidas()  # nada que reanudar: no se dejan copias del Inventario en disco
 
-        print(f"✨ ¡Prueba generada! Revisa tu carpeta: {CARPETA_DESTINO}")
-        
-        print(f"✔ ¡Prueba generada! Revisa tu carpeta: {CARPETA_DESTINO}")
-        
-    except Exception as e:
-        print(f"❌ Error en la actualización final: {e}")
+    # Los KPIs del día se devuelven para el consolidado multi-empresa
+    return contexto.get("info_para_web")
 
 # =====================================================
 # EJECUCIÓN
 # =====================================================
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pipeline de Valor de Inventario.")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Etapas en paralelo (por defecto: MAX_WORKERS o núm. de núcleos)")
+    parser.add_argument("--resume", nargs="?", const=True, default=None, metavar="RUN_ID",
+                        help="Reanuda la última ejecución de la fecha (o RUN_ID): solo corren las etapas "
+                             "fallidas, omitidas o con extracto modificado")
+    args = parser.parse_args()
+    main(max_workers=args.max_workers, reanudar=args.resume)
@@ -0,0 +1,509 @@
+# =========================================================
+# MÓDULO: Verificación diferencial de etapas
+# DESCRIPCIÓN: Corre el pipeline dos veces sobre los mismos
+#              extractos y la misma plantilla: una con la lógica
+#              de referencia y otra con la candidata (constantes
+#              distintas, p. ej. otro MOTOR_DATAFRAME, u otra
+#              copia de scripts/). Compara celda por celda todas
+#              las hojas del libro (incluidas las de Resumen y
+#              Balance) y el diccionario de KPIs del portal con
+#              tolerancias de moneda, y exige presupuestos de
+#              tiempo y memoria por etapa: una versión más rápida
+#              pero con otras cifras falla, y una correcta pero
+#              más lenta también.
+#
+# USO:
+#   python verificar_etapas.py --candidato MOTOR_DATAFRAME=polars
+#   python verificar_etapas.py --candidato-scripts /ruta/otra/copia/scripts --filas-inventario 200000
+#   python verificar_etapas.py --referencia CRITERIO_ABC=extracto --candidato CRITERIO_ABC=almacen
+# =========================================================
+import argparse
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import zip_longest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+
+try:
+    import resource  # pico de memoria del proceso (no existe en Windows)
+except ImportError:
+    resource = None
+
+# Los módulos del pipeline NO se importan aquí: cada corrida los importa en
+# su propio proceso, así el candidato puede venir de otra copia de scripts/.
+BASE_DIR = Path(__file__).resolve().parent.parent
+CARPETA_DATOS = BASE_DIR / "data_samples"
+PLANTILLA = BASE_DIR / "output" / "Valor de Inventario.xlsx"
+LIBRO = "Valor de Inventario.xlsx"
+HOJA_RESUMEN_BALANCE = "Resumen y Balance"
+HOJA_ANALISIS_GENERAL = "Analisis General"
+
+# Tolerancias de comparación. Moneda: un centavo, o la parte relativa si la
+# cifra es tan grande que el redondeo de punto flotante pasa del centavo.
+TOLERANCIA_MONEDA = 0.01
+TOLERANCIA_RATIO = 1e-4       # DOH y demás razones (se muestran con 2 decimales)
+TOLERANCIA_RELATIVA = 1e-9    # celdas sin formato: solo ruido de orden de suma
+CLAVES_KPI_IGNORADAS = {"ruta_destino"}  # cada corrida escribe en su carpeta temporal
+
+# Presupuestos relativos a la referencia: el candidato puede tardar / ocupar
+# hasta FACTOR × referencia + HOLGURA por etapa. La holgura absorbe el ruido
+# de medición de las etapas cortas.
+FACTOR_TIEMPO = 1.20
+HOLGURA_TIEMPO_S = 0.25
+FACTOR_MEMORIA = 1.20
+HOLGURA_MEMORIA_MB = 5.0
+
+FILAS_INVENTARIO = 20000      # Inventario sintético si la carpeta de datos no trae uno
+MAX_DIFERENCIAS = 10          # diferencias que se imprimen por hoja
+
+
+# =====================================================
+# CORRIDA DE UN LADO (en su propio proceso)
+# =====================================================
+def _correr_lado(scripts: str, ajustes: dict, datos: str, plantilla: str, carpeta: str, medir_memoria: bool):
+    if scripts:
+        sys.path.insert(0, scripts)
+    import planificador
+    import valor_inventario
+
+    for nombre, valor in ajustes.items():
+        if not hasattr(valor_inventario, nombre):
+            raise ValueError(f"valor_inventario no tiene la constante '{nombre}'")
+        setattr(valor_inventario, nombre, valor)
+
+    class PlanificadorMedido(planificador.Planificador):
+        # Pico de memoria de cada etapa con tracemalloc (Python y NumPy; lo que
+        # reservan por fuera Polars o DuckDB solo se ve en el pico del proceso)
+        ultimo = None
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.memoria = {}
+            PlanificadorMedido.ultimo = self
+
+        def _correr(self, etapa, ctx, t0, almacen=None, reutilizar=False):
+            if not medir_memoria:
+                return super()._correr(etapa, ctx, t0, almacen, reutilizar)
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            try:
+                return super()._correr(etapa, ctx, t0, almacen, reutilizar)
+            finally:
+                self.memoria[etapa.nombre] = (tracemalloc.get_traced_memory()[1] - base) / 1024 ** 2
+
+    planificador.Planificador = PlanificadorMedido
+
+    destino = os.path.join(carpeta, "salida")
+    os.makedirs(destino, exist_ok=True)
+    shutil.copy2(plantilla, os.path.join(destino, LIBRO))
+    empresa = {
+        "nombre": "Verificacion",
+        "carpeta_origen": datos,
+        "carpeta_destino": destino,
+        "carpeta_cache": os.path.join(carpeta, "cache"),
+        "carpeta_cache_fuentes": None,
+    }
+    if medir_memoria:
+        tracemalloc.start()
+    ruta_log = os.path.join(carpeta, "ejecucion.log")
+    # Una etapa a la vez: en paralelo los tiempos y picos de una se mezclan con los de otra
+    with open(ruta_log, "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        info = valor_inventario.main(empresa, max_workers=1)
+    if medir_memoria:
+        tracemalloc.stop()
+
+    plan = PlanificadorMedido.ultimo
+    pico_proceso = None
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        pico_proceso = pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+    return {
+        "info": info,
+        "estadisticas": plan.estadisticas if plan else {},
+        "memoria": plan.memoria if plan else {},
+        "pendientes": plan.pendientes() if plan else [],
+        "pico_proceso_mb": pico_proceso,
+        "libro": os.path.join(destino, LIBRO),
+        "log": ruta_log,
+    }
+
+
+def correr(scripts: str, ajustes: dict, datos: str, plantilla: str, carpeta: str, medir_memoria: bool):
+    # Proceso nuevo por corrida ("spawn"): módulos, constantes y tracemalloc
+    # empiezan limpios y no se hereda nada de la corrida anterior
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(_correr_lado, scripts, ajustes, datos, plantilla, carpeta, medir_memoria).result()
+
+
+# =====================================================
+# DATOS DE PRUEBA
+# =====================================================
+def generar_datos(datos: str, plantilla: str, destino: str, filas: int, semilla: int):
+    # Copia los extractos de `datos` y agrega un Inventario sintético con los
+    # almacenes de la plantilla, las categorías de DOH_C y parte de los
+    # artículos de las OC (para que los escenarios por proveedor liguen)
+    import valor_inventario
+
+    date_str, _ = valor_inventario.fecha_de_corte()
+    os.makedirs(destino, exist_ok=True)
+    for pref in valor_inventario.PREFIXES:
+        ruta = valor_inventario.encontrar_archivo(datos, pref, date_str)
+        if ruta is not None and pref != "Inventario":
+            shutil.copy2(ruta, destino)
+
+    rng = np.random.default_rng(semilla)
+    almacenes = pd.read_excel(plantilla, sheet_name=HOJA_ANALISIS_GENERAL)["Almacen"].dropna().unique()
+    categorias = ["SIN CATEGORIA"]
+    ruta_doh = valor_inventario.encontrar_archivo(destino, "DOH_C", date_str)
+    if ruta_doh:
+        categorias = valor_inventario.cargar_en_dataframe(ruta_doh, "DOH_C")["Categoria"].dropna().unique()
+    articulos = [f"ART-{i:06d}" for i in range(max(1, filas // 3))]
+    ruta_oc = valor_inventario.encontrar_archivo(destino, "OCPendiente", date_str)
+    if ruta_oc:
+        de_oc = valor_inventario.cargar_en_dataframe(ruta_oc, "OCPendiente")["Articulo"].dropna().astype(str).unique()
+        articulos[: len(de_oc)] = de_oc[: len(articulos)]
+
+    df = pd.DataFrame({
+        "Almacen": rng.choice(almacenes, filas),
+        "Articulo": rng.choice(articulos, filas),
+        "Descripcion": "ARTICULO DE PRUEBA",
+        "Categoria": rng.choice(categorias, filas),
+        # Incluye vacíos y clases raras: el pipeline los manda a NULL
+        "ABCGeneral": rng.choice(["A", "B", "C", "D", "NULL", "", None], filas),
+        "Existencias": rng.integers(0, 500, filas).astype(float),
+        "CostoPromedio": rng.gamma(2.0, 300.0, filas).round(4),
+        "TipoCambio": rng.choice([1.0, 17.25], filas),
+    }).drop_duplicates(["Almacen", "Articulo"])
+    df.to_parquet(os.path.join(destino, f"Inventario {date_str}.parquet"), index=False)
+    print(f"✔ Inventario sintético: {len(df)} filas (semilla {semilla}) en {destino}")
+    return destino
+
+
+def tiene_inventario(datos: str):
+    import valor_inventario
+
+    date_str, _ = valor_inventario.fecha_de_corte()
+    return valor_inventario.encontrar_archivo(datos, "Inventario", date_str) is not None
+
+
+# =====================================================
+# COMPARACIÓN DE RESULTADOS
+# =====================================================
+def _tolerancia(formato: str, a: float, b: float):
+    formato = formato or "General"
+    relativa = TOLERANCIA_RELATIVA * max(abs(a), abs(b))
+    if "$" in formato or "#,##0" in formato:
+        return max(TOLERANCIA_MONEDA, relativa)
+    if "0.0" in formato:
+        return max(TOLERANCIA_RATIO, relativa)
+    return max(TOLERANCIA_RELATIVA, relativa)
+
+
+def _vacio(valor):
+    if valor is None or (isinstance(valor, str) and valor == ""):
+        return True
+    try:
+        return bool(pd.isna(valor))  # NaN, NaT, pd.NA
+    except (TypeError, ValueError):
+        return False
+
+
+def _numero(valor):
+    return isinstance(valor, (int, float, np.integer, np.floating)) and not isinstance(valor, (bool, np.bool_))
+
+
+def iguales(a, b, formato: str = "General"):
+    if _vacio(a) and _vacio(b):
+        return True
+    if _numero(a) and _numero(b):
+        return abs(float(a) - float(b)) <= _tolerancia(formato, float(a), float(b))
+    return bool(a == b)
+
+
+def comparar_hoja(ws_ref, ws_cand):
+    # [(celda, etiqueta, valor referencia, valor candidato)], celdas comparadas
+    diferencias, celdas = [], 0
+    encabezados = []
+    filas = zip_longest(ws_ref.iter_rows(), ws_cand.iter_rows(), fillvalue=())
+    for i, (fila_ref, fila_cand) in enumerate(filas, start=1):
+        if i == 1:
+            encabezados = [getattr(c, "value", None) for c in fila_ref]
+        for j, (c_ref, c_cand) in enumerate(zip_longest(fila_ref, fila_cand), start=1):
+            a, b = getattr(c_ref, "value", None), getattr(c_cand, "value", None)
+            celdas += 1
+            formato = getattr(c_ref, "number_format", None) or getattr(c_cand, "number_format", None)
+            if iguales(a, b, formato):
+                continue
+            # Resumen y Balance es de etiqueta en la columna A; las demás son tablas
+            if ws_ref.title == HOJA_RESUMEN_BALANCE:
+                etiqueta = getattr(fila_ref[0], "value", None) if fila_ref else None
+            else:
+                etiqueta = encabezados[j - 1] if j <= len(encabezados) else None
+            diferencias.append((f"{get_column_letter(j)}{i}", etiqueta, a, b))
+    return diferencias, celdas
+
+
+def comparar_libros(libro_ref: str, libro_cand: str):
+    # {hoja: (diferencias, celdas)}; celdas = None si la hoja falta en un lado
+    wb_ref = load_workbook(libro_ref, read_only=True, data_only=True)
+    wb_cand = load_workbook(libro_cand, read_only=True, data_only=True)
+    try:
+        resultado = {}
+        for hoja in list(dict.fromkeys(wb_ref.sheetnames + wb_cand.sheetnames)):
+            if hoja not in wb_ref.sheetnames or hoja not in wb_cand.sheetnames:
+                lado = "candidato" if hoja not in wb_cand.sheetnames else "referencia"
+                resultado[hoja] = ([f"la hoja no existe en el {lado}"], None)
+                continue
+            resultado[hoja] = comparar_hoja(wb_ref[hoja], wb_cand[hoja])
+        return resultado
+    finally:
+        wb_ref.close()
+        wb_cand.close()
+
+
+def comparar_kpis(ref, cand, ruta: str = "info_para_web"):
+    # Recorre el diccionario del portal (listas de registros incluidas). Las
+    # llaves de DOH se comparan como razón; el resto de los números, como moneda.
+    diferencias, valores = [], 0
+    if isinstance(ref, dict) and isinstance(cand, dict):
+        for clave in list(dict.fromkeys(list(ref) + list(cand))):
+            if clave in CLAVES_KPI_IGNORADAS:
+                continue
+            if clave not in ref or clave not in cand:
+                diferencias.append((f"{ruta}['{clave}']", ref.get(clave), cand.get(clave)))
+                continue
+            d, v = comparar_kpis(ref[clave], cand[clave], f"{ruta}['{clave}']")
+            diferencias += d
+            valores += v
+    elif isinstance(ref, list) and isinstance(cand, list):
+        if len(ref) != len(cand):
+            diferencias.append((f"{ruta} (largo)", len(ref), len(cand)))
+        for i, (a, b) in enumerate(zip(ref, cand)):
+            d, v = comparar_kpis(a, b, f"{ruta}[{i}]")
+            diferencias += d
+            valores += v
+    else:
+        valores = 1
+        formato = "0.00" if "doh" in ruta.lower() else '"$"#,##0.00'
+        if not iguales(ref, cand, formato):
+            diferencias.append((ruta, ref, cand))
+    return diferencias, valores
+
+
+# =====================================================
+# PRESUPUESTOS
+# =====================================================
+def medir(corridas_tiempo, corrida_memoria):
+    # {etapa: {"segundos": mínimo de las repeticiones, "memoria_mb": pico}}
+    medidas = {}
+    for corrida in corridas_tiempo:
+        for etapa, est in corrida["estadisticas"].items():
+            if "duracion" in est:
+                previo = medidas.setdefault(etapa, {}).get("segundos", math.inf)
+                medidas[etapa]["segundos"] = min(previo, est["duracion"])
+    if corrida_memoria:
+        for etapa, mb in corrida_memoria["memoria"].items():
+            medidas.setdefault(etapa, {})["memoria_mb"] = mb
+    total = {"segundos": min(sum(e.get("duracion", 0.0) for e in c["estadisticas"].values()) for c in corridas_tiempo)}
+    if corrida_memoria and corrida_memoria["pico_proceso_mb"] is not None:
+        total["memoria_mb"] = corrida_memoria["pico_proceso_mb"]
+    medidas["total"] = total
+    return medidas
+
+
+def revisar_presupuestos(medidas_ref: dict, medidas_cand: dict, absolutos: dict = None):
+    # [(etapa, métrica, valor candidato, límite, origen del límite)] que se pasan
+    excedidos = []
+    metricas = {"segundos": (FACTOR_TIEMPO, HOLGURA_TIEMPO_S), "memoria_mb": (FACTOR_MEMORIA, HOLGURA_MEMORIA_MB)}
+    for etapa, cand in medidas_cand.items():
+        for metrica, (factor, holgura) in metricas.items():
+            if metrica not in cand:
+                continue
+            ref = medidas_ref.get(etapa, {}).get(metrica)
+            if ref is not None:
+                limite = ref * factor + holgura
+                if cand[metrica] > limite:
+                    excedidos.append((etapa, metrica, cand[metrica], limite,
+                                      f"referencia {ref:.2f} × {factor:.2f} + {holgura:.2f}"))
+            limite_abs = (absolutos or {}).get(etapa, {}).get(metrica)
+            if limite_abs is not None and cand[metrica] > limite_abs:
+                excedidos.append((etapa, metrica, cand[metrica], limite_abs, "presupuesto fijo"))
+    return excedidos
+
+
+# =====================================================
+# REPORTE
+# =====================================================
+def _texto(valor):
+    if _numero(valor):
+        return f"{float(valor):,.6f}".rstrip("0").rstrip(".")
+    return repr(valor)
+
+
+def imprimir_comparacion(libros: dict, kpis, max_diferencias: int):
+    ok = True
+    print("\n=== RESULTADOS: referencia vs candidato ===")
+    for hoja, (diferencias, celdas) in libros.items():
+        if not diferencias:
+            print(f"✔ Hoja '{hoja}': {celdas} celda(s) iguales")
+            continue
+        ok = False
+        if celdas is None:
+            print(f"❌ Hoja '{hoja}': {diferencias[0]}")
+            continue
+        print(f"❌ Hoja '{hoja}': {len(diferencias)} diferencia(s) de {celdas} celda(s)")
+        for celda, etiqueta, a, b in diferencias[:max_diferencias]:
+            nombre = f" ({etiqueta})" if etiqueta not in (None, "") else ""
+            print(f"    {celda}{nombre}: {_texto(a)} → {_texto(b)}")
+        if len(diferencias) > max_diferencias:
+            print(f"    ... y {len(diferencias) - max_diferencias} más")
+
+    diferencias, valores = kpis
+    if diferencias:
+        ok = False
+        print(f"❌ KPIs del portal: {len(diferencias)} diferencia(s) de {valores} valor(es)")
+        for ruta, a, b in diferencias[:max_diferencias]:
+            print(f"    {ruta}: {_texto(a)} → {_texto(b)}")
+    else:
+        print(f"✔ KPIs del portal: {valores} valor(es) iguales")
+    return ok
+
+
+def imprimir_presupuestos(medidas_ref: dict, medidas_cand: dict, excedidos: list):
+    print("\n=== PRESUPUESTOS POR ETAPA (referencia → candidato) ===")
+    for etapa in list(dict.fromkeys(list(medidas_ref) + list(medidas_cand))):
+        ref, cand = medidas_ref.get(etapa, {}), medidas_cand.get(etapa, {})
+        columnas = []
+        for metrica, unidad in (("segundos", "s"), ("memoria_mb", "MB")):
+            if metrica in ref or metrica in cand:
+                a = f"{ref[metrica]:.2f}" if metrica in ref else "-"
+                b = f"{cand[metrica]:.2f}" if metrica in cand else "-"
+                columnas.append(f"{a:>8} → {b:>8} {unidad:<2}")
+        print(f"  {etapa:<28} " + "   ".join(columnas))
+    for etapa, metrica, valor, limite, origen in excedidos:
+        unidad = "s" if metrica == "segundos" else "MB"
+        print(f"❌ '{etapa}': {valor:.2f} {unidad} > {limite:.2f} {unidad} ({origen})")
+    if not excedidos:
+        print("✔ Todas las etapas dentro de presupuesto.")
+    return not excedidos
+
+
+# =====================================================
+# PROCESO PRINCIPAL
+# =====================================================
+def _ajustes(pares):
+    # KEY=VALOR; el valor se interpreta como JSON si se puede ("true", "[80, 15, 5]")
+    ajustes = {}
+    for par in pares or []:
+        if "=" not in par:
+            raise ValueError(f"Ajuste inválido '{par}': se esperaba CONSTANTE=VALOR")
+        nombre, valor = par.split("=", 1)
+        try:
+            ajustes[nombre.strip()] = json.loads(valor)
+        except json.JSONDecodeError:
+            ajustes[nombre.strip()] = valor
+    return ajustes
+
+
+def verificar(args):
+    referencia = {"scripts": args.referencia_scripts, "ajustes": _ajustes(args.referencia)}
+    candidato = {"scripts": args.candidato_scripts, "ajustes": _ajustes(args.candidato)}
+    absolutos = None
+    if args.presupuestos:
+        with open(args.presupuestos, "r", encoding="utf-8") as f:
+            absolutos = json.load(f)
+
+    carpeta = Path(tempfile.mkdtemp(prefix="verificacion_"))
+    print(f"🏷 Carpeta de trabajo: {carpeta}")
+    try:
+        # La misma plantilla y los mismos extractos para los dos lados
+        plantilla = str(carpeta / LIBRO)
+        shutil.copy2(args.plantilla, plantilla)
+        datos = args.datos
+        if args.filas_inventario or not tiene_inventario(datos):
+            datos = generar_datos(datos, plantilla, str(carpeta / "datos"),
+                                  args.filas_inventario or FILAS_INVENTARIO, args.semilla)
+
+        corridas = {"referencia": [], "candidato": []}
+        memoria = {}
+        # Referencia y candidato se alternan para que la carga de la máquina los afecte por igual
+        for i in range(args.repeticiones):
+            for lado, config in (("referencia", referencia), ("candidato", candidato)):
+                inicio = time.perf_counter()
+                corridas[lado].append(correr(config["scripts"], config["ajustes"], datos, plantilla,
+                                             str(carpeta / f"{lado}_{i + 1}"), False))
+                print(f"⏱ Corrida {i + 1} de {lado}: {time.perf_counter() - inicio:.1f} s")
+        if not args.sin_memoria:
+            for lado, config in (("referencia", referencia), ("candidato", candidato)):
+                memoria[lado] = correr(config["scripts"], config["ajustes"], datos, plantilla,
+                                       str(carpeta / f"{lado}_memoria"), True)
+                print(f"⏱ Corrida con medición de memoria de {lado} terminada.")
+
+        ok = True
+        for lado, lista in corridas.items():
+            pendientes = lista[0]["pendientes"]
+            if pendientes:
+                ok = False
+                print(f"❌ Etapas sin terminar en {lado}: {', '.join(pendientes)} (ver {lista[0]['log']})")
+
+        ref, cand = corridas["referencia"][0], corridas["candidato"][0]
+        libros = comparar_libros(ref["libro"], cand["libro"])
+        kpis = comparar_kpis(ref["info"], cand["info"])
+        ok = imprimir_comparacion(libros, kpis, args.max_diferencias) and ok
+
+        medidas_ref = medir(corridas["referencia"], memoria.get("referencia"))
+        medidas_cand = medir(corridas["candidato"], memoria.get("candidato"))
+        excedidos = revisar_presupuestos(medidas_ref, medidas_cand, absolutos)
+        ok = imprimir_presupuestos(medidas_ref, medidas_cand, excedidos) and ok
+    finally:
+        if args.conservar:
+            print(f"ℹ Se conservan los libros y logs en {carpeta}")
+        else:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+    if ok:
+        print(f"\n✔ Verificación superada ({datetime.now():%d/%m/%Y %H:%M}).")
+    else:
+        print("\n❌ Verificación fallida: el candidato cambia cifras o se pasa de presupuesto.")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara una versión candidata del pipeline contra la referencia.")
+    parser.add_argument("--referencia", nargs="*", metavar="CONSTANTE=VALOR",
+                        help="Constantes de valor_inventario para la referencia (por defecto, las del módulo)")
+    parser.add_argument("--candidato", nargs="*", metavar="CONSTANTE=VALOR",
+                        help="Constantes de valor_inventario para el candidato, p. ej. MOTOR_DATAFRAME=polars")
+    parser.add_argument("--referencia-scripts", default=None, metavar="CARPETA",
+                        help="Otra copia de scripts/ para la referencia (por defecto, esta)")
+    parser.add_argument("--candidato-scripts", default=None, metavar="CARPETA",
+                        help="Otra copia de scripts/ con la implementación candidata")
+    parser.add_argument("--datos", default=str(CARPETA_DATOS),
+                        help="Carpeta con los extractos (por defecto, data_samples)")
+    parser.add_argument("--plantilla", default=str(PLANTILLA), help="Libro de Valor de Inventario de partida")
+    parser.add_argument("--filas-inventario", type=int, default=None,
+                        help=f"Genera un Inventario sintético de N filas (si falta, se generan {FILAS_INVENTARIO})")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--repeticiones", type=int, default=1,
+                        help="Corridas de tiempo por lado; se toma el mínimo de cada etapa")
+    parser.add_argument("--sin-memoria", action="store_true", help="Omite la corrida con tracemalloc")
+    parser.add_argument("--presupuestos", default=None, metavar="JSON",
+                        help='Límites fijos por etapa: {"abc": {"segundos": 2, "memoria_mb": 50}, "total": {...}}')
+    parser.add_argument("--max-diferencias", type=int, default=MAX_DIFERENCIAS)
+    parser.add_argument("--conservar", action="store_true", help="No borra la carpeta de trabajo")
+    args = parser.parse_args()
+    sys.exit(0 if verificar(args) else 1)
@@ -0,0 +1,9 @@
+# =========================================================
+# Configuración de pytest: los módulos del pipeline viven en
+# scripts/ y se importan por nombre (import escenarios_doh),
+# igual que entre ellos.
+# =========================================================
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
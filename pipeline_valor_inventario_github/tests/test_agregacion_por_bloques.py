@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import agregacion_por_bloques
+import clasificacion_abc
+import delta_inventario
+import motor_dataframe
+import valor_inventario
+
+FILAS = 650
+FILAS_POR_BLOQUE = 100
+
+
+def _inventario():
+    # Almacenes numéricos (como en los extractos), SKUs repetidos entre
+    # bloques, cantidades vacías (Importe "NULL") y clases ABC faltantes
+    rng = np.random.default_rng(3)
+    existencias = rng.integers(0, 50, FILAS).astype(float)
+    existencias[rng.random(FILAS) < 0.05] = np.nan
+    return pd.DataFrame({
+        "Almacen": rng.choice([101, 102, 205], FILAS),
+        "Articulo": rng.integers(1000, 1300, FILAS),
+        "Categoria": rng.choice(["FERRETERIA", "PLOMERIA", "ELECTRICO"], FILAS),
+        "ABCGeneral": rng.choice(["A", "B", "C", None], FILAS),
+        "Existencias": existencias,
+        "CostoPromedio": rng.uniform(1, 500, FILAS).round(2),
+        "TipoCambio": rng.choice([1.0, 17.25], FILAS),
+    })
+
+
+@pytest.fixture(params=["xlsx", "csv"])
+def extracto(request, tmp_path):
+    ruta = tmp_path / f"Inventario 20260206.{request.param}"
+    if request.param == "xlsx":
+        _inventario().to_excel(ruta, index=False)
+    else:
+        _inventario().to_csv(ruta, index=False)
+    return str(ruta)
+
+
+@pytest.fixture
+def ambos(extracto, tmp_path, monkeypatch):
+    # Bloques chicos para que la prueba cruce varios límites de bloque
+    monkeypatch.setattr(agregacion_por_bloques, "FILAS_MINIMAS_BLOQUE", FILAS_POR_BLOQUE)
+    motor = motor_dataframe.MotorPandas()
+    en_memoria = motor.agregar_importe(valor_inventario.cargar_en_dataframe(extracto, "Inventario"))
+    por_bloques = agregacion_por_bloques.agregar_inventario(
+        extracto, 0, str(tmp_path / "bloques" / "Inventario_20260206.parquet"))
+    assert por_bloques.bloques == -(-FILAS // FILAS_POR_BLOQUE)
+    return motor, en_memoria, por_bloques
+
+
+def _por_almacen(serie: pd.Series):
+    serie = serie.astype(float)
+    serie.index = serie.index.astype(str)
+    return serie.sort_index()
+
+
+def test_sumas_iguales(ambos):
+    motor, en_memoria, por_bloques = ambos
+    pd.testing.assert_series_equal(_por_almacen(por_bloques.importe_por_almacen()),
+                                   _por_almacen(motor.importe_por_almacen(en_memoria)), check_names=False)
+    assert np.isclose(por_bloques.suma_importe(), motor.importe_por_almacen(en_memoria).sum())
+
+    llaves = ["Almacen_norm", "ABCGeneral_norm"]
+    abc_bloques = por_bloques.sumas_abc().sort_values(llaves).reset_index(drop=True)
+    abc_memoria = motor.sumas_abc(en_memoria).sort_values(llaves).reset_index(drop=True)
+    pd.testing.assert_frame_equal(abc_bloques, abc_memoria, check_dtype=False)
+
+
+@pytest.mark.parametrize("almacenes", [[101, 205], [101.0, 205.0], ["101", "205"]])
+def test_importe_por_categoria_igual(ambos, almacenes):
+    # Los códigos de la hoja de análisis llegan como número aunque el CSV se lea como texto
+    motor, en_memoria, por_bloques = ambos
+    por_bloques_cat = por_bloques.importe_por_categoria(almacenes).sort_values("Categoria").reset_index(drop=True)
+    en_memoria_cat = motor.importe_por_categoria(en_memoria, almacenes).sort_values("Categoria").reset_index(drop=True)
+    assert len(en_memoria_cat) == 3
+    pd.testing.assert_frame_equal(por_bloques_cat, en_memoria_cat, check_dtype=False)
+
+
+def test_snapshot_igual(ambos):
+    _, en_memoria, por_bloques = ambos
+    llaves = delta_inventario.LLAVES
+    snap_bloques = por_bloques.snapshot().sort_values(llaves).reset_index(drop=True)
+    snap_memoria = delta_inventario.preparar_snapshot(en_memoria).sort_values(llaves).reset_index(drop=True)
+    pd.testing.assert_frame_equal(snap_bloques, snap_memoria, check_dtype=False)
+
+
+def test_clasificacion_abc_igual(ambos):
+    _, en_memoria, por_bloques = ambos
+    umbrales = valor_inventario.UMBRALES_ABC
+    columnas = ["ABC Extracto", "ABC Global", "ABC Almacen"]
+    calculado_bloques = clasificacion_abc.clasificar_skus(por_bloques.skus_abc(), umbrales)
+    calculado_memoria = clasificacion_abc.clasificar_inventario(en_memoria, umbrales)
+    pd.testing.assert_frame_equal(calculado_bloques[columnas], calculado_memoria[columnas])
+    np.testing.assert_allclose(calculado_bloques["Importe"], calculado_memoria["Importe"])
+
+
+def test_proyeccion_se_lee_por_bloques(ambos, monkeypatch):
+    # Snapshot y ABC nunca leen la proyección completa: un row group a la vez
+    _, _, por_bloques = ambos
+    monkeypatch.setattr(pd, "read_parquet", None)
+    tamanos = [len(b) for b in por_bloques.bloques_proyeccion(["Importe"])]
+    assert len(tamanos) == por_bloques.bloques and max(tamanos) <= FILAS_POR_BLOQUE
+    assert len(por_bloques.snapshot()) == len(por_bloques.skus_abc())
@@ -0,0 +1,117 @@
+import pandas as pd
+
+import checkpoints
+import planificador
+
+FECHA = "20260206"
+EMPRESA = "PRUEBA"
+
+
+def _etapas(llamadas: dict, fallar: set):
+    # cargar -> doble -> suma ; doble -> alias (misma salida dos veces)
+    def etapa(nombre, funcion):
+        def correr(ctx):
+            llamadas[nombre] = llamadas.get(nombre, 0) + 1
+            if nombre in fallar:
+                raise RuntimeError(f"falla simulada en {nombre}")
+            return funcion(ctx)
+        return correr
+
+    E = planificador.Etapa
+    return [
+        E("cargar Inventario", etapa("cargar Inventario",
+                                     lambda ctx: {"df_crudo": pd.read_csv(ctx["ruta_inventario"])}),
+          salidas=["df_crudo"]),
+        E("doble", etapa("doble", lambda ctx: {"df_doble": ctx["df_crudo"].assign(Valor=ctx["df_crudo"]["Valor"] * 2)}),
+          ["df_crudo"], ["df_doble"]),
+        E("alias", etapa("alias", lambda ctx: {"df_a": ctx["df_doble"], "df_b": ctx["df_doble"]}),
+          ["df_doble"], ["df_a", "df_b"]),
+        E("suma", etapa("suma", lambda ctx: {"total": float(ctx["df_a"]["Valor"].sum())}),
+          ["df_a"], ["total"]),
+    ]
+
+
+def _correr(tmp_path, fuentes, fallar=(), reanudar=False):
+    llamadas = {}
+    if reanudar:
+        almacen = checkpoints.AlmacenEtapas.reanudar(str(tmp_path), None, FECHA, EMPRESA, fuentes)
+    else:
+        almacen = checkpoints.AlmacenEtapas.nueva(str(tmp_path), FECHA, EMPRESA, fuentes)
+    plan = planificador.Planificador(_etapas(llamadas, set(fallar)), max_workers=2)
+    ctx = plan.ejecutar({"ruta_inventario": fuentes["cargar Inventario"]}, almacen)
+    return ctx, plan, almacen, llamadas
+
+
+def test_reanudar_solo_corre_lo_que_falto(tmp_path):
+    ruta = tmp_path / "Inventario.csv"
+    pd.DataFrame({"Valor": [1, 2, 3]}).to_csv(ruta, index=False)
+    fuentes = {"cargar Inventario": str(ruta)}
+
+    ctx, plan, almacen, _ = _correr(tmp_path, fuentes, fallar={"suma"})
+    assert "total" not in ctx
+    assert plan.estadisticas["suma"]["estado"] == planificador.FALLIDA
+    # La carga no se copia a la ejecución; las salidas que son el mismo
+    # DataFrame que df_doble quedan como alias de su Parquet
+    carpeta = tmp_path / checkpoints.CARPETA_EJECUCIONES / almacen.run_id
+    archivos = {p.name for p in carpeta.iterdir()}
+    assert archivos == {"manifiesto.json", "doble_df_doble.parquet", "alias_df_a.alias", "alias_df_b.alias"}
+    assert (carpeta / "alias_df_b.alias").read_text(encoding="utf-8") == "doble_df_doble.parquet"
+
+    ctx, plan, reanudado, llamadas = _correr(tmp_path, fuentes, reanudar=True)
+    assert reanudado.run_id == almacen.run_id
+    assert ctx["total"] == 12.0
+    # Se relee el extracto, se reutilizan las etapas intermedias y se corre la fallida
+    assert llamadas == {"cargar Inventario": 1, "suma": 1}
+    assert plan.estadisticas["doble"]["estado"] == planificador.REUTILIZADA
+    assert ctx["df_a"].equals(ctx["df_b"])
+
+
+def test_extracto_modificado_vuelve_a_correr_dependientes(tmp_path):
+    ruta = tmp_path / "Inventario.csv"
+    pd.DataFrame({"Valor": [1, 2, 3]}).to_csv(ruta, index=False)
+    fuentes = {"cargar Inventario": str(ruta)}
+    _correr(tmp_path, fuentes, fallar={"suma"})
+
+    pd.DataFrame({"Valor": [10, 20, 30, 40]}).to_csv(ruta, index=False)
+    ctx, _, _, llamadas = _correr(tmp_path, fuentes, reanudar=True)
+    assert ctx["total"] == 200.0
+    assert llamadas == {"cargar Inventario": 1, "doble": 1, "alias": 1, "suma": 1}
+
+
+def test_ids_de_ejecucion_unicos(tmp_path):
+    ids = {checkpoints.AlmacenEtapas.nueva(str(tmp_path), FECHA, EMPRESA, {}).run_id for _ in range(5)}
+    assert len(ids) == 5
+
+
+def test_columna_mixta_vuelve_de_parquet_con_los_mismos_tipos(tmp_path):
+    # 'Importe' mezcla números con "NULL": se guarda en Parquet partida en dos
+    df = pd.DataFrame({"Almacen": ["A", "B", "C"], "Existencias": [1, 2, 3],
+                       "Importe": [1.5, "NULL", float("nan")]}, index=[5, 6, 7])
+    almacen = checkpoints.AlmacenEtapas.nueva(str(tmp_path), FECHA, EMPRESA, {})
+    almacen.guardar("importe", {"df": df}, ["df"])
+
+    assert (tmp_path / checkpoints.CARPETA_EJECUCIONES / almacen.run_id / "importe_df.parquet").exists()
+    leido = almacen.cargar("importe", ["df"])["df"]
+    assert leido.equals(df) and leido.dtypes.equals(df.dtypes)
+    assert [type(v) for v in leido["Importe"]] == [float, str, float]
+
+
+def test_ejecucion_completa_no_deja_salidas(tmp_path):
+    ruta = tmp_path / "Inventario.csv"
+    pd.DataFrame({"Valor": [1, 2, 3]}).to_csv(ruta, index=False)
+    fuentes = {"cargar Inventario": str(ruta)}
+    _, _, fallida, _ = _correr(tmp_path, fuentes, fallar={"suma"})
+    _, plan, completa, _ = _correr(tmp_path, fuentes)
+    assert not plan.pendientes()
+    completa.descartar_salidas()
+
+    base = tmp_path / checkpoints.CARPETA_EJECUCIONES
+    assert {p.name for p in (base / completa.run_id).iterdir()} == {"manifiesto.json"}
+    # Una ejecución nueva deja sin salidas a todas menos la anterior
+    nueva = checkpoints.AlmacenEtapas.nueva(str(tmp_path), FECHA, EMPRESA, fuentes)
+    assert {p.name for p in (base / fallida.run_id).iterdir()} == {"manifiesto.json"}
+    assert checkpoints.ultima_ejecucion(str(tmp_path), FECHA, EMPRESA) == nueva.run_id
+
+    # Reanudar la completa corre todo de nuevo en vez de buscar salidas borradas
+    reanudada = checkpoints.AlmacenEtapas.reanudar(str(tmp_path), completa.run_id, FECHA, EMPRESA, fuentes)
+    assert reanudada.etapas_validas() == set()
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import clasificacion_abc
+
+UMBRALES = (80, 15, 5)
+CLASES = clasificacion_abc.CLASES_ABC
+
+
+def test_la_clase_es_donde_empieza_la_participacion():
+    # Participación previa: 0, 0.50, 0.80, 0.96 -> A, A, B, C
+    valores = [50, 30, 16, 4]
+    clases = clasificacion_abc.clasificar_pareto(valores, UMBRALES, CLASES)
+    assert clases.tolist() == ["A", "A", "B", "C"]
+
+
+@pytest.mark.parametrize("valores", [[50, 30, 15, 5], [5.05, 3.03, 1.515, 0.505]])
+def test_el_que_empieza_justo_en_el_corte_cambia_de_clase(valores):
+    # Participación previa: 0, 0.50, 0.80, 0.95 -> el último empieza exactamente en el 95 %
+    clases = clasificacion_abc.clasificar_pareto(valores, UMBRALES, CLASES)
+    assert clases.tolist() == ["A", "A", "B", "C"]
+
+
+def test_no_depende_del_orden_de_entrada():
+    valores = np.array([4, 50, 16, 30])
+    clases = clasificacion_abc.clasificar_pareto(valores, UMBRALES, CLASES)
+    assert clases.tolist() == ["C", "A", "B", "A"]
+
+
+def test_sin_importe_no_participa():
+    clases = clasificacion_abc.clasificar_pareto([0, -3, 10, np.nan], UMBRALES, CLASES)
+    assert clases.tolist() == ["NULL", "NULL", "A", "NULL"]
+    assert (clasificacion_abc.clasificar_pareto([0, 0], UMBRALES, CLASES) == "NULL").all()
+
+
+def test_por_grupos_igual_que_grupo_por_grupo():
+    rng = np.random.default_rng(7)
+    valores = rng.pareto(1.5, 300) * 100
+    grupos = rng.choice(["ALM1", "ALM2", "ALM3"], 300)
+    juntos = clasificacion_abc.clasificar_pareto(valores, UMBRALES, CLASES, grupos=grupos)
+    for g in np.unique(grupos):
+        mascara = grupos == g
+        separado = clasificacion_abc.clasificar_pareto(valores[mascara], UMBRALES, CLASES)
+        assert juntos[mascara].tolist() == separado.tolist()
+
+
+def test_umbrales_invalidos():
+    with pytest.raises(ValueError):
+        clasificacion_abc.clasificar_pareto([1, 2], (80, 20), CLASES)
+    with pytest.raises(ValueError):
+        clasificacion_abc.clasificar_pareto([1, 2], (80, 0, 20), CLASES)
+
+
+def test_clasificar_inventario_global_y_por_almacen():
+    df = pd.DataFrame({
+        "Almacen": ["ALM1", "ALM1", "ALM2", "ALM2"],
+        "Articulo": ["X", "Y", "X", "Z"],
+        "Categoria": ["C1", "C1", "C1", "C2"],
+        "ABCGeneral": ["A", "C", None, "B"],
+        "Importe": [10, 90, 80, "NULL"],
+    })
+    clasificado = clasificacion_abc.clasificar_inventario(df, UMBRALES)
+    # Global: X suma 90 en los dos almacenes, igual que Y
+    assert clasificado["ABC Global"].tolist() == ["A", "A", "A", "NULL"]
+    # En ALM1 el 10 empieza en el 90 % acumulado
+    assert clasificado["ABC Almacen"].tolist() == ["B", "A", "A", "NULL"]
+    assert clasificado["ABC Extracto"].tolist() == ["A", "C", "NULL", "B"]
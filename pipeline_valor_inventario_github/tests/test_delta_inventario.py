@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+import delta_inventario
+
+
+def _snapshot(filas):
+    return delta_inventario.preparar_snapshot(pd.DataFrame(filas, columns=delta_inventario.COLUMNAS_SNAPSHOT))
+
+
+def test_los_efectos_suman_el_delta():
+    anterior = _snapshot([
+        ("A1", "100", 10, 5.0, 1.0),     # cambia cantidad, costo y tipo de cambio
+        ("A1", "200", 4, 2.5, 18.0),     # desaparece
+        ("A2", "100", 7, 3.0, 1.0),      # sin cambios
+    ])
+    hoy = _snapshot([
+        ("A1", "100", 12, 5.5, 1.1),
+        ("A2", "100", 7, 3.0, 1.0),
+        ("A2", "300", 3, 9.0, 17.5),     # nuevo
+    ])
+    delta = delta_inventario.calcular_delta(anterior, hoy)
+
+    assert len(delta) == 3  # el SKU sin cambios no aparece
+    efectos = delta[["Efecto Cantidad", "Efecto Costo", "Efecto Tipo Cambio"]].sum(axis=1)
+    np.testing.assert_allclose(efectos, delta["Delta Importe"])
+    np.testing.assert_allclose(delta["Delta Importe"], delta["Importe Hoy"] - delta["Importe Anterior"])
+
+    por_llave = delta.set_index(["Almacen", "Articulo"])
+    # SKU nuevo o desaparecido: todo es efecto cantidad
+    assert por_llave.loc[("A2", "300"), "Efecto Cantidad"] == 3 * 9.0 * 17.5
+    assert por_llave.loc[("A1", "200"), "Efecto Cantidad"] == -4 * 2.5 * 18.0
+    assert por_llave.loc[("A1", "200"), "Efecto Costo"] == 0
+    # Cadena cantidad -> costo -> tipo de cambio
+    fila = por_llave.loc[("A1", "100")]
+    assert np.isclose(fila["Efecto Cantidad"], 2 * 5.0 * 1.0)
+    assert np.isclose(fila["Efecto Costo"], 12 * 0.5 * 1.0)
+    assert np.isclose(fila["Efecto Tipo Cambio"], 12 * 5.5 * 0.1)
+
+
+def test_llaves_enteras_y_flotantes_cruzan():
+    # Un extracto trae el código como entero y el otro como flotante
+    anterior = _snapshot([(101, 123, 5, 2.0, 1.0)])
+    hoy = _snapshot([(101.0, 123.0, 6, 2.0, 1.0), ("101", "ABC-1", 1, 1.0, 1.0)])
+    delta = delta_inventario.calcular_delta(anterior, hoy).set_index(["Almacen", "Articulo"])
+    assert delta.loc[("101", "123"), "Delta Importe"] == 2.0
+    assert delta.loc[("101", "123"), "Existencias Anterior"] == 5
+
+
+def test_duplicados_conservan_el_importe():
+    snap = _snapshot([
+        ("A1", "100", 2, 10.0, 1.0),
+        ("A1", "100", 3, 20.0, 2.0),
+    ])
+    assert len(snap) == 1
+    fila = snap.iloc[0]
+    assert np.isclose(fila["Existencias"] * fila["CostoPromedio"] * fila["TipoCambio"], 2 * 10 + 3 * 20 * 2)
+
+
+def _importe(snap):
+    return snap["Existencias"] * snap["CostoPromedio"] * snap["TipoCambio"] + snap["ImporteResidual"]
+
+
+def test_duplicados_de_signo_mixto_conservan_el_importe():
+    # Entrada y devolución a distinto costo: la cantidad neta es 0 pero el importe no
+    anterior = _snapshot([
+        ("A1", "100", 5, 10.0, 1.0),
+        ("A1", "100", -5, 12.0, 1.0),
+        ("A1", "200", 4, 3.0, 1.0),
+    ])
+    assert np.allclose(_importe(anterior.set_index("Articulo")).loc[["100", "200"]], [-10.0, 12.0])
+
+    hoy = _snapshot([
+        ("A1", "100", 2, 11.0, 1.0),
+        ("A1", "200", 4, 3.0, 1.0),
+        ("A1", "200", -4, 3.5, 2.0),     # Q*C también suma 0 y el tipo de cambio difiere
+    ])
+    delta = delta_inventario.calcular_delta(anterior, hoy)
+    efectos = delta[["Efecto Cantidad", "Efecto Costo", "Efecto Tipo Cambio"]].sum(axis=1)
+    np.testing.assert_allclose(efectos, delta["Delta Importe"])
+
+    por_llave = delta.set_index("Articulo")
+    assert np.isclose(por_llave.loc["100", "Importe Anterior"], -10.0)
+    assert np.isclose(por_llave.loc["100", "Importe Hoy"], 22.0)
+    assert np.isclose(por_llave.loc["200", "Importe Hoy"], 12.0 - 28.0)
+
+
+def test_snapshot_anterior_mas_reciente(tmp_path):
+    for fecha, q in [("20260203", 1), ("20260205", 2), ("20260206", 3)]:
+        delta_inventario.guardar_snapshot(_snapshot([("A1", "100", q, 1.0, 1.0)]), str(tmp_path), fecha)
+    fecha, snap = delta_inventario.cargar_snapshot_anterior(str(tmp_path), "20260206")
+    assert fecha == "20260205"
+    assert snap["Existencias"].tolist() == [2]
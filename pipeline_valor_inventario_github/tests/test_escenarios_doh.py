@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+import escenarios_doh
+
+HORIZONTE = 30
+
+
+def _categorias():
+    # Venta anual 360 => demanda de 1 por día; la fila TOTAL se descarta
+    df_doh = pd.DataFrame({
+        "Categoria": ["A", "B", "TOTAL"],
+        "Disponible": [100, 50, 150],
+        "Transitos": [300, 0, 300],
+        "Venta": [360, 360, 720],
+        "OCompra": [0, 20, 20],
+        "PedidosP": [0, 10, 10],
+    })
+    return escenarios_doh.preparar_categorias(df_doh)
+
+
+def test_base_coincide_con_doh_proyectado():
+    resultado, _ = escenarios_doh.evaluar([escenarios_doh.BASE], _categorias(), HORIZONTE)
+    # (Disponible + Transitos + OCompra - PedidosP) / demanda diaria
+    assert resultado.loc[0, "DOH Total"] == (100 + 300 + 50 + 20 - 10) / 2
+    assert resultado.loc[0, "Categorias en Quiebre"] == 0
+
+
+def test_retraso_de_transitos_fuera_del_horizonte_baja_el_doh():
+    escenarios = [escenarios_doh.BASE,
+                  {"nombre": "Retraso 45", "retraso_transitos": 45},
+                  {"nombre": "Retraso 10", "retraso_transitos": 10}]
+    resultado, _ = escenarios_doh.evaluar(escenarios, _categorias(), HORIZONTE)
+    base, tarde, a_tiempo = resultado["DOH Total"]
+
+    # El tránsito de A llega después del horizonte: ya no cuenta en el DOH
+    assert tarde == (100 + 50 + 20 - 10) / 2
+    assert tarde < base
+    # Dentro del horizonte el tránsito sí llega y el DOH no cambia
+    assert a_tiempo == base
+    assert resultado.loc[1, "DOH P90"] < resultado.loc[0, "DOH P90"]
+
+
+def test_retraso_solo_en_las_categorias_elegidas():
+    escenario = {"nombre": "Retraso A", "retraso_transitos": 45, "categorias": ["a"]}
+    resultado, _ = escenarios_doh.evaluar([escenario], _categorias(), HORIZONTE)
+    assert resultado.loc[0, "DOH Total"] == (100 + 50 + 20 - 10) / 2
+    assert np.isclose(resultado.loc[0, "DOH P10"], 60 + 0.1 * (100 - 60))
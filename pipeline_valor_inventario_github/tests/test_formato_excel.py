@@ -0,0 +1,43 @@
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Border, Side
+
+import formato_excel
+
+
+def _hoja_con_tabla(df):
+    wb = Workbook()
+    ws = wb.active
+    ws.append(list(df.columns))
+    for fila in df.itertuples(index=False):
+        ws.append(list(fila))
+    # Encabezado como lo deja pandas: con borde
+    borde = Border(bottom=Side(style="thin"))
+    for celda in ws[1]:
+        celda.border = borde
+    return wb, ws
+
+
+def test_formatear_tabla_conserva_bordes_y_aplica_formatos():
+    df = pd.DataFrame({"Articulo": ["A1", "A2", "TOTAL"], "Importe": [10.5, 20.0, 30.5]})
+    wb, ws = _hoja_con_tabla(df)
+    estilos_del_libro = list(wb.named_styles)
+
+    formato_excel.formatear_tabla(ws, df, columnas_moneda=["Importe"], fila_total=True)
+
+    assert list(wb.named_styles) == estilos_del_libro  # nada nuevo en la galería de estilos
+
+    assert all(c.font.bold and c.border.bottom.style == "thin" for c in ws[1])
+    assert [ws[f"B{f}"].number_format for f in (2, 3, 4)] == [formato_excel.FORMATO_MONEDA] * 3
+    assert not ws["B2"].font.bold and ws["B4"].font.bold and ws["A4"].font.bold
+    assert ws["A2"].number_format == "General"
+
+
+def test_aplicar_estilo_respeta_el_formato_previo_de_cada_celda():
+    wb, ws = _hoja_con_tabla(pd.DataFrame({"X": [1, 2]}))
+    ws["A3"].border = Border(left=Side(style="thick"))
+
+    formato_excel.aplicar_estilo(ws, "A2:A3", formato_excel.ESTILO_MONEDA)
+
+    assert ws["A2"].number_format == ws["A3"].number_format == formato_excel.FORMATO_MONEDA
+    assert ws["A2"].border.left.style is None and ws["A3"].border.left.style == "thick"
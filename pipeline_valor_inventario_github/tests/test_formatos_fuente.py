@@ -0,0 +1,22 @@
+import gzip
+
+import pytest
+
+import formatos_fuente
+
+CSV = "Articulo,Almacen,Existencias\n00123,001,5\n0099,,3\n"
+
+
+@pytest.mark.parametrize("nombre, abrir", [("Inventario.csv", open), ("Inventario.csv.gz", gzip.open)])
+def test_columnas_de_texto_conservan_ceros_a_la_izquierda(tmp_path, nombre, abrir):
+    ruta = tmp_path / nombre
+    with abrir(ruta, "wt") as f:
+        f.write(CSV)
+
+    df = formatos_fuente.leer_csv(str(ruta), dtype={"Articulo": str, "Almacen": str})
+    # Mismo resultado que el parser C de pandas (el que usa la muestra)
+    esperado = formatos_fuente.leer_csv(str(ruta), dtype={"Articulo": str, "Almacen": str}, nrows=10)
+
+    assert df["Articulo"].tolist() == ["00123", "0099"]
+    assert df["Almacen"].iloc[0] == "001" and df["Almacen"].isna().iloc[1]
+    assert df["Existencias"].tolist() == esperado["Existencias"].tolist()
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import motor_dataframe
+
+MUESTRAS = os.path.join(os.path.dirname(__file__), "..", "data_samples")
+FECHA = "20260206"
+FILAS = 500
+
+
+def _muestra(prefijo):
+    return pd.read_excel(os.path.join(MUESTRAS, f"{prefijo} {FECHA}.xlsx"))
+
+
+def _inventario():
+    # Almacenes numéricos y de texto, cantidades vacías (Importe "NULL") y
+    # clases ABC faltantes o con espacios
+    rng = np.random.default_rng(5)
+    existencias = rng.integers(0, 50, FILAS).astype(float)
+    existencias[rng.random(FILAS) < 0.05] = np.nan
+    return pd.DataFrame({
+        "Almacen": rng.choice([101, 102, "205"], FILAS).astype(object),
+        "Articulo": rng.integers(1000, 1300, FILAS),
+        "Categoria": rng.choice(["FERRETERIA", "PLOMERIA", "ELECTRICO"], FILAS),
+        "ABCGeneral": rng.choice(["A", "b ", "C", None], FILAS),
+        "Existencias": existencias,
+        "CostoPromedio": rng.uniform(1, 500, FILAS).round(2),
+        "TipoCambio": rng.choice([1.0, 17.25], FILAS),
+    })
+
+
+@pytest.fixture(scope="module")
+def extractos():
+    # Columnas extra en DOH_C: la hoja Dias Inventario las conserva con cualquier motor
+    doh = _muestra("DOH_C")
+    doh.insert(1, "Comprador", [f"C{i % 4}" for i in range(len(doh))])
+    doh["Familia"] = doh["Categoria"].astype(str).str[:3]
+    return {
+        "doh": doh,
+        "transitos": _muestra("TransitosPendientes"),
+        "oc": _muestra("OCPendiente"),
+        "entradas": _muestra("Entradas X Planeacion"),
+    }
+
+
+@pytest.fixture(params=["polars", "duckdb"])
+def motor(request):
+    pytest.importorskip(request.param)
+    # Directo de MOTORES: obtener_motor regresa pandas si el motor no carga
+    return motor_dataframe.MOTORES[request.param]()
+
+
+def _iguales(obtenido, esperado):
+    if isinstance(esperado, pd.Series):
+        pd.testing.assert_series_equal(obtenido, esperado, check_dtype=False, check_names=False,
+                                       check_index_type=False)
+    else:
+        pd.testing.assert_frame_equal(obtenido.reset_index(drop=True), esperado.reset_index(drop=True),
+                                      check_dtype=False)
+
+
+def test_inventario_igual_que_pandas(motor):
+    referencia = motor_dataframe.MotorPandas()
+    df = _inventario()
+
+    esperado = referencia.agregar_importe(df)
+    obtenido = motor.agregar_importe(df)
+    _iguales(obtenido, esperado)
+
+    _iguales(motor.importe_por_almacen(esperado), referencia.importe_por_almacen(esperado))
+    almacenes = [101, "205"]
+    _iguales(motor.importe_por_categoria(esperado, almacenes), referencia.importe_por_categoria(esperado, almacenes))
+    llaves = ["Almacen_norm", "ABCGeneral_norm"]
+    _iguales(motor.sumas_abc(esperado).sort_values(llaves), referencia.sumas_abc(esperado).sort_values(llaves))
+
+
+def test_extractos_iguales_que_pandas(motor, extractos):
+    referencia = motor_dataframe.MotorPandas()
+
+    doh, totales = motor.calcular_doh(extractos["doh"])
+    doh_esperado, totales_esperados = referencia.calcular_doh(extractos["doh"])
+    _iguales(doh, doh_esperado)
+    assert totales == pytest.approx(totales_esperados)
+
+    _iguales(motor.filtrar_transitos(extractos["transitos"]), referencia.filtrar_transitos(extractos["transitos"]))
+    _iguales(motor.pivot_oc(extractos["oc"]), referencia.pivot_oc(extractos["oc"]))
+
+    top, dia, mes, fecha = motor.entradas_ventanas(extractos["entradas"], FECHA)
+    top_esperado, dia_esperado, mes_esperado, fecha_esperada = referencia.entradas_ventanas(extractos["entradas"], FECHA)
+    _iguales(top, top_esperado)
+    assert (dia, mes, fecha) == (pytest.approx(dia_esperado), pytest.approx(mes_esperado), fecha_esperada)
+
+
+@pytest.mark.parametrize("nombre", ["pandas", "polars", "duckdb"])
+@pytest.mark.parametrize("almacen", [[101.0, 205.0, 101.0], ["101", "205", "101"], [101, 205, 101]])
+def test_importe_por_categoria_cruza_codigos_flotantes_y_enteros(nombre, almacen):
+    if nombre != "pandas":
+        pytest.importorskip(nombre)
+    motor = motor_dataframe.MOTORES[nombre]()
+    inventario = motor.agregar_importe(pd.DataFrame({
+        "Almacen": almacen,
+        "Categoria": ["FERRETERIA", "FERRETERIA", "PLOMERIA"],
+        "Existencias": [1, 2, 3],
+        "CostoPromedio": [10.0, 10.0, 10.0],
+        "TipoCambio": [1.0, 1.0, 1.0],
+    }))
+    # La hoja de análisis trae los códigos como enteros
+    res = motor.importe_por_categoria(inventario, [101]).sort_values("Categoria").reset_index(drop=True)
+    assert res["Categoria"].tolist() == ["FERRETERIA", "PLOMERIA"]
+    assert res["Importe"].tolist() == [10.0, 30.0]
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+import resumen_periodos
+
+
+def _comportamiento(dias: int = 70, inicio: str = "2025-12-01"):
+    # Igual que la hoja: la fila más reciente arriba y fechas DD/MM/AAAA
+    fechas = pd.date_range(inicio, periods=dias, freq="D")
+    valores = [1000 + 25 * i + (i % 7) * 40 for i in range(dias)]
+    df = pd.DataFrame({
+        "Fecha": fechas.strftime("%d/%m/%Y"),
+        "Valor Total": valores,
+        "DOH Proyectado": [None if i % 10 == 0 else 30 + i % 5 for i in range(dias)],
+        "Objetivo": 2000,
+        "Variacion Diaria": [0] + [valores[i] - valores[i - 1] for i in range(1, dias)],
+    })
+    return df.iloc[::-1].reset_index(drop=True)
+
+
+def _iguales(a: pd.DataFrame, b: pd.DataFrame):
+    pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_dtype=False)
+
+
+def test_agregar_dia_equivale_a_reconstruir():
+    comport = _comportamiento()
+    # El acumulado hasta ayer más el día de hoy = construir con todo
+    resumen = resumen_periodos.construir_desde_historia(comport.iloc[1:])
+    resumen = resumen_periodos.agregar_dia(resumen, comport.iloc[0].to_dict())
+    _iguales(resumen, resumen_periodos.construir_desde_historia(comport))
+
+
+def test_agregar_dia_no_suma_dos_veces():
+    comport = _comportamiento()
+    resumen = resumen_periodos.construir_desde_historia(comport)
+    _iguales(resumen_periodos.agregar_dia(resumen, comport.iloc[0].to_dict()), resumen)
+
+
+def test_agregar_dia_abre_periodos_nuevos():
+    comport = _comportamiento(dias=31)  # 01/12/2025 .. 31/12/2025
+    resumen = resumen_periodos.construir_desde_historia(comport)
+    fila = {"Fecha": "01/01/2026", "Valor Total": 500, "DOH Proyectado": 12,
+            "Objetivo": 2000, "Variacion Diaria": -10}
+    resumen = resumen_periodos.agregar_dia(resumen, fila)
+    enero = resumen[(resumen["Tipo"] == "Mes") & (resumen["Periodo"] == "2026-01")].iloc[0]
+    assert enero["Dias"] == 1
+    assert enero["Valor Cierre"] == 500
+    assert enero["Variacion Neta"] == -10
+    assert set(resumen.loc[resumen["Tipo"] == "Año", "Periodo"]) == {"2025", "2026"}
+
+
+def test_ponerse_al_dia_recupera_dias_pendientes():
+    # Comportamiento se guardó dos días sin que se guardara el resumen
+    comport = _comportamiento()
+    atrasado = resumen_periodos.construir_desde_historia(comport.iloc[2:])
+    resumen, dias = resumen_periodos.ponerse_al_dia(atrasado, comport)
+    assert dias == 2
+    _iguales(resumen, resumen_periodos.construir_desde_historia(comport))
+
+    _, dias = resumen_periodos.ponerse_al_dia(resumen, comport)
+    assert dias == 0
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 6])
+def test_ultimos_meses_con_poca_historia(n):
+    resumen = resumen_periodos.construir_desde_historia(_comportamiento(dias=20, inicio="2026-02-01"))
+    meses = resumen_periodos.ultimos(resumen, "Mes", n)
+    assert len(meses) == n
+    assert meses["Periodo"].iloc[-1] == "2026-02"
+    # Los meses sin historia salen en cero
+    assert (meses["Dias"].iloc[:-1] == 0).all()
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+import motor_dataframe
+import valor_inventario
+
+INVENTARIO = pd.DataFrame({
+    "Almacen": [101, 101, 205, 300],
+    "Articulo": ["0010", "0020", "0010", "0030"],
+    "Categoria": ["FERRETERIA", "PLOMERIA", "FERRETERIA", "ELECTRICO"],
+    "ABCGeneral": ["A", "B", "A", "C"],
+    "Existencias": [2, 3, 4, 0],
+    "CostoPromedio": [10.0, 5.0, 2.5, 8.0],
+    "TipoCambio": [1.0, 1.0, 17.0, 1.0],
+})
+FECHA = "06/02/2026"
+
+
+def _hojas(tmp_path, extension):
+    ruta = tmp_path / extension / f"Inventario 20260206.{extension}"
+    ruta.parent.mkdir()
+    if extension == "xlsx":
+        INVENTARIO.to_excel(ruta, index=False)
+    else:
+        INVENTARIO.to_csv(ruta, index=False)
+
+    # Libro con las dos hojas que se llenan por almacén (códigos numéricos)
+    archivo_valor = ruta.parent / "Valor Inventario.xlsx"
+    with pd.ExcelWriter(archivo_valor) as writer:
+        pd.DataFrame({"Tipo de Almacen": ["ALMACENES FACTURACIÓN"] * 3, "Almacen": [101, 205, 999], "IMPORTE": 0}).to_excel(
+            writer, sheet_name=valor_inventario.HOJA_ANALISIS_GENERAL, index=False)
+        pd.DataFrame({"Almacen": [101, 205, 999], "05/02/2026": [1.0, 2.0, 3.0]}).to_excel(
+            writer, sheet_name=valor_inventario.HOJA_HISTORICO_ALMACEN, index=False)
+
+    motor = motor_dataframe.MotorPandas()
+    ctx = {
+        "archivo_valor": str(archivo_valor),
+        "hay_inventario": True,
+        "agregados_inv": None,
+        "motor": motor,
+        "df_inventario": motor.agregar_importe(valor_inventario.cargar_en_dataframe(str(ruta), "Inventario")),
+        "fecha_hoy": FECHA,
+    }
+    valor_inventario.etapa_analisis_general(ctx)
+    valor_inventario.etapa_historico_almacen(ctx)
+    return {hoja: pd.read_excel(archivo_valor, sheet_name=hoja)
+            for hoja in (valor_inventario.HOJA_ANALISIS_GENERAL, valor_inventario.HOJA_HISTORICO_ALMACEN)}
+
+
+def test_hojas_por_almacen_iguales_con_csv_y_xlsx(tmp_path):
+    # El CSV lee Almacen como texto; las hojas traen el código como número
+    xlsx, csv = _hojas(tmp_path, "xlsx"), _hojas(tmp_path, "csv")
+    for hoja in xlsx:
+        pd.testing.assert_frame_equal(csv[hoja], xlsx[hoja])
+
+    assert xlsx[valor_inventario.HOJA_ANALISIS_GENERAL]["IMPORTE"].tolist() == pytest.approx([35.0, 170.0, 0.0])
+    assert xlsx[valor_inventario.HOJA_HISTORICO_ALMACEN][FECHA].tolist() == pytest.approx([35.0, 170.0, 0.0])